@@ -0,0 +1,271 @@
+"""
+badges.py — Event-driven badge engine.
+
+Handlers report what just happened (a quiz was submitted, a topic was
+completed, ...) through `emit()`. Each event bumps the student's running
+counters in `student_stats` and today's row in `daily_rollups`, and
+evaluates only the rules subscribed to it, so neither a badge check nor
+the analytics page ever re-counts the student's history.
+"""
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import event as sa_event, func
+from sqlalchemy.orm import Session
+
+import leaderboard
+from database import upsert
+from models import (
+    Badge, ChatMessage, DailyChallenge, DailyRollup, QuizResult, Student, StudentBadge,
+    StudentStats, Topic, TopicProgress,
+)
+
+# ── Events ──
+QUIZ_SUBMITTED = "quiz_submitted"        # payload: score, attempts
+TOPIC_STARTED = "topic_started"          # first TopicProgress row for a topic
+TOPIC_COMPLETED = "topic_completed"      # topic flipped to completed
+CHAT_SENT = "chat_sent"                  # student asked the tutor something
+CHALLENGE_COMPLETED = "challenge_completed"
+XP_CHANGED = "xp_changed"                # payload: amount
+
+_RULES = defaultdict(list)
+
+# session.info key: students whose stats row was rebuilt from history in the current transaction
+_BACKFILLED = "badges.backfilled"
+
+# Catalog lookups — badges and topics only change at seed time
+_badge_ids = {}
+_path_topic_totals = {}
+
+
+def on(*events):
+    """Subscribe a rule to one or more events. A rule yields badge names the student qualifies for."""
+    def register(fn):
+        for event in events:
+            _RULES[event].append(fn)
+        return fn
+    return register
+
+
+def reset_cache():
+    _badge_ids.clear()
+    _path_topic_totals.clear()
+
+
+def _badges(db: Session) -> dict:
+    if not _badge_ids:
+        _badge_ids.update({b.name: b.id for b in db.query(Badge.name, Badge.id).all()})
+    return _badge_ids
+
+
+def _badge_id(db: Session, name: str):
+    return _badges(db).get(name)
+
+
+def total_badges(db: Session) -> int:
+    return len(_badges(db))
+
+
+def topics_in_path(db: Session, path_id: str) -> int:
+    if path_id not in _path_topic_totals:
+        _path_topic_totals[path_id] = db.query(Topic).filter(Topic.path_id == path_id).count()
+    return _path_topic_totals[path_id]
+
+
+# ────────────────────────── Counters ──────────────────────────
+
+def get_stats(db: Session, student_id: int):
+    """Return (stats, backfilled). A missing row is rebuilt once from history.
+
+    `backfilled` stays true for the rest of the transaction: the rebuild already
+    counted every row flushed so far, including those behind later events of
+    the same request (submit_quiz emits TOPIC_STARTED, then QUIZ_SUBMITTED).
+    """
+    backfilled = db.info.setdefault(_BACKFILLED, set())
+    stats = db.get(StudentStats, student_id)
+    if stats:
+        return stats, student_id in backfilled
+    values = dict(
+        student_id=student_id,
+        perfect_quizzes=db.query(QuizResult).filter(
+            QuizResult.student_id == student_id, QuizResult.score == 100).count(),
+        topics_started=db.query(TopicProgress).filter(
+            TopicProgress.student_id == student_id).count(),
+        topics_completed=db.query(TopicProgress).filter(
+            TopicProgress.student_id == student_id, TopicProgress.completed == True).count(),
+        chat_messages=db.query(ChatMessage).filter(
+            ChatMessage.student_id == student_id, ChatMessage.role == "user").count(),
+        challenges_completed=db.query(DailyChallenge).filter(
+            DailyChallenge.student_id == student_id, DailyChallenge.completed == True).count(),
+    )
+    values["quizzes_taken"], values["quiz_score_total"] = db.query(
+        func.count(QuizResult.id), func.coalesce(func.sum(QuizResult.score), 0)
+    ).filter(QuizResult.student_id == student_id).one()
+    # A concurrent request may rebuild the row first; then theirs is used and this event is bumped onto it
+    if db.execute(upsert(db, StudentStats).values(**values).on_conflict_do_nothing(
+            index_elements=[StudentStats.student_id])).rowcount == 1:
+        backfilled.add(student_id)
+    return db.get(StudentStats, student_id), student_id in backfilled
+
+
+@sa_event.listens_for(Session, "after_transaction_end")
+def _forget_backfills(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_BACKFILLED, None)
+
+
+def _bump(stats: StudentStats, event: str, payload: dict):
+    if event == QUIZ_SUBMITTED:
+        stats.quizzes_taken += 1
+        stats.quiz_score_total += payload.get("score", 0)
+        if payload.get("score") == 100:
+            stats.perfect_quizzes += 1
+    elif event == TOPIC_STARTED:
+        stats.topics_started += 1
+    elif event == TOPIC_COMPLETED:
+        stats.topics_completed += 1
+    elif event == CHAT_SENT:
+        stats.chat_messages += 1
+    elif event == CHALLENGE_COMPLETED:
+        stats.challenges_completed += 1
+
+
+# Columns of today's DailyRollup row each event adds to
+_ROLLUP = {
+    XP_CHANGED: lambda p: {"xp": p.get("amount", 0)},
+    QUIZ_SUBMITTED: lambda p: {"quizzes": 1, "quiz_score_total": p.get("score", 0)},
+    CHAT_SENT: lambda p: {"chats": 1},
+    CHALLENGE_COMPLETED: lambda p: {"challenges": 1},
+}
+
+
+def _roll_up(db: Session, student_id: int, event: str, payload: dict):
+    """Add the event to the student's rollup for today (UTC), creating the row if needed."""
+    if event not in _ROLLUP:
+        return
+    deltas = _ROLLUP[event](payload)
+    stmt = upsert(db, DailyRollup).values(
+        student_id=student_id, day=datetime.utcnow().date().isoformat(),
+        **{col: deltas.get(col, 0) for col in ("xp", "quizzes", "quiz_score_total", "chats", "challenges")})
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyRollup.student_id, DailyRollup.day],
+        set_={col: getattr(DailyRollup, col) + delta for col, delta in deltas.items()}))
+
+
+# ────────────────────────── Rules ──────────────────────────
+
+@on(XP_CHANGED)
+def _progress_badges(db, student, stats, payload):
+    if student.level == "Engineer":
+        yield "Rising Star"
+    if student.level == "Legend":
+        yield "Legend"
+    if student.total_xp >= 100:
+        yield "Rocket Start"
+    if student.current_streak >= 7:
+        yield "Week Warrior"
+
+
+@on(XP_CHANGED)
+def _leaderboard_badges(db, student, stats, payload):
+    if student.role != "student":
+        return
+    # XP from this request isn't on the board until commit, so compare
+    # against the best of everyone else using the board's (-xp, id) order
+    rival = leaderboard.leader(exclude=student.id)
+    if rival is None or (-student.total_xp, student.id) < (-rival[1], rival[0]):
+        yield "Leaderboard King"
+
+
+@on(XP_CHANGED, CHAT_SENT)
+def _time_badges(db, student, stats, payload):
+    now = datetime.now()
+    if now.hour >= 22 or now.hour < 4:
+        yield "Night Owl"
+    if 5 <= now.hour < 8:
+        yield "Early Bird"
+
+
+@on(QUIZ_SUBMITTED)
+def _quiz_badges(db, student, stats, payload):
+    if stats.perfect_quizzes >= 1:
+        yield "Perfectionist"
+    if stats.perfect_quizzes >= 5:
+        yield "Diamond Mind"
+    if payload.get("attempts", 0) > 1 and payload.get("score", 0) > 0:
+        yield "Comeback Kid"
+
+
+@on(TOPIC_STARTED)
+def _reading_badges(db, student, stats, payload):
+    if stats.topics_started >= 10:
+        yield "Knowledge Seeker"
+
+
+@on(TOPIC_COMPLETED)
+def _topic_badges(db, student, stats, payload):
+    if stats.topics_completed >= 5:
+        yield "All Rounder"
+    total_topics = topics_in_path(db, student.path_id)
+    if stats.topics_completed >= total_topics and total_topics > 0:
+        yield "Curious Mind"
+        yield "Graduate"
+        path_badge = {
+            "gaming": "Game Master", "business": "Business Brain",
+            "developer": "Code Wizard", "ai_enthusiast": "AI Pioneer",
+        }.get(student.path_id)
+        if path_badge:
+            yield path_badge
+
+
+@on(CHAT_SENT)
+def _chat_badges(db, student, stats, payload):
+    if stats.chat_messages >= 50:
+        yield "AI Whisperer"
+    if stats.chat_messages >= 100:
+        yield "Deep Thinker"
+
+
+@on(CHALLENGE_COMPLETED)
+def _challenge_badges(db, student, stats, payload):
+    if stats.challenges_completed >= 30:
+        yield "Challenge Champion"
+
+
+# ────────────────────────── Engine ──────────────────────────
+
+def emit(db: Session, student: Student, event: str, **payload) -> list:
+    """Record an event for a student and award any badges it unlocks.
+
+    Runs inside the caller's transaction: pending rows are flushed first so
+    a first-time counter backfill already includes the row that caused the
+    event, and nothing is committed here. Returns the names of newly
+    awarded badges.
+    """
+    db.flush()
+    stats, backfilled = get_stats(db, student.id)
+    if not backfilled:
+        _bump(stats, event, payload)
+    _roll_up(db, student.id, event, payload)
+
+    candidates = []
+    for rule in _RULES[event]:
+        candidates.extend(rule(db, student, stats, payload))
+
+    awarded = []
+    if candidates:
+        earned = {bid for (bid,) in db.query(StudentBadge.badge_id).filter(
+            StudentBadge.student_id == student.id).all()}
+        for name in candidates:
+            badge_id = _badge_id(db, name)
+            if badge_id and badge_id not in earned:
+                earned.add(badge_id)
+                # DO NOTHING: a concurrent request may award the same badge first
+                inserted = db.execute(upsert(db, StudentBadge).values(student_id=student.id, badge_id=badge_id)
+                                      .on_conflict_do_nothing(index_elements=[StudentBadge.student_id,
+                                                                              StudentBadge.badge_id]))
+                if inserted.rowcount == 1:
+                    awarded.append(name)
+
+    db.flush()
+    return awarded
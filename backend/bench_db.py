@@ -0,0 +1,142 @@
+"""
+bench_db.py — Concurrent write benchmark for the SQLite engine settings.
+
+Replays the write pattern of a quiz submission (QuizResult + TopicProgress,
+student XP update, XPLog row, StudentStats bump) from many threads against
+a scratch copy of the schema, in four configurations:
+
+    legacy   default rollback journal, one commit per helper (the old code path)
+    batched  default journal, one commit per request
+    wal      WAL + tuned pragmas, one commit per helper
+    tuned    WAL + tuned pragmas, one commit per request (what the app uses now)
+
+    python bench_db.py --threads 16 --requests 200
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, make_engine, upsert, SQLITE_PRAGMAS
+from models import QuizResult, Student, StudentStats, Topic, TopicProgress, XPLog
+
+LEGACY_PRAGMAS = {}   # what database.py did before: driver defaults only
+
+CONFIGS = {
+    "legacy": (LEGACY_PRAGMAS, False),
+    "batched": (LEGACY_PRAGMAS, True),
+    "wal": (SQLITE_PRAGMAS, False),
+    "tuned": (SQLITE_PRAGMAS, True),
+}
+
+
+def setup(path: str, students: int, pragmas: dict):
+    eng = make_engine(f"sqlite:///{path}", pragmas=pragmas)
+    Base.metadata.create_all(bind=eng)
+    Session = sessionmaker(bind=eng, autoflush=False)
+    db = Session()
+    db.add(Topic(path_id="gaming", order_num=1, title="Bench topic"))
+    for i in range(students):
+        db.add(Student(name=f"bench{i}", pin="0000", age=13, path_id="gaming"))
+    db.flush()
+    for sid in range(1, students + 1):
+        db.add(StudentStats(student_id=sid))
+    db.commit()
+    db.close()
+    return eng, Session
+
+
+def quiz_submission(Session, student_id: int, batched: bool):
+    """One request's worth of writes, shaped like POST /api/quiz/submit."""
+    db = Session()
+    step = db.flush if batched else db.commit
+    try:
+        db.add(QuizResult(student_id=student_id, topic_id=1, score=80,
+                          total_questions=10, correct_answers=8, xp_earned=80))
+        # Same get-or-create as main._topic_progress
+        query = db.query(TopicProgress).filter(
+            TopicProgress.student_id == student_id, TopicProgress.topic_id == 1)
+        progress = query.first()
+        started = False
+        if progress is None:
+            started = db.execute(upsert(db, TopicProgress).values(
+                student_id=student_id, topic_id=1, completed=False, quiz_score=0, quiz_attempts=0
+            ).on_conflict_do_nothing(index_elements=[TopicProgress.student_id, TopicProgress.topic_id])).rowcount == 1
+            progress = query.one()
+        progress.quiz_score = max(progress.quiz_score, 80)
+        progress.quiz_attempts += 1
+        step()
+        stats = db.get(StudentStats, student_id)
+        stats.perfect_quizzes += 0
+        stats.topics_started += 1 if started else 0
+        step()
+        student = db.get(Student, student_id)
+        student.total_xp += 80
+        db.add(XPLog(student_id=student_id, amount=80, reason="bench"))
+        step()
+        db.commit()
+    finally:
+        db.close()
+
+
+def run(name: str, threads: int, requests: int, students: int) -> dict:
+    pragmas, batched = CONFIGS[name]
+    workdir = tempfile.mkdtemp(prefix="bench-db-")
+    eng, Session = setup(os.path.join(workdir, "bench.db"), students, pragmas)
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(tid: int):
+        for i in range(requests):
+            sid = (tid * requests + i) % students + 1
+            t0 = time.perf_counter()
+            try:
+                quiz_submission(Session, sid, batched)
+            except DBAPIError as e:   # "database is locked", or any other failed write
+                with lock:
+                    errors.append(str(e.orig))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+    eng.dispose()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    latencies.sort()
+    return {
+        "config": name,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "req_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0,
+    }
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--threads", type=int, default=16)
+    p.add_argument("--requests", type=int, default=200, help="requests per thread")
+    p.add_argument("--students", type=int, default=50)
+    p.add_argument("--configs", nargs="*", default=list(CONFIGS), choices=list(CONFIGS))
+    args = p.parse_args()
+
+    print(f"{args.threads} threads x {args.requests} quiz submissions\n")
+    print(f"{'config':<10}{'ok':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name in args.configs:
+        r = run(name, args.threads, args.requests, args.students)
+        print(f"{r['config']:<10}{r['ok']:>8}{r['errors']:>8}{r['req_s']:>10.0f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}")
@@ -0,0 +1,103 @@
+"""
+bench_startup.py — Cold-start benchmark for the API process.
+
+Measures the two things a free-tier cold start makes users wait for:
+
+    import    `python -X importtime -c "import main"`: total import time and
+              the slowest top-level imports (cumulative)
+    ready     spawn uvicorn, poll GET /api/health until it answers 200
+              (imports + lifespan: migrations check, job workers)
+
+Runs against a scratch SQLite database that is migrated once up front, so
+every measured start is a restart, as in production.
+
+    python bench_startup.py --runs 5 --top 15
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(env: dict) -> tuple:
+    """(total ms, [(cumulative ms, module)] for direct imports of main)."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=HERE, env=env,
+                         capture_output=True, text=True, check=True).stderr
+    # Children are printed before their parent, indented two more spaces
+    top, children = [], []
+    total = 0.0
+    for line in out.splitlines():
+        m = IMPORT_LINE.match(line)
+        if not m:
+            continue
+        cumulative, indent, module = int(m.group(2)) / 1000, len(m.group(3)), m.group(4)
+        if indent == 1:
+            if module == "main":
+                total, top = cumulative, children
+            children = []
+        elif indent == 3:
+            children.append((cumulative, module))
+    return total, sorted(top, reverse=True)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_ready(env: dict, timeout: float = 60) -> float:
+    """Seconds from spawning uvicorn to the first 200 from /api/health."""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/health", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("no 200 from /api/health")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = p.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{scratch}/bench.db", PYTHONDONTWRITEBYTECODE="0")
+    subprocess.run([sys.executable, "migrate.py"], cwd=HERE, env=env, check=True, capture_output=True)
+
+    imports = [import_profile(env) for _ in range(args.runs)]
+    ready = [time_to_ready(env) for _ in range(args.runs)]
+
+    total, top = min(imports, key=lambda r: r[0])
+    print(f"📦 import main: median {statistics.median(t for t, _ in imports):.0f} ms "
+          f"(best {total:.0f} ms over {args.runs} runs)")
+    for ms, module in top[:args.top]:
+        print(f"   {ms:8.1f} ms  {module}")
+    print(f"🚀 time to first 200 on /api/health: median {statistics.median(ready) * 1000:.0f} ms, "
+          f"min {min(ready) * 1000:.0f} ms, max {max(ready) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
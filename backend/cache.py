@@ -0,0 +1,161 @@
+"""
+cache.py — In-process response cache for catalog endpoints.
+
+Serialized JSON bodies are kept in an LRU with a TTL, keyed by route
+("topics:gaming", "topic:12", ...). Each entry carries a strong ETag (a
+hash of the body), so a browser revalidating with If-None-Match gets an
+empty 304 instead of the full payload. The ETag depends only on the body,
+so every worker hands out the same tag for the same content.
+
+Bodies above COMPRESS_MIN_BYTES are compressed once when cached (gzip,
+plus brotli when the `brotli` package is installed) and served as-is to
+clients that accept the encoding, so hot reads never re-compress.
+
+Code that writes catalog content calls `invalidate()` with the affected
+keys. Writers in other processes (the seed scripts, other uvicorn
+workers) are picked up once entries outlive CACHE_TTL_SECONDS.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+# Browsers may reuse a response this long before revalidating
+MAX_AGE = int(os.getenv("CACHE_MAX_AGE", "60"))
+COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "500"))
+
+# `encoded` maps a Content-Encoding to the pre-compressed body
+Entry = namedtuple("Entry", "body etag expires encoded")
+
+
+def compress(body: bytes) -> dict:
+    if len(body) < COMPRESS_MIN_BYTES:
+        return {}
+    encoded = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        # Compressed on a cache miss, inside the request: quality 5 is a few ms where 11 is
+        # hundreds, for a body only a few percent larger
+        encoded["br"] = brotli.compress(body, quality=5)
+    return encoded
+
+
+class ResponseCache:
+    """Thread-safe LRU of response bodies with per-entry expiry."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.expires < time.monotonic():
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, body: bytes) -> Entry:
+        entry = Entry(body, hashlib.sha256(body).hexdigest()[:32], time.monotonic() + self.ttl, compress(body))
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, *keys: str):
+        """Drop `keys` and everything below them ("topic:3" also drops "topic:3:simple").
+
+        With no keys, drops everything.
+        """
+        with self.lock:
+            if not keys:
+                self.entries.clear()
+                return
+            below = tuple(f"{k}:" for k in keys)
+            for key in [k for k in self.entries if k in keys or k.startswith(below)]:
+                del self.entries[key]
+
+
+responses = ResponseCache()
+
+
+def invalidate(*keys: str):
+    responses.invalidate(*keys)
+
+
+def encode(payload) -> bytes:
+    # Same encoding FastAPI's JSONResponse uses
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def _etag(entry: Entry, encoding: str = None) -> str:
+    # Each encoding is its own representation, so it gets its own strong tag
+    return f'"{entry.etag}-{encoding}"' if encoding else f'"{entry.etag}"'
+
+
+def _encoding(request: Request, entry: Entry):
+    accepted = {part.split(";")[0].strip().lower()
+                for part in request.headers.get("accept-encoding", "").split(",")
+                if "q=0" not in part.replace(" ", "").split(";")[1:]}
+    for encoding in ("br", "gzip"):
+        if encoding in entry.encoded and encoding in accepted:
+            return encoding
+    return None
+
+
+def _not_modified(request: Request, entry: Entry) -> bool:
+    header = request.headers.get("if-none-match", "")
+    if header.strip() == "*":
+        return True
+    tags = {t.strip() for t in header.split(",")}
+    return any(_etag(entry, e) in tags for e in (None, *entry.encoded))
+
+
+def _response(request: Request, entry: Entry) -> Response:
+    encoding = _encoding(request, entry)
+    headers = {"ETag": _etag(entry, encoding), "Vary": "Accept-Encoding",
+               "Cache-Control": f"public, max-age={MAX_AGE}, must-revalidate"}
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(entry.encoded[encoding], media_type="application/json", headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def lookup(request: Request, key: str):
+    """The cached response for `key` (200 or 304), or None on a miss."""
+    entry = responses.get(key)
+    return _response(request, entry) if entry else None
+
+
+def store(request: Request, key: str, payload) -> Response:
+    """Cache `payload` under `key` and answer with it."""
+    return _response(request, responses.put(key, encode(payload)))
+
+
+def respond(request: Request, key: str, build) -> Response:
+    """Serve `key` from the cache, calling `build()` for the payload on a miss.
+
+    Answers 304 when the client already holds the current ETag.
+    """
+    return lookup(request, key) or store(request, key, build())
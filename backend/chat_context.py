@@ -0,0 +1,217 @@
+"""
+chat_context.py — Bounded prompt context for the AI tutor.
+
+Each student's conversation is held in memory as a rolling summary plus a
+window of recent messages that fits CHAT_WINDOW_TOKENS. Messages pushed out
+of the window are folded into the summary in the background (an LLM call,
+or a plain extract when no LLM is available), and the summary is stored in
+`chat_summaries` so a restart picks up where it left off.
+
+The prompt for a turn is therefore at most system prompt + summary +
+window, whatever the length of the conversation, and needs no database
+read while the student's context is cached. Contexts are kept for
+CHAT_CONTEXT_TTL_SECONDS, so messages written through another worker show
+up once the entry is reloaded.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from sqlalchemy import desc
+
+import generation
+import llm
+from database import SessionLocal
+from models import ChatMessage, ChatSummary
+
+WINDOW_TOKENS = int(os.getenv("CHAT_WINDOW_TOKENS", "1500"))
+SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+MESSAGE_TOKENS = int(os.getenv("CHAT_MESSAGE_TOKENS", "600"))   # longer messages are clipped in the prompt
+FOLD_AFTER_TOKENS = 400    # evicted text that triggers a summary update
+LOAD_LIMIT = 60            # newest unsummarized messages read when a context is loaded
+CACHE_STUDENTS = int(os.getenv("CHAT_CONTEXT_CACHE_STUDENTS", "1000"))
+TTL_SECONDS = float(os.getenv("CHAT_CONTEXT_TTL_SECONDS", "900"))
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token, plus per-message overhead)."""
+    return len(text) // CHARS_PER_TOKEN + 4
+
+
+def clip(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " …"
+
+
+class Context:
+    """One student's summary and recent window.
+
+    Shared by concurrent requests (threadpool) and the fold task (event
+    loop), so state is only read or changed under `lock`.
+    """
+
+    def __init__(self, student_id: int, summary: str = "", summary_upto: int = 0):
+        self.student_id = student_id
+        self.summary = summary
+        self.summary_upto = summary_upto     # last message id folded into the summary
+        self.window = deque()                # (id, role, content, tokens), oldest first
+        self.window_tokens = 0
+        self.evicted = []                    # (id, role, content) waiting to be folded
+        self.evicted_tokens = 0
+        self.folding = False
+        self.expires = time.monotonic() + TTL_SECONDS
+        self.lock = threading.Lock()
+
+    def append(self, message_id: int, role: str, content: str):
+        content = clip(content, MESSAGE_TOKENS)
+        tokens = estimate_tokens(content)
+        with self.lock:
+            self.window.append((message_id, role, content, tokens))
+            self.window_tokens += tokens
+            while self.window_tokens > WINDOW_TOKENS and len(self.window) > 1:
+                mid, r, c, t = self.window.popleft()
+                self.window_tokens -= t
+                self.evicted.append((mid, r, c))
+                self.evicted_tokens += t
+
+    def start_fold(self) -> bool:
+        """Claim the next fold if enough evicted text is waiting and none is running."""
+        with self.lock:
+            if self.folding or self.evicted_tokens < FOLD_AFTER_TOKENS:
+                return False
+            self.folding = True
+            return True
+
+    def take_evicted(self) -> tuple:
+        """(summary, evicted messages), clearing the evicted list."""
+        with self.lock:
+            batch, self.evicted, self.evicted_tokens = self.evicted, [], 0
+            return self.summary, batch
+
+    def set_summary(self, summary: str, upto: int):
+        with self.lock:
+            self.summary, self.summary_upto = summary, upto
+
+    def end_fold(self):
+        with self.lock:
+            self.folding = False
+
+    def messages(self, system_prompt: str) -> list:
+        """OpenAI-format prompt: system (+ summary), then the window in order."""
+        with self.lock:
+            summary, window = self.summary, list(self.window)
+        if summary:
+            system_prompt += f"\n\nSummary of your earlier conversation with this student:\n{summary}"
+        return [{"role": "system", "content": system_prompt}] + [
+            {"role": "user" if role == "user" else "assistant", "content": content}
+            for _, role, content, _ in window
+        ]
+
+    @property
+    def prompt_tokens(self) -> int:
+        with self.lock:
+            return estimate_tokens(self.summary) + self.window_tokens
+
+
+_contexts = OrderedDict()
+_lock = threading.Lock()
+
+
+def _load(db, student_id: int) -> Context:
+    row = db.get(ChatSummary, student_id)
+    ctx = Context(student_id, row.summary if row else "", row.last_message_id if row else 0)
+    recent = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content).filter(
+        ChatMessage.student_id == student_id, ChatMessage.id > ctx.summary_upto
+    ).order_by(desc(ChatMessage.id)).limit(LOAD_LIMIT).all()
+    for mid, role, content in reversed(recent):
+        ctx.append(mid, role, content)
+    return ctx
+
+
+def get(db, student_id: int) -> Context:
+    """The student's context, loaded from the database on a cache miss."""
+    with _lock:
+        ctx = _contexts.get(student_id)
+        if ctx and ctx.expires > time.monotonic():
+            _contexts.move_to_end(student_id)
+            return ctx
+    ctx = _load(db, student_id)
+    with _lock:
+        _contexts[student_id] = ctx
+        while len(_contexts) > CACHE_STUDENTS:
+            _contexts.popitem(last=False)
+    return ctx
+
+
+def record(student_id: int, message_id: int, role: str, content: str):
+    """Add a stored message to the cached context (if any) and fold evictions when due."""
+    with _lock:
+        ctx = _contexts.get(student_id)
+    if ctx is None:
+        return   # loaded fresh, message included, on the next turn
+    ctx.append(message_id, role, content)
+    if ctx.start_fold():
+        generation.spawn(_fold(ctx))
+
+
+# ────────────────────────── Summaries ──────────────────────────
+
+def _summary_prompt(summary: str, messages: list) -> str:
+    transcript = "\n".join(f"{'Student' if role == 'user' else 'Tutor'}: {content}"
+                           for _, role, content in messages)
+    return f"""Update the running summary of a tutoring conversation.
+
+Current summary:
+{summary or "(none yet)"}
+
+New messages:
+{transcript}
+
+Write the updated summary in at most {SUMMARY_TOKENS * 3 // 4} words: what the student has asked about,
+what they understood or struggled with, and anything the tutor promised to follow up on.
+Reply with the summary only."""
+
+
+def _extract(summary: str, messages: list) -> str:
+    """LLM-free fallback: keep the student's questions, newest last."""
+    lines = [summary] if summary else []
+    lines += [f"- Asked: {clip(content, 30)}" for _, role, content in messages if role == "user"]
+    text = "\n".join(lines)
+    limit = SUMMARY_TOKENS * CHARS_PER_TOKEN
+    return text[-limit:].split("\n", 1)[-1] if len(text) > limit else text
+
+
+async def _fold(ctx: Context):
+    try:
+        previous, batch = ctx.take_evicted()
+        summary = ""
+        if llm.groq.available:
+            try:
+                summary = await llm.groq.complete(
+                    [{"role": "user", "content": _summary_prompt(previous, batch)}],
+                    max_tokens=SUMMARY_TOKENS, temperature=0.3, site="chat_summary")
+            except Exception:
+                summary = ""
+        summary = clip(summary.strip(), SUMMARY_TOKENS) if summary.strip() else _extract(previous, batch)
+        upto = max(mid for mid, _, _ in batch)
+        ctx.set_summary(summary, upto)
+        await asyncio.to_thread(_save, ctx.student_id, summary, upto)
+    finally:
+        ctx.end_fold()
+
+
+def _save(student_id: int, summary: str, upto: int):
+    db = SessionLocal()
+    try:
+        row = db.get(ChatSummary, student_id)
+        if row is None:
+            db.add(ChatSummary(student_id=student_id, summary=summary, last_message_id=upto))
+        elif upto > row.last_message_id:
+            row.summary, row.last_message_id = summary, upto
+        db.commit()
+    finally:
+        db.close()
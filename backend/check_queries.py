@@ -0,0 +1,246 @@
+"""
+check_queries.py — Guard the database access patterns of the hot routes.
+
+Runs against a scratch SQLite database built through the real migrations:
+
+1. Query plans: EXPLAIN QUERY PLAN on the queries the routes issue on
+   every request. A plain `SCAN <table>` (no index) is a failure; a temp
+   B-tree for ORDER BY is reported as a warning.
+2. Statement counts: calls list endpoints for a student with a short and
+   a long history and counts the SQL statements each request runs. The
+   count must stay within STATEMENT_BUDGET and must not grow with history
+   length or student count (no N+1 loops).
+3. Counters: a student without a `student_stats` row submits quizzes and
+   completes a topic through the API; the counters kept by badges.py must
+   equal a fresh rebuild from history (no event counted twice).
+
+    python check_queries.py          # exit code 1 on any failure
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Point the app at a scratch DB before database.py builds its engine
+WORKDIR = tempfile.mkdtemp(prefix="check-queries-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORKDIR, 'check.db')}"
+
+from sqlalchemy import desc, event, select
+
+import badges
+import database
+import leaderboard
+import migrate
+from models import *
+
+SID, TOPIC_ID, PATH = 1, 1, "gaming"
+
+# (name, statement) — keep in step with the filters used in main.py / badges.py / jobs.py
+HOT_QUERIES = [
+    ("progress by student", select(TopicProgress).where(TopicProgress.student_id == SID)),
+    ("progress by student+topic", select(TopicProgress).where(
+        TopicProgress.student_id == SID, TopicProgress.topic_id == TOPIC_ID)),
+    ("quiz history", select(QuizResult).where(QuizResult.student_id == SID)
+        .order_by(desc(QuizResult.taken_at)).limit(50)),
+    ("tutor context load", select(ChatMessage.id, ChatMessage.role, ChatMessage.content).where(
+        ChatMessage.student_id == SID, ChatMessage.id > 100).order_by(desc(ChatMessage.id)).limit(60)),
+    ("tutor summary", select(ChatSummary).where(ChatSummary.student_id == SID)),
+    ("chat history page", select(ChatMessage).where(ChatMessage.student_id == SID, ChatMessage.id < 500)
+        .order_by(desc(ChatMessage.id)).limit(101)),
+    ("chat export batch", select(ChatMessage).where(ChatMessage.student_id == SID, ChatMessage.id > 500)
+        .order_by(ChatMessage.id).limit(500)),
+    ("today's challenge", select(DailyChallenge).where(
+        DailyChallenge.student_id == SID, DailyChallenge.challenge_date == "2026-01-01")),
+    ("flashcard progress", select(FlashcardProgress).where(
+        FlashcardProgress.student_id == SID, FlashcardProgress.deck_id == 1,
+        FlashcardProgress.card_index == 0)),
+    ("xp log", select(XPLog).where(XPLog.student_id == SID).order_by(desc(XPLog.created_at)).limit(50)),
+    ("xp since (leaderboard period)", select(XPLog.student_id).where(XPLog.created_at >= datetime(2026, 1, 1))),
+    ("student badges", select(StudentBadge).where(StudentBadge.student_id == SID)),
+    ("analytics rollups", select(DailyRollup).where(
+        DailyRollup.student_id == SID, DailyRollup.day >= "2026-01-01", DailyRollup.day <= "2026-03-31")
+        .order_by(DailyRollup.day)),
+    ("quiz pool", select(CachedQuizQuestion).where(CachedQuizQuestion.topic_id == TOPIC_ID)),
+    ("flashcard cache", select(CachedFlashcard).where(
+        CachedFlashcard.topic_name == "x", CachedFlashcard.path_id == PATH)),
+    ("topics in path", select(Topic).where(Topic.path_id == PATH).order_by(Topic.order_num)),
+    ("concepts in path", select(Concept).where(Concept.path_id == PATH)),
+    ("decks in path", select(FlashcardDeck).where(FlashcardDeck.path_id == PATH)),
+    ("leaderboard rebuild", select(Student.id, Student.total_xp).where(Student.role == "student")),
+    ("leaderboard rows", select(Student).where(Student.id.in_((1, 2, 3)))),
+    ("job claim", select(GenerationJob.id).where(GenerationJob.status == "queued")
+        .order_by(GenerationJob.id).limit(5)),
+    ("active job for key", select(GenerationJob).where(
+        GenerationJob.key == "quiz:gaming:1", GenerationJob.status.in_(("queued", "running")))),
+]
+
+FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+
+# Max statements per request, independent of how much history there is.
+# {sid} routes are called for the student just seeded; the rest see every student.
+STATEMENT_BUDGET = {
+    "/api/quiz/history/{sid}": 1,
+    "/api/badges/{sid}": 1,
+    "/api/progress/{sid}": 1,
+    "/api/xp/log/{sid}": 1,
+    "/api/chat/history/{sid}": 1,
+    "/api/analytics/{sid}": 4,
+    "/api/admin/overview": 2,
+    "/api/admin/overview?sort=total_xp&order=desc&limit=10": 2,
+    "/api/leaderboard": 1,
+    "/api/leaderboard?period=weekly&limit=10": 1,
+}
+HISTORY_SIZES = (1, 40)
+
+
+def explain(conn, stmt) -> list:
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def check_plans() -> int:
+    failures = 0
+    with database.engine.connect() as conn:
+        for name, stmt in HOT_QUERIES:
+            plan = explain(conn, stmt)
+            scans = [d for d in plan if FULL_SCAN.match(d)]
+            status = "FAIL" if scans else "ok"
+            warn = any("TEMP B-TREE" in d for d in plan)
+            print(f"{status:<5}{name:<32}{' | '.join(plan)}{'   (warn: sorts in a temp b-tree)' if warn else ''}")
+            failures += bool(scans)
+    print(f"\n{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} hot queries use an index\n")
+    return failures
+
+
+def seed_history(db, n: int) -> int:
+    """A new student with `n` quiz results, badges, progress rows, XP entries, chat messages and daily rollups."""
+    student = Student(name=f"history{n}", age=13, pin="0000", path_id=PATH)
+    db.add(student)
+    db.flush()
+    db.add(StudentStats(student_id=student.id, perfect_quizzes=0, topics_started=n, topics_completed=0,
+                        chat_messages=n, challenges_completed=0, quizzes_taken=n, quiz_score_total=50 * n))
+    today = datetime.utcnow().date()
+    for i in range(n):
+        topic = Topic(path_id=PATH, order_num=1000 + i, title=f"Topic {n}-{i}")
+        badge = Badge(name=f"Badge {n}-{i}", description="check")
+        db.add_all([topic, badge])
+        db.flush()
+        db.add_all([
+            QuizResult(student_id=student.id, topic_id=topic.id, score=50,
+                       total_questions=10, correct_answers=5),
+            StudentBadge(student_id=student.id, badge_id=badge.id),
+            TopicProgress(student_id=student.id, topic_id=topic.id),
+            XPLog(student_id=student.id, amount=10, reason="check"),
+            ChatMessage(student_id=student.id, role="user", content="hi"),
+            DailyRollup(student_id=student.id, day=(today - timedelta(days=i)).isoformat(),
+                        xp=10, quizzes=1, quiz_score_total=50, chats=1),
+        ])
+    db.commit()
+    return student.id
+
+
+def check_statement_counts() -> int:
+    from fastapi.testclient import TestClient
+    import main
+
+    count = 0
+
+    def on_execute(*_):
+        nonlocal count
+        count += 1
+
+    # Every admin sort key, so a key that only exists as a computed column is exercised too
+    budget = dict(STATEMENT_BUDGET)
+    for key in main.ADMIN_SORT_KEYS:
+        budget[f"/api/admin/overview?sort={key}&order=desc"] = STATEMENT_BUDGET["/api/admin/overview"]
+    client = TestClient(main.app)  # no lifespan: migrations already ran, no job workers needed
+    counts = {route: [] for route in budget}
+    for n in HISTORY_SIZES:
+        db = database.SessionLocal()
+        sid = seed_history(db, n)
+        db.close()
+        leaderboard.rebuild()  # seeded behind the app's back
+        for route in budget:
+            client.get(route.format(sid=sid))  # warm the per-process catalog caches
+        event.listen(database.engine, "before_cursor_execute", on_execute)
+        for route in budget:
+            count = 0
+            resp = client.get(route.format(sid=sid))
+            assert resp.status_code == 200, (route, resp.status_code)
+            body = resp.json()
+            if "{sid}" in route:
+                rows = body["xp_chart"] if isinstance(body, dict) else body
+                assert len(rows) == n, (route, len(rows), n)
+            counts[route].append(count)
+        event.remove(database.engine, "before_cursor_execute", on_execute)
+
+    failures = 0
+    for route, limit in budget.items():
+        ok = max(counts[route]) <= limit and len(set(counts[route])) == 1
+        failures += not ok
+        sizes = ", ".join(f"{n} rows: {c}" for n, c in zip(HISTORY_SIZES, counts[route]))
+        print(f"{'ok' if ok else 'FAIL':<5}{route:<60}statements ({sizes}), budget {limit}")
+    print(f"\n{len(budget) - failures}/{len(budget)} routes within their statement budget")
+    return failures
+
+
+STAT_COLUMNS = ("quizzes_taken", "quiz_score_total", "perfect_quizzes", "topics_started",
+                "topics_completed", "chat_messages", "challenges_completed")
+
+
+def check_counters() -> int:
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    perfect = [{"question": "q", "selected": "a", "correct": "a", "is_correct": True}]
+    quiz = lambda topic_id: ("/api/quiz/submit", {"topic_id": topic_id, "answers": perfect})
+    complete = lambda topic_id: ("/api/topics/complete", {"topic_id": topic_id})
+    # The first call of each scenario backfills the missing stats row
+    scenarios = {
+        "quiz first": [quiz(TOPIC_ID), complete(TOPIC_ID), quiz(TOPIC_ID + 1)],
+        "completion first": [complete(TOPIC_ID), quiz(TOPIC_ID), complete(TOPIC_ID + 1)],
+    }
+    failures = checked = 0
+    for name, calls in scenarios.items():
+        db = database.SessionLocal()
+        student = Student(name=name, age=13, pin="0000", path_id=PATH)
+        db.add(student)
+        db.commit()
+        sid = student.id
+        db.close()
+        for route, body in calls:
+            assert client.post(route, json=dict(body, student_id=sid)).status_code == 200, route
+
+        db = database.SessionLocal()
+        try:
+            kept = {col: getattr(db.get(StudentStats, sid), col) for col in STAT_COLUMNS}
+            db.query(StudentStats).filter(StudentStats.student_id == sid).delete()
+            stats, _ = badges.get_stats(db, sid)
+            rebuilt = {col: getattr(stats, col) for col in STAT_COLUMNS}
+            db.rollback()
+        finally:
+            db.close()
+        for col in STAT_COLUMNS:
+            ok = kept[col] == rebuilt[col]
+            failures += not ok
+            checked += 1
+            print(f"{'ok' if ok else 'FAIL':<5}{name + ': ' + col:<40}kept {kept[col]:g}, history {rebuilt[col]:g}")
+    print(f"\n{checked - failures}/{checked} counters match history")
+    return failures
+
+
+def main() -> int:
+    try:
+        migrate.upgrade()
+        failures = check_plans() + check_statement_counts() + check_counters()
+    finally:
+        database.engine.dispose()
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
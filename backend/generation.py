@@ -0,0 +1,556 @@
+"""
+generation.py — AI content generation for lessons, quiz pools and flashcards.
+
+Each public function fills the database cache for one item and is wrapped
+in single-flight, so concurrent misses for the same item share one LLM
+run. Callers pass how many rows they already saw; a waiter on another
+worker's lease returns as soon as the cache has grown past that.
+"""
+import asyncio
+import json
+
+import cache
+import jsonstream
+import llm
+import quizbank
+import singleflight
+from database import SessionLocal
+from models import CachedFlashcard, CachedQuizQuestion, Topic
+
+LESSON_COLUMNS = {"simple": "content_simple", "normal": "content_normal", "technical": "content_technical"}
+
+# Strong refs so fire-and-forget tasks are not garbage-collected mid-flight
+_background_tasks = set()
+_loop = None   # the app's event loop, so worker threads can spawn() too
+
+
+def start():
+    """Remember the running event loop (called from the app's lifespan)."""
+    global _loop
+    _loop = asyncio.get_running_loop()
+
+
+def spawn(coro):
+    """Run `coro` as a background task. Returns the task, or None when called
+    from a worker thread, in which case it is handed to the event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        if _loop is None:
+            coro.close()
+            raise RuntimeError("spawn() from a thread before generation.start()")
+        _loop.call_soon_threadsafe(spawn, coro)
+        return None
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def parse_json(text: str):
+    """Parse an LLM JSON reply, tolerating ```json fences and salvaging a partly broken array."""
+    return jsonstream.parse(text)
+
+
+# ────────────────────────── Prompts ──────────────────────────
+
+TOPIC_PROFILES = {
+    "gaming": {
+        "audience": "a smart 13-year-old who is obsessed with gaming — Minecraft, PUBG, FIFA, GTA, Roblox, Valorant",
+        "simple_style": "Use super simple language. Relate EVERYTHING to popular games. No jargon at all. Pretend you're explaining it to a friend who's never studied.",
+        "normal_style": "Use gaming examples throughout — specific game mechanics, characters, and scenarios. Be exciting and energetic. Name real games.",
+        "tech_style": "Explain the underlying algorithms and data structures. Include game engine examples. Connect to real game dev concepts.",
+        "sections_normal": ["Introduction", "What Is It Really?", "How It Works In Games", "Real Games Using This Right Now", "The Secret Sauce (Key Mechanisms)", "Why This Changes Gaming", "Try This Challenge"],
+        "sections_tech": ["Technical Foundation", "Core Algorithms", "Data Structures Used", "Real Game Engine Implementation", "Performance Considerations", "State of the Art", "Research Frontiers"],
+    },
+    "business": {
+        "audience": "a sharp 17-year-old interested in entrepreneurship and AI for business",
+        "simple_style": "Plain English, business scenarios, no tech jargon. Use examples from companies a teen would know.",
+        "normal_style": "Use Indian startup examples (Zomato, Flipkart, Paytm, Swiggy, CRED, Meesho) and global giants. Focus on ROI and practical value.",
+        "tech_style": "Explain the technology behind the business application. Include market data, use cases, implementation considerations.",
+        "sections_normal": ["Introduction", "The Business Problem It Solves", "How Companies Use It Today", "Indian Companies Leading the Way", "The Money Behind It", "How to Build This into a Business", "Your Action Plan"],
+        "sections_tech": ["Technical Overview", "How It Works", "Implementation Strategy", "Data Requirements", "Key Metrics & KPIs", "Case Studies", "Building Your Own"],
+    },
+    "developer": {
+        "audience": "a 20-year-old CS student who codes and wants to understand AI deeply",
+        "simple_style": "Clear explanation with pseudocode and simple analogies. Assume basic CS knowledge.",
+        "normal_style": "Include algorithm names, complexity analysis, framework mentions (PyTorch, TensorFlow, scikit-learn). Be precise and technical.",
+        "tech_style": "Deep dive: math notation, code snippets, paper references, benchmarks, architectural decisions, tradeoffs.",
+        "sections_normal": ["Concept Overview", "Core Algorithm", "Mathematical Intuition", "Code Implementation Pattern", "Real-World Systems", "Performance & Complexity", "What to Build Next"],
+        "sections_tech": ["Formal Definition", "Mathematical Foundation", "Algorithm Deep-Dive", "Implementation Architecture", "Optimization Techniques", "Production Considerations", "Research Papers to Read"],
+    },
+    "ai_enthusiast": {
+        "audience": "an adult AI enthusiast who wants complete, nuanced understanding",
+        "simple_style": "Accessible but not dumbed-down. Use clear analogies for complex concepts.",
+        "normal_style": "Comprehensive coverage including history, how it works, applications, limitations, and future. Be intellectually engaging.",
+        "tech_style": "Full technical depth: theory, math, implementation details, current SOTA, open research questions, ethical considerations.",
+        "sections_normal": ["Historical Context", "What It Is & Why It Matters", "How It Actually Works", "Current Applications", "Limitations & Challenges", "Ethical Dimensions", "The Future"],
+        "sections_tech": ["Technical Foundation", "Mathematical Framework", "Architecture & Implementation", "Current State of the Art", "Benchmarks & Comparisons", "Open Problems", "Research Directions"],
+    },
+}
+
+
+def lesson_prompt(title: str, path_id: str, level: str) -> str:
+    profile = TOPIC_PROFILES.get(path_id, TOPIC_PROFILES["ai_enthusiast"])
+    if level == "simple":
+        style = profile["simple_style"]
+        sections = ["Let's Break It Down Simply", "The Fun Connection", "Real Examples You Know", "Why This Is Cool", "Quick Summary Points"]
+        para_count = "8-10"
+    elif level == "normal":
+        style = profile["normal_style"]
+        sections = profile["sections_normal"]
+        para_count = "10-13"
+    else:  # technical
+        style = profile["tech_style"]
+        sections = profile["sections_tech"]
+        para_count = "12-15"
+
+    sections_str = "\n".join(f"## {s}" for s in sections)
+    return f"""Write a comprehensive {level}-level lesson about "{title}" for {profile['audience']}.
+
+Style guide: {style}
+
+Use EXACTLY these section headers (with ## prefix):
+{sections_str}
+
+Requirements:
+- Total {para_count} substantial paragraphs across all sections
+- Each paragraph must be 3-5 sentences minimum
+- Be specific — use real names, real examples, real numbers
+- Last section (if "Summary" or "Points"): use bullet points with - prefix
+- Write engaging prose, NOT bullet points for the main content
+- NO generic statements. Everything must be specific and vivid.
+
+Return ONLY the raw content text. Start directly with the first ## header. No preamble."""
+
+
+def gemini_lesson_prompt(title: str, path_id: str) -> str:
+    """Gemini generates all levels in one call for efficiency."""
+    profile = TOPIC_PROFILES.get(path_id, TOPIC_PROFILES["ai_enthusiast"])
+    return f"""Write comprehensive educational content about "{title}" for {profile['audience']}.
+{profile['normal_style']}
+
+Return ONLY valid JSON with these keys:
+{{
+  "simple": "8-10 paragraph beginner explanation with ## section headers (sections: Let's Break It Down, The Fun Connection, Real Examples, Why This Is Cool, Quick Summary). Use bullet points with - for the summary section.",
+  "normal": "11-13 paragraph full explanation with ## section headers ({', '.join(profile['sections_normal'])}). Last section use bullets.",
+  "technical": "13-15 paragraph technical deep-dive with ## section headers ({', '.join(profile['sections_tech'])}). Include specific technical details.",
+  "fun_fact": "One surprising counterintuitive fact (2 sentences).",
+  "real_world": "A specific detailed real-world case study (3-4 sentences)."
+}}"""
+
+
+QUIZ_CONTEXT = {
+    "gaming": "Student is 13 and loves Minecraft, PUBG, FIFA, GTA, Roblox. Use specific game mechanics, characters, and scenarios throughout. Every question should relate to gaming.",
+    "business": "Student is 17 and interested in business. Use real Indian companies (Zomato, Flipkart, Paytm, CRED) and global examples (Amazon, Uber). Focus on practical business applications, no coding.",
+    "developer": "Student is 20 and studying CS. Use technical examples with algorithms, data structures, code concepts. Include nuanced technical distinctions.",
+    "ai_enthusiast": "Student is an adult AI enthusiast wanting deep understanding. Include historical context, ethical dimensions, comparisons between approaches, and future implications.",
+}
+
+
+def quiz_prompt(topic_title: str, path_context: str, count: int, easy: int, medium: int, hard: int) -> str:
+    return f"""Generate exactly {count} quiz questions about "{topic_title}" for an AI learning platform.
+{path_context}
+
+Distribution: {easy} easy (basic recall/definitions), {medium} medium (application/understanding), {hard} hard (analysis/synthesis/edge-cases).
+Include True/False questions (about 20% of total) and MCQ for the rest (4 distinct options each).
+
+IMPORTANT: Make questions specific, interesting, and NOT generic. Reference real scenarios.
+
+Return ONLY a valid JSON array, zero markdown, zero explanation. Each element:
+{{"question":"engaging question text","type":"mcq","options":["A","B","C","D"],"correct":"exact text matching one option","explanation":"2-3 sentence explanation with context and why wrong options are wrong","difficulty":"easy"}}
+
+True/False example:
+{{"question":"True or False: ..?","type":"true_false","options":["True","False"],"correct":"True","explanation":"...","difficulty":"easy"}}"""
+
+
+FLASHCARD_CONTEXT = {
+    "gaming": "For a 13-year-old gamer. Every example must reference a real game (Minecraft, PUBG, FIFA, GTA, Roblox, Valorant, etc.). Use gamer language. Make it fun.",
+    "business": "For a 17-year-old business student. Use real companies (Zomato, Flipkart, Amazon, Uber, etc.). Focus on practical business value.",
+    "developer": "For a 20-year-old CS student. Be technical. Include algorithmic concepts, code patterns, and framework names.",
+    "ai_enthusiast": "For an adult AI enthusiast. Be comprehensive and accurate. Include nuance, history, and real-world implications.",
+}
+
+
+def flashcard_prompt(topic: str, path_context: str) -> str:
+    return f"""Generate exactly 25 comprehensive flashcards about "{topic}".
+{path_context}
+
+Each flashcard should be memorable and test real understanding — NOT just rote memorization.
+Cover the topic from multiple angles: definitions, mechanisms, applications, comparisons, edge cases, history.
+
+Return ONLY valid JSON array. Each object:
+{{"front":"concise question or term (max 15 words)","back":"rich explanation (3-4 sentences that really teach)","example":"specific real-world or gaming example (2 sentences)","mnemonic":"memory trick, acronym, or vivid analogy (1-2 sentences, can be empty string if not helpful)"}}"""
+
+
+def gemini_flashcard_prompt(topic: str, path_context: str) -> str:
+    return f"""Generate exactly 15 flashcards about "{topic}". {path_context}
+Return ONLY valid JSON array. Each object:
+{{"front":"concise question or term","back":"3-4 sentence explanation","example":"real-world example","mnemonic":"memory trick or empty string"}}"""
+
+
+# ────────────────────────── Lessons ──────────────────────────
+
+async def topic_content(topic_id: int, path_id: str, wait_all: bool = False) -> bool:
+    """Make sure a topic has lesson content. Returns True once content_normal exists.
+
+    With `wait_all`, also wait for the simple/technical levels instead of
+    leaving them to finish in the background.
+    """
+    key = singleflight.make_key("topic", topic_id, path_id)
+    return await singleflight.do(key, lambda: _generate_topic_content(topic_id, wait_all),
+                                 lambda: _topic_ready(topic_id))
+
+
+def _topic_ready(topic_id: int):
+    db = SessionLocal()
+    try:
+        topic = db.get(Topic, topic_id)
+        return True if topic and topic.content_normal else None
+    finally:
+        db.close()
+
+
+async def _generate_lesson(prompt: str) -> str:
+    try:
+        return await llm.groq.complete([{"role": "user", "content": prompt}],
+                                       max_tokens=3000, temperature=0.75, site="topic_content")
+    except Exception:
+        return ""
+
+
+async def _backfill_lesson_level(topic_id: int, level: str, task: asyncio.Task, normal_content: str):
+    """Store one lesson level once its generation finishes, falling back to the normal lesson."""
+    content = await task
+    await asyncio.to_thread(_save_lesson_level, topic_id, level, content or normal_content)
+
+
+def _save_lesson_level(topic_id: int, level: str, content: str):
+    db = SessionLocal()
+    try:
+        topic = db.get(Topic, topic_id)
+        if topic:
+            setattr(topic, LESSON_COLUMNS[level], content)
+            db.commit()
+            cache.invalidate(f"topic:{topic_id}")
+    finally:
+        db.close()
+
+
+def _topic_info(topic_id: int):
+    """(title, path_id) of a topic, or None."""
+    db = SessionLocal()
+    try:
+        topic = db.get(Topic, topic_id)
+        return (topic.title, topic.path_id) if topic else None
+    finally:
+        db.close()
+
+
+async def _generate_topic_content(topic_id: int, wait_all: bool = False) -> bool:
+    # DB work in these coroutines goes through asyncio.to_thread, keeping the event loop free
+    info = await asyncio.to_thread(_topic_info, topic_id)
+    if not info:
+        return False
+    title, path_id = info
+
+    simple_content = normal_content = tech_content = ""
+    fun_fact = real_world = ""
+    backfilling = []
+
+    if llm.groq.available:
+        # Fan out all three levels at once; return with `normal` and let the others land in the background
+        tasks = {level: asyncio.create_task(_generate_lesson(lesson_prompt(title, path_id, level)))
+                 for level in ("simple", "normal", "technical")}
+        normal_content = await asyncio.shield(tasks["normal"])
+        if normal_content:
+            backfilling = [spawn(_backfill_lesson_level(topic_id, level, tasks[level], normal_content))
+                           for level in ("simple", "technical")]
+        else:
+            tasks["simple"].cancel()
+            tasks["technical"].cancel()
+    elif llm.gemini.available:
+        try:
+            text = await llm.gemini.complete([{"role": "user", "content": gemini_lesson_prompt(title, path_id)}],
+                                             max_tokens=8192, site="topic_content")
+            data = parse_json(text)
+            simple_content = data.get("simple", "")
+            normal_content = data.get("normal", "")
+            tech_content = data.get("technical", "")
+            fun_fact = data.get("fun_fact", "")
+            real_world = data.get("real_world", "")
+        except Exception:
+            pass
+
+    if not normal_content:
+        return False
+
+    levels = {"normal": normal_content}
+    if not backfilling:
+        levels.update(simple=simple_content or normal_content, technical=tech_content or normal_content)
+    await asyncio.to_thread(_save_topic_content, topic_id, levels, fun_fact, real_world)
+    if wait_all and backfilling:
+        await asyncio.gather(*backfilling)
+    return True
+
+
+def _save_topic_content(topic_id: int, levels: dict, fun_fact: str, real_world: str):
+    db = SessionLocal()
+    try:
+        topic = db.get(Topic, topic_id)
+        for level, content in levels.items():
+            setattr(topic, LESSON_COLUMNS[level], content)
+        if not topic.fun_fact and fun_fact:
+            topic.fun_fact = fun_fact
+        if not topic.real_world_example and real_world:
+            topic.real_world_example = real_world
+        db.commit()
+        cache.invalidate(f"topic:{topic_id}")
+    finally:
+        db.close()
+
+
+# ────────────────────────── Quiz pools ──────────────────────────
+
+def _question_dict(q: CachedQuizQuestion) -> dict:
+    return {"question": q.question, "type": q.q_type, "options": json.loads(q.options),
+            "correct": q.correct, "explanation": q.explanation, "difficulty": q.difficulty}
+
+
+QUIZ_BATCHES = [
+    (25, 8, 11, 6),   # count, easy, medium, hard
+    (25, 5, 10, 10),
+]
+
+
+def valid_question(q) -> dict:
+    """The question normalised to the pool schema, or None if it can't be served."""
+    if not isinstance(q, dict):
+        return None
+    text, options, correct = q.get("question"), q.get("options"), q.get("correct")
+    q_type = q.get("type", "mcq")
+    if q_type == "true_false" and not options:
+        options = ["True", "False"]
+    if not (isinstance(text, str) and text.strip() and isinstance(options, list) and isinstance(correct, str)):
+        return None
+    options = [str(o).strip() for o in options if str(o).strip()]
+    if len(options) < 2 or len(set(options)) != len(options):
+        return None
+    if correct.strip() not in options:
+        # LLMs sometimes answer "b" or change the case; map back to the option text
+        by_case = {o.lower(): o for o in options}
+        letters = {chr(ord("a") + i): o for i, o in enumerate(options)}
+        correct = by_case.get(correct.strip().lower()) or letters.get(correct.strip().lower())
+        if correct is None:
+            return None
+    return {
+        "question": text.strip(), "type": q_type if q_type in ("mcq", "true_false") else "mcq",
+        "options": options, "correct": correct.strip(),
+        "explanation": q.get("explanation") if isinstance(q.get("explanation"), str) else "",
+        "difficulty": q.get("difficulty") if q.get("difficulty") in quizbank.DIFFICULTIES else "medium",
+    }
+
+
+async def stream_questions(title: str, path_context: str, batches=QUIZ_BATCHES, progress=None):
+    """Yield valid questions as they close in the streamed replies, with all batches running concurrently.
+
+    A malformed or failed batch only loses its own unparsed questions.
+    """
+    queue = asyncio.Queue()
+    done = 0
+
+    async def run(count, easy, medium, hard):
+        nonlocal done
+        parser = jsonstream.ItemParser()
+        try:
+            prompt = quiz_prompt(title, path_context, count, easy, medium, hard)
+            async for delta in llm.groq.stream([{"role": "user", "content": prompt}], max_tokens=4500, site="quiz"):
+                for item in parser.feed(delta):
+                    queue.put_nowait(item)
+        except Exception:
+            pass
+        finally:
+            done += 1
+            if progress:
+                progress(done / (len(batches) + 1))
+            queue.put_nowait(None)
+
+    tasks = [asyncio.create_task(run(*batch)) for batch in batches]
+    try:
+        remaining = len(tasks)
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                remaining -= 1
+                continue
+            question = valid_question(item)
+            if question:
+                yield question
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def quiz_pool(topic_id: int, path_id: str, known: int = 0, progress=None, on_question=None) -> list:
+    """Generate and cache quiz questions for a topic.
+
+    Returns the topic's whole question pool, existing questions included,
+    or [] if generation produced nothing.
+
+    `progress`, if given, is called with the completed fraction as batches finish.
+    `on_question`, if given, is called with each valid question as soon as it is
+    parsed — only when this call ends up running the generation itself.
+    """
+    key = singleflight.make_key("quiz", topic_id, path_id)
+    return await singleflight.do(key, lambda: _generate_quiz_pool(topic_id, path_id, progress, on_question),
+                                 lambda: _quiz_pool_if_grown(topic_id, known))
+
+
+def _quiz_pool_if_grown(topic_id: int, known: int):
+    db = SessionLocal()
+    try:
+        rows = db.query(CachedQuizQuestion).filter(CachedQuizQuestion.topic_id == topic_id).all()
+        return [_question_dict(q) for q in rows] if len(rows) > known else None
+    finally:
+        db.close()
+
+
+async def _generate_quiz_pool(topic_id: int, path_id: str, progress=None, on_question=None) -> list:
+    info = await asyncio.to_thread(_topic_info, topic_id)
+    title = info[0] if info else ""
+    ctx = QUIZ_CONTEXT.get(path_id, "Make questions clear and educational with specific examples.")
+
+    all_new_questions = []
+
+    # ── Primary: Groq, both batches streamed at once ──
+    if llm.groq.available:
+        async for question in stream_questions(title, ctx, progress=progress):
+            all_new_questions.append(question)
+            if on_question:
+                on_question(question)
+
+    # ── Fallback: Gemini (generate 20 questions) ──
+    if not all_new_questions and llm.gemini.available:
+        try:
+            prompt = quiz_prompt(title, ctx, 20, 6, 8, 6)
+            text = await llm.gemini.complete([{"role": "user", "content": prompt}], max_tokens=8192, site="quiz")
+            parsed = parse_json(text)
+            all_new_questions = [q for q in map(valid_question, parsed if isinstance(parsed, list) else []) if q]
+            if on_question:
+                for question in all_new_questions:
+                    on_question(question)
+        except Exception:
+            pass
+
+    if not all_new_questions:
+        return []
+    return await asyncio.to_thread(_save_quiz_questions, topic_id, all_new_questions)
+
+
+def _save_quiz_questions(topic_id: int, questions: list) -> list:
+    """Append `questions` to the topic's pool and return the merged pool."""
+    db = SessionLocal()
+    try:
+        for q in questions:
+            db.add(CachedQuizQuestion(
+                topic_id=topic_id,
+                question=q["question"],
+                q_type=q["type"],
+                options=json.dumps(q["options"]),
+                correct=q["correct"],
+                explanation=q["explanation"],
+                difficulty=q["difficulty"],
+            ))
+        db.commit()
+        quizbank.invalidate(topic_id)
+        rows = db.query(CachedQuizQuestion).filter(CachedQuizQuestion.topic_id == topic_id).all()
+        return [_question_dict(q) for q in rows]
+    finally:
+        db.close()
+
+
+# ────────────────────────── Flashcards ──────────────────────────
+
+async def flashcard_deck(topic_name: str, path_id: str, known: int = 0) -> list:
+    """Generate and cache flashcards for a topic. Returns the cached cards (may be empty)."""
+    key = singleflight.make_key("flashcards", topic_name, path_id)
+    return await singleflight.do(key, lambda: _generate_flashcard_deck(topic_name, path_id),
+                                 lambda: _flashcards_if_grown(topic_name, path_id, known))
+
+
+def _flashcards_if_grown(topic_name: str, path_id: str, known: int):
+    db = SessionLocal()
+    try:
+        rows = db.query(CachedFlashcard).filter(
+            CachedFlashcard.topic_name == topic_name, CachedFlashcard.path_id == path_id
+        ).all()
+        if len(rows) <= known:
+            return None
+        return [{"front": c.front, "back": c.back, "example": c.example, "mnemonic": c.mnemonic}
+                for c in rows]
+    finally:
+        db.close()
+
+
+def valid_card(c) -> dict:
+    """The card normalised to the cache schema, or None if it has no front or back."""
+    if not isinstance(c, dict):
+        return None
+    front, back = c.get("front"), c.get("back")
+    if not (isinstance(front, str) and front.strip() and isinstance(back, str) and back.strip()):
+        return None
+    example, mnemonic = c.get("example"), c.get("mnemonic")
+    return {"front": front.strip(), "back": back.strip(),
+            "example": example if isinstance(example, str) else "",
+            "mnemonic": mnemonic if isinstance(mnemonic, str) else ""}
+
+
+def _parse_cards(text: str) -> list:
+    parsed = parse_json(text)
+    return [c for c in map(valid_card, parsed if isinstance(parsed, list) else []) if c]
+
+
+async def _generate_flashcard_deck(topic_name: str, path_id: str) -> list:
+    ctx = FLASHCARD_CONTEXT.get(path_id, "Use clear explanations with concrete examples.")
+
+    new_cards = []
+
+    # ── Primary: Groq (25 flashcards) ──
+    if llm.groq.available:
+        try:
+            text = await llm.groq.complete([{"role": "user", "content": flashcard_prompt(topic_name, ctx)}],
+                                           max_tokens=5000, site="flashcards")
+            new_cards = _parse_cards(text)
+        except Exception:
+            new_cards = []
+
+    # ── Fallback: Gemini (15 flashcards) ──
+    if not new_cards and llm.gemini.available:
+        try:
+            text = await llm.gemini.complete([{"role": "user", "content": gemini_flashcard_prompt(topic_name, ctx)}],
+                                             max_tokens=8192, site="flashcards")
+            new_cards = _parse_cards(text)
+        except Exception:
+            pass
+
+    if not new_cards:
+        return []
+    await asyncio.to_thread(_save_flashcards, topic_name, path_id, new_cards)
+    return new_cards
+
+
+def _save_flashcards(topic_name: str, path_id: str, cards: list):
+    db = SessionLocal()
+    try:
+        for c in cards:
+            db.add(CachedFlashcard(
+                topic_name=topic_name,
+                path_id=path_id,
+                front=c["front"],
+                back=c["back"],
+                example=c["example"],
+                mnemonic=c["mnemonic"],
+            ))
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,246 @@
+"""
+jobs.py — Durable background queue for AI content generation.
+
+Cache misses enqueue a job and answer 202 right away; a small pool of
+async workers drains `generation_jobs` and clients poll /api/jobs/{id}.
+Jobs live in the database, so a restart picks up whatever was queued or
+left running by a dead worker. Job starts are rate-limited per LLM
+provider so a burst of misses cannot trip Groq/Gemini quotas.
+
+    jobs.register("quiz", run_quiz_job)          # async (params, progress) -> dict
+    job = jobs.enqueue(db, "quiz", key, params)  # dedupes on key while active
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+import llm
+from llm import RateLimiter
+from database import SessionLocal, upsert
+from models import GenerationJob
+from singleflight import WORKER_ID
+
+WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+POLL_INTERVAL = 1.0
+STALE_SECONDS = 300       # a running job with no heartbeat for this long is requeued
+HEARTBEAT_SECONDS = 30
+RETENTION = timedelta(hours=int(os.getenv("JOB_RETENTION_HOURS", "24")))
+
+ACTIVE = ("queued", "running")
+
+log = logging.getLogger(__name__)
+
+_handlers = {}
+_wakeup = None
+_loop = None
+_workers = []
+_last_recover = 0.0
+
+
+RATE_LIMITS = {
+    "groq": RateLimiter(float(os.getenv("GROQ_JOBS_PER_MINUTE", "30"))),
+    "gemini": RateLimiter(float(os.getenv("GEMINI_JOBS_PER_MINUTE", "15"))),
+}
+
+
+def register(kind: str, handler):
+    _handlers[kind] = handler
+
+
+def _provider() -> str:
+    return "groq" if llm.groq.available else "gemini"
+
+
+# ────────────────────────── Queue API ──────────────────────────
+
+def enqueue(db: Session, kind: str, key: str, params: dict) -> GenerationJob:
+    """Queue a job, or return the active job already working on `key`."""
+    active = db.query(GenerationJob).filter(GenerationJob.key == key, GenerationJob.status.in_(ACTIVE))
+    job = active.first()
+    if job:
+        return job
+    # DO NOTHING on uq_generation_jobs_active_key: a concurrent miss may queue the same key first
+    inserted = db.execute(upsert(db, GenerationJob).values(
+        kind=kind, key=key, params=json.dumps(params), status="queued"
+    ).on_conflict_do_nothing(index_elements=[GenerationJob.key],
+                             index_where=GenerationJob.status.in_(ACTIVE))).rowcount == 1
+    db.commit()
+    if inserted and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)   # routes call this from the threadpool
+    # None only if the job that won the race has already finished
+    return active.first() or enqueue(db, kind, key, params)
+
+
+def describe(job: GenerationJob) -> dict:
+    out = {"id": job.id, "kind": job.kind, "status": job.status,
+           "progress": round(job.progress or 0, 2), "attempts": job.attempts}
+    if job.status == "done":
+        out["result"] = json.loads(job.result) if job.result else None
+    if job.status == "failed":
+        out["error"] = job.error
+    return out
+
+
+def accepted(job: GenerationJob) -> dict:
+    """Body for a 202 response pointing the client at the job."""
+    return {"job_id": job.id, "status": job.status, "poll": f"/api/jobs/{job.id}"}
+
+
+# ────────────────────────── Worker pool ──────────────────────────
+
+def _claim() -> tuple:
+    """Atomically move the oldest queued job to running. Returns (id, kind, params) or None."""
+    db = SessionLocal()
+    try:
+        candidates = db.query(GenerationJob.id).filter(
+            GenerationJob.status == "queued"
+        ).order_by(GenerationJob.id).limit(5).all()
+        for (job_id,) in candidates:
+            now = datetime.utcnow()
+            claimed = db.query(GenerationJob).filter(
+                GenerationJob.id == job_id, GenerationJob.status == "queued"
+            ).update({"status": "running", "owner": WORKER_ID, "heartbeat_at": now,
+                      "attempts": GenerationJob.attempts + 1}, synchronize_session=False)
+            db.commit()
+            if claimed:
+                job = db.get(GenerationJob, job_id)
+                return job.id, job.kind, json.loads(job.params or "{}")
+        return None
+    finally:
+        db.close()
+
+
+def _update(job_id: int, **fields):
+    db = SessionLocal()
+    try:
+        db.query(GenerationJob).filter(GenerationJob.id == job_id).update(fields, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _finish(job_id: int, result=None, error: str = None):
+    db = SessionLocal()
+    try:
+        job = db.get(GenerationJob, job_id)
+        if error is None:
+            job.status, job.progress, job.result = "done", 1.0, json.dumps(result)
+        elif job.attempts < MAX_ATTEMPTS:
+            job.status, job.owner = "queued", ""
+        else:
+            job.status, job.error = "failed", error
+        if job.status != "queued":
+            job.finished_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _run(job_id: int, kind: str, params: dict):
+    # Job rows are written from worker threads (asyncio.to_thread), never on the event loop
+    latest = {}
+    changed = asyncio.Event()
+    done = False
+
+    def progress(fraction: float):
+        latest["progress"] = fraction
+        changed.set()
+
+    async def report():
+        """Write progress as it changes, and a heartbeat at least every HEARTBEAT_SECONDS, in order."""
+        while not done:
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+            await asyncio.to_thread(_update, job_id, heartbeat_at=datetime.utcnow(), **latest)
+
+    handler = _handlers.get(kind)
+    if handler is None:
+        await asyncio.to_thread(_finish, job_id, None, f"unknown job kind {kind!r}")
+        return
+    reporter = asyncio.create_task(report())
+    result = error = None
+    try:
+        await RATE_LIMITS[_provider()].acquire()
+        result = await handler(params, progress)
+    except asyncio.CancelledError:
+        reporter.cancel()
+        # Shutting down — let the next worker retry
+        await asyncio.to_thread(_update, job_id, status="queued", owner="")
+        raise
+    except Exception as e:
+        error = repr(e)
+    # Let the last progress write land before the job is marked finished
+    done = True
+    changed.set()
+    await asyncio.gather(reporter, return_exceptions=True)
+    await asyncio.to_thread(_finish, job_id, result, error)
+
+
+async def _worker():
+    while True:
+        try:
+            await _step()
+        except Exception:
+            # A failed claim or job-row write must not end the worker; a job
+            # it left running is requeued by recover() once its heartbeat is stale
+            log.exception("generation job worker error")
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+async def _step():
+    """Claim and run one job, or wait up to POLL_INTERVAL for one to be queued."""
+    global _last_recover
+    if time.monotonic() - _last_recover > STALE_SECONDS:
+        _last_recover = time.monotonic()
+        await asyncio.to_thread(recover)
+    claimed = await asyncio.to_thread(_claim)
+    if claimed is None:
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        return
+    await _run(*claimed)
+
+
+def recover():
+    """Requeue jobs orphaned by a dead worker and prune old finished ones."""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        db.query(GenerationJob).filter(
+            GenerationJob.status == "running",
+            GenerationJob.heartbeat_at < now - timedelta(seconds=STALE_SECONDS),
+        ).update({"status": "queued", "owner": ""}, synchronize_session=False)
+        db.query(GenerationJob).filter(
+            GenerationJob.status.in_(("done", "failed")),
+            GenerationJob.finished_at < now - RETENTION,
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def start(workers: int = WORKERS):
+    global _wakeup, _loop
+    _wakeup = asyncio.Event()
+    _loop = asyncio.get_running_loop()
+    for _ in range(workers):
+        _workers.append(asyncio.create_task(_worker()))
+
+
+async def stop():
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -0,0 +1,113 @@
+"""
+jsonstream.py — Incremental, fault-tolerant parsing of LLM JSON replies.
+
+`ItemParser` is fed a reply chunk by chunk (as it streams) and hands back
+each element of the top-level JSON array as soon as its closing bracket
+arrives. Text before the array (```json fences, a chatty preamble) is
+skipped, and an element that fails to parse is counted and dropped rather
+than losing the rest of the array. A reply cut off by max_tokens still
+yields every element that closed.
+
+    parser = ItemParser()
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            ...
+
+`parse()` is the whole-reply version used wherever a reply arrives in one
+piece.
+"""
+import json
+
+
+class ItemParser:
+    """Yields the elements of a streamed top-level JSON array as they complete."""
+
+    def __init__(self):
+        self.started = False      # seen the opening "["
+        self.finished = False     # seen the closing "]"
+        self.depth = 0            # nesting inside the array (1 = between elements)
+        self.in_string = False
+        self.escaped = False
+        self.item = []            # characters of the element being read
+        self.errors = 0           # elements that failed to parse
+
+    def feed(self, chunk: str) -> list:
+        items = []
+        for ch in chunk:
+            if self.finished:
+                break
+            if not self.started:
+                if ch == "[":
+                    self.started, self.depth = True, 1
+                continue
+            if self.depth > 1 or self.in_string:
+                self.item.append(ch)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self._close(items)   # a bare string element
+                continue
+            if ch == '"':
+                self.in_string = True
+                if self.depth == 1:
+                    self.item.append(ch)
+            elif ch in "[{":
+                if self.depth == 1:
+                    self.item.append(ch)
+                self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if self.depth == 1:
+                    self._close(items)
+                elif self.depth == 0:
+                    self._close(items)       # trailing scalar before "]"
+                    self.finished = True
+            elif self.depth == 1:
+                if ch == ",":
+                    self._close(items)
+                elif not ch.isspace():
+                    self.item.append(ch)     # scalar element (number, true, null)
+        return items
+
+    def _close(self, items: list):
+        text = "".join(self.item).strip()
+        self.item = []
+        if not text:
+            return
+        try:
+            items.append(json.loads(text))
+        except ValueError:
+            self.errors += 1
+
+
+def strip_fences(text: str) -> str:
+    """The body of a ```json fenced reply, or the text unchanged."""
+    text = text.strip()
+    if "```" in text:
+        parts = text.split("```")
+        text = parts[1] if len(parts) > 1 else text
+        if text.startswith("json"):
+            text = text[4:]
+        text = text.rsplit("```", 1)[0]
+    return text.strip()
+
+
+def parse(text: str):
+    """Parse an LLM JSON reply, tolerating fences around it.
+
+    If the reply is not valid JSON but holds an array, the elements that
+    do parse are returned, so one broken element doesn't sink the rest.
+    """
+    body = strip_fences(text)
+    try:
+        return json.loads(body)
+    except ValueError:
+        items = ItemParser().feed(body) if body.startswith("[") else []
+        if items:
+            return items
+        raise
@@ -0,0 +1,277 @@
+"""
+leaderboard.py — In-memory rankings per period, updated as XP is earned.
+
+Each period ("all", "daily", "weekly", "monthly") keeps every student's XP
+in an indexable skip list ordered by (-xp, student_id), so top-K, a
+student's rank and their neighbours are O(log N) lookups. The all-time
+board mirrors `Student.total_xp`; the others are rolling windows (last
+24h / 7 days / 30 days) summed from `XPLog`, with entries subtracted again
+as they age out of the window.
+
+XP is recorded against the request's session with `record()` and only
+applied once that session commits, so a rolled-back request never moves
+the board. The boards are rebuilt from the database on first use and every
+LEADERBOARD_REFRESH_SECONDS, which also picks up XP written by other
+workers.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+
+from database import SessionLocal
+from models import Student, XPLog
+
+PERIODS = {
+    "all": None,
+    "daily": timedelta(days=1),
+    "weekly": timedelta(days=7),
+    "monthly": timedelta(days=30),
+}
+REFRESH_SECONDS = int(os.getenv("LEADERBOARD_REFRESH_SECONDS", "300"))
+
+_PENDING = "leaderboard_pending"
+
+
+# ────────────────────────── Ranked set ──────────────────────────
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, height: int):
+        self.key = key
+        self.next = [None] * height
+        self.width = [1] * height
+
+
+class RankedSet:
+    """Indexable skip list: ordered keys with O(log N) insert, remove, rank and index."""
+
+    MAX_HEIGHT = 24
+
+    def __init__(self):
+        self.head = _Node(None, self.MAX_HEIGHT)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _path(self, key):
+        """Last node before `key` on every level, and its 0-based position (head = -1)."""
+        node, pos = self.head, -1
+        chain, positions = [None] * self.MAX_HEIGHT, [0] * self.MAX_HEIGHT
+        for level in reversed(range(self.MAX_HEIGHT)):
+            while node.next[level] is not None and node.next[level].key < key:
+                pos += node.width[level]
+                node = node.next[level]
+            chain[level], positions[level] = node, pos
+        return chain, positions
+
+    def add(self, key):
+        height = 1
+        while height < self.MAX_HEIGHT and random.random() < 0.5:
+            height += 1
+        new = _Node(key, height)
+        chain, positions = self._path(key)
+        index = positions[0] + 1
+        for level in range(self.MAX_HEIGHT):
+            prev = chain[level]
+            if level < height:
+                new.next[level] = prev.next[level]
+                prev.next[level] = new
+                skipped = index - positions[level]   # steps from prev to the new node
+                new.width[level] = prev.width[level] - skipped + 1
+                prev.width[level] = skipped
+            else:
+                prev.width[level] += 1
+        self.size += 1
+
+    def remove(self, key):
+        chain, _ = self._path(key)
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for level in range(self.MAX_HEIGHT):
+            prev = chain[level]
+            if prev.next[level] is target:
+                prev.width[level] += target.width[level] - 1
+                prev.next[level] = target.next[level]
+            else:
+                prev.width[level] -= 1
+        self.size -= 1
+
+    def index(self, key) -> int:
+        """0-based position of `key`."""
+        chain, positions = self._path(key)
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        return positions[0] + 1
+
+    def slice(self, start: int, stop: int) -> list:
+        """Keys at positions [start, stop)."""
+        start, stop = max(start, 0), min(stop, self.size)
+        if start >= stop:
+            return []
+        node, pos = self.head, -1
+        for level in reversed(range(self.MAX_HEIGHT)):
+            while node.next[level] is not None and pos + node.width[level] < start:
+                pos += node.width[level]
+                node = node.next[level]
+        keys = []
+        while pos < stop - 1:
+            node = node.next[0]
+            pos += 1
+            keys.append(node.key)
+        return keys
+
+
+# ────────────────────────── Boards ──────────────────────────
+
+class Board:
+    """XP per student for one period, ranked. Windowed boards expire old XP on access."""
+
+    def __init__(self, window: timedelta = None):
+        self.window = window
+        self.scores = {}
+        self.ranking = RankedSet()
+        self.recent = deque()   # (at, student_id, amount), oldest first
+
+    def _set(self, student_id: int, xp: int):
+        old = self.scores.get(student_id)
+        if old is not None:
+            self.ranking.remove((-old, student_id))
+        self.scores[student_id] = xp
+        self.ranking.add((-xp, student_id))
+
+    def load(self, scores: dict, recent: list):
+        """Fill an empty board: final per-student XP plus the window's entries, oldest first."""
+        for student_id, xp in scores.items():
+            self._set(student_id, xp)
+        self.recent.extend(recent)
+
+    def add(self, student_id: int, amount: int, at: datetime):
+        if self.window is not None:
+            if at < datetime.utcnow() - self.window:
+                return
+            self.recent.append((at, student_id, amount))
+        self._set(student_id, self.scores.get(student_id, 0) + amount)
+
+    def expire(self, now: datetime):
+        if self.window is None:
+            return
+        cutoff = now - self.window
+        while self.recent and self.recent[0][0] < cutoff:
+            _, student_id, amount = self.recent.popleft()
+            self._set(student_id, self.scores[student_id] - amount)
+
+    def top(self, k: int, offset: int = 0) -> list:
+        """[(student_id, xp)] for ranks offset+1 .. offset+k."""
+        return [(sid, -neg) for neg, sid in self.ranking.slice(offset, offset + k)]
+
+    def rank(self, student_id: int):
+        """1-based rank, or None if the student isn't on the board."""
+        xp = self.scores.get(student_id)
+        return None if xp is None else self.ranking.index((-xp, student_id)) + 1
+
+
+_boards = {}
+_built_at = 0.0
+_lock = threading.RLock()          # guards the boards
+_build_lock = threading.Lock()     # one rebuild at a time
+
+
+def rebuild():
+    """Reload every board from the database."""
+    global _boards, _built_at
+    since = datetime.utcnow() - max(w for w in PERIODS.values() if w)
+    db = SessionLocal()
+    try:
+        students = db.execute(select(Student.id, Student.total_xp).where(Student.role == "student")).all()
+        recent = db.execute(select(XPLog.student_id, XPLog.amount, XPLog.created_at)
+                            .where(XPLog.created_at >= since).order_by(XPLog.created_at)).all()
+    finally:
+        db.close()
+
+    totals = {sid: total_xp or 0 for sid, total_xp in students}
+    boards = {"all": Board()}
+    boards["all"].load(totals, [])
+    now = datetime.utcnow()
+    for period, window in PERIODS.items():
+        if window:
+            # admins and deleted students aren't ranked
+            entries = [(at, sid, amount) for sid, amount, at in recent
+                       if sid in totals and at >= now - window]
+            scores = dict.fromkeys(totals, 0)
+            for _, sid, amount in entries:
+                scores[sid] += amount
+            boards[period] = Board(window)
+            boards[period].load(scores, entries)
+    with _lock:
+        _boards, _built_at = boards, time.monotonic()
+
+
+def board(period: str = "all") -> Board:
+    if not _boards or time.monotonic() - _built_at > REFRESH_SECONDS:
+        with _build_lock:
+            # A commit landing between the rebuild's read and the swap can be
+            # missed or counted twice; the next rebuild settles it
+            if not _boards or time.monotonic() - _built_at > REFRESH_SECONDS:
+                rebuild()
+    b = _boards[period]
+    with _lock:
+        b.expire(datetime.utcnow())
+    return b
+
+
+def top(period: str = "all", k: int = 50, offset: int = 0) -> list:
+    b = board(period)
+    with _lock:
+        return b.top(k, offset)
+
+
+def standing(student_id: int, period: str = "all", neighbours: int = 2):
+    """(rank, xp, [(rank, student_id, xp)] around the student), or None if unranked."""
+    b = board(period)
+    with _lock:
+        rank = b.rank(student_id)
+        if rank is None:
+            return None
+        start = max(rank - 1 - neighbours, 0)
+        around = b.top(rank - start + neighbours, start)
+        return rank, b.scores[student_id], [(start + i + 1, sid, xp) for i, (sid, xp) in enumerate(around)]
+
+
+def leader(exclude: int = None):
+    """(student_id, total_xp) of the all-time leader, skipping `exclude`; None if nobody else."""
+    for sid, xp in top("all", 2):
+        if sid != exclude:
+            return sid, xp
+    return None
+
+
+# ────────────────────────── Session hooks ──────────────────────────
+
+def record(db, student_id: int, amount: int):
+    """Queue a student's XP for the boards; applied when `db` commits. Callers skip admins."""
+    db.info.setdefault(_PENDING, []).append((student_id, amount, datetime.utcnow()))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _apply(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending or not _boards:
+        return   # not built yet — the first rebuild reads it from the database
+    with _lock:
+        for sid, amount, at in pending:
+            for b in _boards.values():
+                b.add(sid, amount, at)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard(session):
+    session.info.pop(_PENDING, None)
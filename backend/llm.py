@@ -0,0 +1,383 @@
+"""
+llm.py — Async LLM client layer shared by every AI feature.
+
+Groq and Gemini sit behind the same `Provider` interface:
+
+    text = await llm.groq.complete(messages, max_tokens=1024)
+    async for delta in llm.groq.stream(messages):
+        ...
+
+Each provider keeps a pooled keep-alive connection, caps in-flight calls
+with a semaphore, applies timeouts and retries transient failures with
+jittered exponential backoff. An optional token-bucket `limiter` paces
+requests, and `StubProvider` stands in for a real backend offline. Every
+call is timed and counted per provider and call site (`site=`) in `metrics`.
+"""
+import asyncio
+import contextvars
+import importlib.util
+import json
+import os
+import random
+import time
+
+import httpx
+
+import metrics
+
+GROQ_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MODEL = "llama-3.3-70b-versatile"
+GEMINI_MODEL = "gemini-1.5-flash"
+
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5   # seconds
+BACKOFF_CAP = 8.0
+
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+_site = contextvars.ContextVar("llm_site", default="other")   # call site of the current request, for metrics
+
+
+def _installed(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ImportError:   # parent package missing
+        return False
+
+
+class LLMError(Exception):
+    """Raised when a provider call fails for good (after retries)."""
+
+
+class RetryableError(LLMError):
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Full-jitter exponential backoff, never shorter than a server-sent Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+
+class RateLimiter:
+    """Token bucket: `per_minute` acquisitions per minute with bursts up to `burst`."""
+
+    def __init__(self, per_minute: float, burst: int = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, int(per_minute // 6))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Provider:
+    """Common interface for chat-completion backends."""
+    name = "base"
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_retries: int = MAX_RETRIES):
+        self.max_retries = max_retries
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._loop = None
+        self.limiter = None   # optional RateLimiter, acquired once per HTTP attempt
+        self.calls = 0
+
+    @property
+    def available(self) -> bool:
+        return False
+
+    def _bind_loop(self):
+        """Pools and semaphores belong to one event loop; rebuild them if the loop changes."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._reset_pool()
+
+    def _reset_pool(self):
+        pass
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        self._bind_loop()
+        return self._semaphore
+
+    async def complete(self, messages: list, max_tokens: int = 1024, temperature: float = 0.7,
+                       site: str = "other") -> str:
+        """`site` names the feature making the call (chat, quiz, ...) in the metrics."""
+        token = _site.set(site)
+        started, ok = time.perf_counter(), True
+        try:
+            async with self.semaphore:
+                for attempt in range(self.max_retries + 1):
+                    await self._pace()
+                    try:
+                        return await self._complete(messages, max_tokens, temperature)
+                    except RetryableError as e:
+                        if attempt == self.max_retries:
+                            raise LLMError(f"{self.name}: {e}") from e
+                        await asyncio.sleep(backoff_delay(attempt, e.retry_after))
+        except Exception:
+            ok = False   # cancellation isn't counted as an error
+            raise
+        finally:
+            _site.reset(token)
+            metrics.llm_call(self.name, site, time.perf_counter() - started, ok)
+
+    async def stream(self, messages: list, max_tokens: int = 1024, temperature: float = 0.7,
+                     site: str = "other"):
+        """Yield content deltas. Retries only happen before the first delta is sent."""
+        token = _site.set(site)
+        started, ok = time.perf_counter(), True
+        try:
+            async with self.semaphore:
+                for attempt in range(self.max_retries + 1):
+                    sent = False
+                    await self._pace()
+                    try:
+                        async for delta in self._stream(messages, max_tokens, temperature):
+                            sent = True
+                            yield delta
+                        return
+                    except RetryableError as e:
+                        if sent or attempt == self.max_retries:
+                            raise LLMError(f"{self.name}: {e}") from e
+                        await asyncio.sleep(backoff_delay(attempt, e.retry_after))
+        except Exception:
+            ok = False
+            raise
+        finally:
+            try:
+                _site.reset(token)
+            except ValueError:
+                pass   # finished from another task's context (e.g. closed on disconnect)
+            metrics.llm_call(self.name, site, time.perf_counter() - started, ok)
+
+    def _usage(self, prompt_tokens: int, completion_tokens: int):
+        metrics.llm_usage(self.name, _site.get(), prompt_tokens or 0, completion_tokens or 0)
+
+    async def _pace(self):
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        self.calls += 1
+
+    async def aclose(self):
+        pass
+
+    async def _complete(self, messages, max_tokens, temperature) -> str:
+        raise NotImplementedError
+
+    async def _stream(self, messages, max_tokens, temperature):
+        yield await self._complete(messages, max_tokens, temperature)
+
+
+class GroqProvider(Provider):
+    name = "groq"
+
+    def __init__(self, api_key: str = None, url: str = GROQ_URL, model: str = GROQ_MODEL, **kwargs):
+        super().__init__(**kwargs)
+        self._api_key = api_key
+        self.url = url
+        self.model = model
+        self._client = None
+
+    @property
+    def api_key(self) -> str:
+        # Read on use, so a key loaded from .env after this module was imported still counts
+        return self._api_key if self._api_key is not None else os.getenv("GROQ_API_KEY", "")
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _reset_pool(self):
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        self._bind_loop()
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(TIMEOUT, connect=10.0),
+                limits=httpx.Limits(max_connections=self._max_concurrency,
+                                    max_keepalive_connections=self._max_concurrency),
+            )
+        return self._client
+
+    def _payload(self, messages, max_tokens, temperature, stream=False) -> dict:
+        payload = {"model": self.model, "messages": messages,
+                   "max_tokens": max_tokens, "temperature": temperature}
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    @staticmethod
+    def _check(resp: httpx.Response):
+        if resp.status_code in RETRY_STATUSES:
+            retry_after = resp.headers.get("retry-after")
+            raise RetryableError(f"HTTP {resp.status_code}",
+                                 float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if resp.status_code >= 400:
+            raise LLMError(f"groq: HTTP {resp.status_code}")
+
+    async def _complete(self, messages, max_tokens, temperature) -> str:
+        try:
+            resp = await self.client.post(self.url, json=self._payload(messages, max_tokens, temperature))
+        except httpx.TransportError as e:
+            raise RetryableError(repr(e)) from e
+        self._check(resp)
+        body = resp.json()
+        usage = body.get("usage") or {}
+        self._usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return body["choices"][0]["message"]["content"]
+
+    async def _stream(self, messages, max_tokens, temperature):
+        payload = self._payload(messages, max_tokens, temperature, stream=True)
+        try:
+            async with self.client.stream("POST", self.url, json=payload) as resp:
+                if resp.status_code >= 400:
+                    await resp.aread()
+                self._check(resp)
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    # Groq reports usage on the last chunk (under x_groq; OpenAI style at the top level)
+                    usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+                    if usage:
+                        self._usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                    choices = chunk.get("choices") or [{}]
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+        except httpx.TransportError as e:
+            raise RetryableError(repr(e)) from e
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class GeminiProvider(Provider):
+    """Gemini through the google-generativeai SDK.
+
+    The SDK is slow to import (grpc, protobuf), so it is loaded on the first
+    call rather than when the app starts.
+    """
+    name = "gemini"
+
+    def __init__(self, api_key: str = None, model: str = GEMINI_MODEL, **kwargs):
+        super().__init__(**kwargs)
+        self._api_key = api_key
+        self.model_name = model
+        self._model = None
+        self._sdk = None
+
+    @property
+    def api_key(self) -> str:
+        return self._api_key if self._api_key is not None else os.getenv("GEMINI_API_KEY", "")
+
+    @property
+    def available(self) -> bool:
+        if not self.api_key:
+            return False
+        if self._sdk is None:
+            self._sdk = _installed("google.generativeai")   # find_spec locates the SDK without importing it
+        return self._sdk
+
+    @property
+    def model(self):
+        if self._model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    @staticmethod
+    def _prompt(messages: list) -> str:
+        # Gemini takes a single prompt here; our callers send one user turn
+        return "\n\n".join(m["content"] for m in messages)
+
+    async def _complete(self, messages, max_tokens, temperature) -> str:
+        try:
+            response = await asyncio.wait_for(
+                self.model.generate_content_async(
+                    self._prompt(messages),
+                    generation_config={"max_output_tokens": max_tokens, "temperature": temperature},
+                ),
+                timeout=TIMEOUT,
+            )
+        except asyncio.TimeoutError as e:
+            raise RetryableError("timeout") from e
+        except Exception as e:
+            if "429" in str(e) or "503" in str(e) or "500" in str(e):
+                raise RetryableError(str(e)) from e
+            raise LLMError(f"gemini: {e}") from e
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            self._usage(getattr(usage, "prompt_token_count", 0), getattr(usage, "candidates_token_count", 0))
+        return response.text
+
+
+class StubProvider(Provider):
+    """Offline stand-in that answers after `latency` seconds with canned JSON.
+
+    The reply shape follows the prompt (lesson JSON, quiz array or flashcard
+    array) so the generation code paths run end to end without network.
+    """
+    name = "stub"
+
+    def __init__(self, latency: float = 0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    async def _complete(self, messages, max_tokens, temperature) -> str:
+        await asyncio.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        if "flashcards" in prompt:
+            return json.dumps([{"front": f"Term {i}", "back": "Stub explanation.", "example": "Stub example.",
+                                "mnemonic": ""} for i in range(25)])
+        if "quiz questions" in prompt:
+            return json.dumps([{"question": f"Stub question {i}?", "type": "mcq", "options": ["A", "B", "C", "D"],
+                                "correct": "A", "explanation": "Stub explanation.",
+                                "difficulty": ("easy", "medium", "hard")[i % 3]} for i in range(25)])
+        if "Return ONLY valid JSON" in prompt:
+            return json.dumps({level: "## Stub\n\nStub lesson." for level in ("simple", "normal", "technical")}
+                              | {"fun_fact": "Stub fact.", "real_world": "Stub example."})
+        return "## Stub\n\nStub lesson paragraph."
+
+
+# Keys come from GROQ_API_KEY / GEMINI_API_KEY, read when first needed
+groq = GroqProvider()
+gemini = GeminiProvider()
+
+
+async def aclose():
+    await groq.aclose()
+    await gemini.aclose()
@@ -1,80 +1,66 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, desc
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from pathlib import Path
+from contextlib import asynccontextmanager
+import asyncio
 import json
 import os
-import random
+import time
 
-from database import get_db, engine, Base
-from models import *
-
-# Load env vars
+# Load env vars — before the local imports below, which read settings at import time
 try:
     from dotenv import load_dotenv
     load_dotenv()
 except Exception:
     pass
 
-import urllib.request
-import urllib.error
-
-# ── Groq — uses stdlib urllib, NO groq package needed ──
-GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
-GROQ_AVAILABLE = bool(GROQ_API_KEY)
-
-def groq_chat(messages: list, max_tokens: int = 1024, temperature: float = 0.7) -> str:
-    """Call Groq chat completions using stdlib only — zero external deps."""
-    payload = json.dumps({
-        "model": "llama-3.3-70b-versatile",
-        "messages": messages,
-        "max_tokens": max_tokens,
-        "temperature": temperature,
-    }).encode("utf-8")
-    req = urllib.request.Request(
-        "https://api.groq.com/openai/v1/chat/completions",
-        data=payload,
-        headers={
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json",
-        },
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        data = json.loads(resp.read().decode("utf-8"))
-    return data["choices"][0]["message"]["content"]
-
-# ── Groq SDK — optional, used if available for convenience ──
-groq_client = None
-try:
-    from groq import Groq as GroqClient
-    if GROQ_API_KEY:
-        groq_client = GroqClient(api_key=GROQ_API_KEY)
-except Exception:
-    pass  # Falls back to groq_chat() using urllib
-
-# ── Gemini — for quiz/content generation as secondary ──
-try:
-    import google.generativeai as genai
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    if api_key:
-        genai.configure(api_key=api_key)
-        gemini_model = genai.GenerativeModel("gemini-1.5-flash")
-        GEMINI_AVAILABLE = True
-    else:
-        GEMINI_AVAILABLE = False
-except Exception:
-    GEMINI_AVAILABLE = False
-
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="AI Learning Nephews", version="1.0.0")
+import database
+from database import get_db, get_async_db, SessionLocal, upsert
+from models import *
+import badges
+import cache
+import chat_context
+import leaderboard
+import metrics
+import profiling
+import quizbank
+import semantic_cache
+
+# ── LLM providers — Groq (primary) and Gemini (fallback) behind one async client layer ──
+import llm
+import generation
+import jobs
+import singleflight
+
+GROQ_AVAILABLE = llm.groq.available
+GEMINI_AVAILABLE = llm.gemini.available
+
+# Set to 0 when migrations run as a separate release step (`python migrate.py`)
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MIGRATE_ON_STARTUP:
+        import migrate   # Alembic is only needed here, so importing main doesn't pay for it
+        migrate.upgrade()
+    generation.start()
+    jobs.start()
+    yield
+    await jobs.stop()
+    await llm.aclose()
+    await database.dispose_async()
+
+app = FastAPI(title="AI Learning Nephews", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -82,7 +68,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Prev-Cursor", "X-Next-Cursor", "X-Profile"],
 )
+# Compresses everything else over 1 KB; cached catalog bodies arrive pre-compressed
+# (Content-Encoding already set) and event streams are left alone so they keep flushing
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=6)
+# Opt-in per request (X-Profile: <PROFILE_TOKEN>) or at PROFILE_SAMPLE_RATE
+app.add_middleware(profiling.ProfilingMiddleware)
+# Outermost, so latency covers compression and the whole streamed body
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.track_cache("catalog", lambda: (cache.responses.hits, cache.responses.misses))
+metrics.track_cache("quiz_pool", lambda: (quizbank.hits, quizbank.misses))
+metrics.track_cache("tutor_semantic", lambda: (semantic_cache.stats.hits,
+                                               semantic_cache.stats.lookups - semantic_cache.stats.hits))
 
 # ────────────────────────── Pydantic Schemas ──────────────────────────
 
@@ -133,6 +132,8 @@ def get_level(xp: int) -> str:
             level = name
     return level
 
+# Helpers below only flush; the route that calls them commits once at the end
+
 def add_xp(db: Session, student_id: int, amount: int, reason: str) -> int:
     student = db.query(Student).filter(Student.id == student_id).first()
     if not student:
@@ -140,8 +141,9 @@ def add_xp(db: Session, student_id: int, amount: int, reason: str) -> int:
     student.total_xp += amount
     student.level = get_level(student.total_xp)
     db.add(XPLog(student_id=student_id, amount=amount, reason=reason))
-    db.commit()
-    check_badges(db, student)
+    if student.role == "student":
+        leaderboard.record(db, student_id, amount)
+    badges.emit(db, student, badges.XP_CHANGED, amount=amount)
     return student.total_xp
 
 def update_streak(db: Session, student: Student):
@@ -161,7 +163,6 @@ def update_streak(db: Session, student: Student):
     if student.current_streak > student.longest_streak:
         student.longest_streak = student.current_streak
     student.last_login_date = today
-    db.commit()
     # Streak bonus XP
     if student.current_streak == 7:
         add_xp(db, student.id, 200, "7-day streak bonus!")
@@ -172,101 +173,6 @@ def update_streak(db: Session, student: Student):
     # Earn streak freeze at milestones
     if student.current_streak % 7 == 0:
         student.streak_freezes += 1
-        db.commit()
-
-def check_badges(db: Session, student: Student):
-    existing = {sb.badge_id for sb in db.query(StudentBadge).filter(StudentBadge.student_id == student.id).all()}
-    badges = {b.name: b for b in db.query(Badge).all()}
-
-    def award(name):
-        badge = badges.get(name)
-        if badge and badge.id not in existing:
-            db.add(StudentBadge(student_id=student.id, badge_id=badge.id))
-            existing.add(badge.id)
-
-    # Level badges
-    if student.level == "Engineer":
-        award("Rising Star")
-    if student.level == "Legend":
-        award("Legend")
-
-    # XP badges
-    if student.total_xp >= 100:
-        award("Rocket Start")
-
-    # Streak badges
-    if student.current_streak >= 7:
-        award("Week Warrior")
-
-    # Quiz badges
-    perfect_count = db.query(QuizResult).filter(
-        QuizResult.student_id == student.id,
-        QuizResult.score == 100
-    ).count()
-    if perfect_count >= 1:
-        award("Perfectionist")
-    if perfect_count >= 5:
-        award("Diamond Mind")
-
-    # Topic badges
-    completed_topics = db.query(TopicProgress).filter(
-        TopicProgress.student_id == student.id,
-        TopicProgress.completed == True
-    ).count()
-    if completed_topics >= 5:
-        award("All Rounder")
-
-    total_topics = db.query(Topic).filter(Topic.path_id == student.path_id).count()
-    if completed_topics >= total_topics and total_topics > 0:
-        award("Curious Mind")
-        award("Graduate")
-        if student.path_id == "gaming":
-            award("Game Master")
-        elif student.path_id == "business":
-            award("Business Brain")
-        elif student.path_id == "developer":
-            award("Code Wizard")
-        elif student.path_id == "ai_enthusiast":
-            award("AI Pioneer")
-
-    # Chat badges
-    chat_count = db.query(ChatMessage).filter(
-        ChatMessage.student_id == student.id,
-        ChatMessage.role == "user"
-    ).count()
-    if chat_count >= 50:
-        award("AI Whisperer")
-    if chat_count >= 100:
-        award("Deep Thinker")
-
-    # Challenge badges
-    challenge_count = db.query(DailyChallenge).filter(
-        DailyChallenge.student_id == student.id,
-        DailyChallenge.completed == True
-    ).count()
-    if challenge_count >= 30:
-        award("Challenge Champion")
-
-    # Concept badges
-    concepts_read = db.query(TopicProgress).filter(
-        TopicProgress.student_id == student.id
-    ).count()
-    if concepts_read >= 10:
-        award("Knowledge Seeker")
-
-    # Time-based badges
-    now = datetime.now()
-    if now.hour >= 22 or now.hour < 4:
-        award("Night Owl")
-    if 5 <= now.hour < 8:
-        award("Early Bird")
-
-    # Leaderboard badges
-    students_ranked = db.query(Student).filter(Student.role == "student").order_by(desc(Student.total_xp)).all()
-    if students_ranked and students_ranked[0].id == student.id:
-        award("Leaderboard King")
-
-    db.commit()
 
 def get_tutor_system_prompt(student: Student) -> str:
     if student.path_id == "gaming":
@@ -459,11 +365,12 @@ def login(req: LoginRequest, db: Session = Depends(get_db)):
     if existing_badges == 0:
         first_badge = db.query(Badge).filter(Badge.name == "First Steps").first()
         if first_badge:
-            db.add(StudentBadge(student_id=student.id, badge_id=first_badge.id))
-            db.commit()
+            db.execute(upsert(db, StudentBadge).values(student_id=student.id, badge_id=first_badge.id)
+                       .on_conflict_do_nothing(index_elements=[StudentBadge.student_id, StudentBadge.badge_id]))
 
     update_streak(db, student)
     add_xp(db, student.id, 20, "Daily login bonus")
+    db.commit()
 
     return {
         "id": student.id,
@@ -503,152 +410,66 @@ def get_all_students(db: Session = Depends(get_db)):
 
 # ────────────────────────── Topics Routes ──────────────────────────
 
+# Catalog routes answer from cache.py; writers call cache.invalidate() with the key prefix
+
 @app.get("/api/topics/{path_id}")
-def get_topics(path_id: str, db: Session = Depends(get_db)):
-    topics = db.query(Topic).filter(Topic.path_id == path_id).order_by(Topic.order_num).all()
-    return [{"id": t.id, "order_num": t.order_num, "title": t.title,
-             "description": t.description, "difficulty": t.difficulty,
-             "read_time": t.read_time} for t in topics]
+def get_topics(path_id: str, request: Request, db: Session = Depends(get_db)):
+    def build():
+        topics = db.query(Topic).filter(Topic.path_id == path_id).order_by(Topic.order_num).all()
+        return [{"id": t.id, "order_num": t.order_num, "title": t.title,
+                 "description": t.description, "difficulty": t.difficulty,
+                 "read_time": t.read_time} for t in topics]
+    return cache.respond(request, f"topics:{path_id}", build)
+
+LESSON_LEVEL_PATTERN = "^(" + "|".join(generation.LESSON_COLUMNS) + ")$"
 
 @app.get("/api/topic/{topic_id}")
-def get_topic(topic_id: int, db: Session = Depends(get_db)):
+def get_topic(topic_id: int, request: Request,
+              level: Optional[str] = Query(None, pattern=LESSON_LEVEL_PATTERN),
+              db: Session = Depends(get_db)):
+    """The topic with all three lesson levels, or only `level` when given."""
+    key = f"topic:{topic_id}:{level}" if level else f"topic:{topic_id}"
+    cached = cache.lookup(request, key)
+    if cached:
+        return cached
     topic = db.query(Topic).filter(Topic.id == topic_id).first()
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
 
-    # Lazy-generate content if missing — use Groq (primary) or Gemini (fallback)
+    # Lazy-generate content if missing — queued, the client polls the job for the finished lesson
     ai_available = GROQ_AVAILABLE or GEMINI_AVAILABLE
     if ai_available and not topic.content_normal:
-        try:
-            path_profiles = {
-                "gaming": {
-                    "audience": "a smart 13-year-old who is obsessed with gaming — Minecraft, PUBG, FIFA, GTA, Roblox, Valorant",
-                    "simple_style": "Use super simple language. Relate EVERYTHING to popular games. No jargon at all. Pretend you're explaining it to a friend who's never studied.",
-                    "normal_style": "Use gaming examples throughout — specific game mechanics, characters, and scenarios. Be exciting and energetic. Name real games.",
-                    "tech_style": "Explain the underlying algorithms and data structures. Include game engine examples. Connect to real game dev concepts.",
-                    "sections_normal": ["Introduction", "What Is It Really?", "How It Works In Games", "Real Games Using This Right Now", "The Secret Sauce (Key Mechanisms)", "Why This Changes Gaming", "Try This Challenge"],
-                    "sections_tech": ["Technical Foundation", "Core Algorithms", "Data Structures Used", "Real Game Engine Implementation", "Performance Considerations", "State of the Art", "Research Frontiers"],
-                },
-                "business": {
-                    "audience": "a sharp 17-year-old interested in entrepreneurship and AI for business",
-                    "simple_style": "Plain English, business scenarios, no tech jargon. Use examples from companies a teen would know.",
-                    "normal_style": "Use Indian startup examples (Zomato, Flipkart, Paytm, Swiggy, CRED, Meesho) and global giants. Focus on ROI and practical value.",
-                    "tech_style": "Explain the technology behind the business application. Include market data, use cases, implementation considerations.",
-                    "sections_normal": ["Introduction", "The Business Problem It Solves", "How Companies Use It Today", "Indian Companies Leading the Way", "The Money Behind It", "How to Build This into a Business", "Your Action Plan"],
-                    "sections_tech": ["Technical Overview", "How It Works", "Implementation Strategy", "Data Requirements", "Key Metrics & KPIs", "Case Studies", "Building Your Own"],
-                },
-                "developer": {
-                    "audience": "a 20-year-old CS student who codes and wants to understand AI deeply",
-                    "simple_style": "Clear explanation with pseudocode and simple analogies. Assume basic CS knowledge.",
-                    "normal_style": "Include algorithm names, complexity analysis, framework mentions (PyTorch, TensorFlow, scikit-learn). Be precise and technical.",
-                    "tech_style": "Deep dive: math notation, code snippets, paper references, benchmarks, architectural decisions, tradeoffs.",
-                    "sections_normal": ["Concept Overview", "Core Algorithm", "Mathematical Intuition", "Code Implementation Pattern", "Real-World Systems", "Performance & Complexity", "What to Build Next"],
-                    "sections_tech": ["Formal Definition", "Mathematical Foundation", "Algorithm Deep-Dive", "Implementation Architecture", "Optimization Techniques", "Production Considerations", "Research Papers to Read"],
-                },
-                "ai_enthusiast": {
-                    "audience": "an adult AI enthusiast who wants complete, nuanced understanding",
-                    "simple_style": "Accessible but not dumbed-down. Use clear analogies for complex concepts.",
-                    "normal_style": "Comprehensive coverage including history, how it works, applications, limitations, and future. Be intellectually engaging.",
-                    "tech_style": "Full technical depth: theory, math, implementation details, current SOTA, open research questions, ethical considerations.",
-                    "sections_normal": ["Historical Context", "What It Is & Why It Matters", "How It Actually Works", "Current Applications", "Limitations & Challenges", "Ethical Dimensions", "The Future"],
-                    "sections_tech": ["Technical Foundation", "Mathematical Framework", "Architecture & Implementation", "Current State of the Art", "Benchmarks & Comparisons", "Open Problems", "Research Directions"],
-                },
-            }
-            profile = path_profiles.get(topic.path_id, path_profiles["ai_enthusiast"])
-
-            def build_content_prompt(level: str) -> str:
-                if level == "simple":
-                    style = profile["simple_style"]
-                    sections = ["Let's Break It Down Simply", "The Fun Connection", "Real Examples You Know", "Why This Is Cool", "Quick Summary Points"]
-                    para_count = "8-10"
-                elif level == "normal":
-                    style = profile["normal_style"]
-                    sections = profile["sections_normal"]
-                    para_count = "10-13"
-                else:  # technical
-                    style = profile["tech_style"]
-                    sections = profile["sections_tech"]
-                    para_count = "12-15"
-
-                sections_str = "\n".join(f"## {s}" for s in sections)
-                return f"""Write a comprehensive {level}-level lesson about "{topic.title}" for {profile['audience']}.
-
-Style guide: {style}
-
-Use EXACTLY these section headers (with ## prefix):
-{sections_str}
-
-Requirements:
-- Total {para_count} substantial paragraphs across all sections
-- Each paragraph must be 3-5 sentences minimum
-- Be specific — use real names, real examples, real numbers
-- Last section (if "Summary" or "Points"): use bullet points with - prefix
-- Write engaging prose, NOT bullet points for the main content
-- NO generic statements. Everything must be specific and vivid.
-
-Return ONLY the raw content text. Start directly with the first ## header. No preamble."""
-
-            simple_content = normal_content = tech_content = ""
-            fun_fact = real_world = ""
-
-            if GROQ_AVAILABLE:
-                for level, attr in [("simple", "simple_content"), ("normal", "normal_content"), ("technical", "tech_content")]:
-                    try:
-                        locals()[attr] = groq_chat(
-                            [{"role": "user", "content": build_content_prompt(level)}],
-                            max_tokens=3000, temperature=0.75,
-                        )
-                    except Exception:
-                        pass
-            elif GEMINI_AVAILABLE:
-                # Gemini generates all levels in one call for efficiency
-                prompt = f"""Write comprehensive educational content about "{topic.title}" for {profile['audience']}.
-{profile['normal_style']}
-
-Return ONLY valid JSON with these keys:
-{{
-  "simple": "8-10 paragraph beginner explanation with ## section headers (sections: Let's Break It Down, The Fun Connection, Real Examples, Why This Is Cool, Quick Summary). Use bullet points with - for the summary section.",
-  "normal": "11-13 paragraph full explanation with ## section headers ({', '.join(profile['sections_normal'])}). Last section use bullets.",
-  "technical": "13-15 paragraph technical deep-dive with ## section headers ({', '.join(profile['sections_tech'])}). Include specific technical details.",
-  "fun_fact": "One surprising counterintuitive fact (2 sentences).",
-  "real_world": "A specific detailed real-world case study (3-4 sentences)."
-}}"""
-                try:
-                    response = gemini_model.generate_content(prompt)
-                    text = response.text.strip()
-                    if text.startswith("```"):
-                        text = text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-                    data = json.loads(text)
-                    simple_content = data.get("simple", "")
-                    normal_content = data.get("normal", "")
-                    tech_content = data.get("technical", "")
-                    fun_fact = data.get("fun_fact", "")
-                    real_world = data.get("real_world", "")
-                except Exception:
-                    pass
-
-            if normal_content:
-                topic.content_simple = simple_content or normal_content
-                topic.content_normal = normal_content
-                topic.content_technical = tech_content or normal_content
-                if not topic.fun_fact and fun_fact:
-                    topic.fun_fact = fun_fact
-                if not topic.real_world_example and real_world:
-                    topic.real_world_example = real_world
-                db.commit()
-        except Exception:
-            pass
+        job = jobs.enqueue(db, "topic", singleflight.make_key("topic", topic.id, topic.path_id), {
+            "topic_id": topic.id, "path_id": topic.path_id,
+        })
+        return JSONResponse(jobs.accepted(job), status_code=202)
 
-    return {
+    return cache.store(request, key, _topic_payload(topic, level))
+
+def _topic_payload(topic: Topic, level: str = None) -> dict:
+    payload = {
         "id": topic.id, "path_id": topic.path_id, "order_num": topic.order_num,
         "title": topic.title, "description": topic.description,
         "difficulty": topic.difficulty, "read_time": topic.read_time,
-        "content_simple": topic.content_simple or "",
-        "content_normal": topic.content_normal or "",
-        "content_technical": topic.content_technical or "",
         "fun_fact": topic.fun_fact or "",
         "real_world_example": topic.real_world_example or "",
     }
+    for lvl, column in generation.LESSON_COLUMNS.items():
+        if level in (None, lvl):
+            # Levels still being backfilled fall back to the normal lesson
+            payload[column] = getattr(topic, column) or topic.content_normal or ""
+    return payload
+
+async def _topic_job(params: dict, progress) -> dict:
+    await generation.topic_content(params["topic_id"], params["path_id"])
+    return await asyncio.to_thread(_stored_topic_payload, params["topic_id"])
+
+def _stored_topic_payload(topic_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        return _topic_payload(db.get(Topic, topic_id))
+    finally:
+        db.close()
 
 @app.get("/api/progress/{student_id}")
 def get_progress(student_id: int, db: Session = Depends(get_db)):
@@ -656,148 +477,152 @@ def get_progress(student_id: int, db: Session = Depends(get_db)):
     return [{"topic_id": p.topic_id, "completed": p.completed,
              "quiz_score": p.quiz_score, "quiz_attempts": p.quiz_attempts} for p in progress]
 
+def _topic_progress(db: Session, student_id: int, topic_id: int) -> tuple:
+    """(TopicProgress row, created). A missing row is inserted with ON CONFLICT DO NOTHING,
+    so two first submissions racing each other both end up on the same row."""
+    query = db.query(TopicProgress).filter(TopicProgress.student_id == student_id,
+                                           TopicProgress.topic_id == topic_id)
+    progress = query.first()
+    if progress:
+        return progress, False
+    created = db.execute(upsert(db, TopicProgress).values(
+        student_id=student_id, topic_id=topic_id, completed=False, quiz_score=0, quiz_attempts=0
+    ).on_conflict_do_nothing(index_elements=[TopicProgress.student_id, TopicProgress.topic_id])).rowcount == 1
+    return query.one(), created
+
 @app.post("/api/topics/complete")
 def complete_topic(req: MarkTopicRequest, db: Session = Depends(get_db)):
-    progress = db.query(TopicProgress).filter(
-        TopicProgress.student_id == req.student_id,
-        TopicProgress.topic_id == req.topic_id
-    ).first()
-    if not progress:
-        progress = TopicProgress(student_id=req.student_id, topic_id=req.topic_id,
-                                  completed=True, completed_at=datetime.utcnow())
-        db.add(progress)
-    else:
-        progress.completed = True
-        progress.completed_at = datetime.utcnow()
-    db.commit()
+    progress, started = _topic_progress(db, req.student_id, req.topic_id)
+    newly_completed = not progress.completed
+    progress.completed = True
+    progress.completed_at = datetime.utcnow()
+
+    student = db.get(Student, req.student_id)
+    if student:
+        if started:
+            badges.emit(db, student, badges.TOPIC_STARTED)
+        if newly_completed:
+            badges.emit(db, student, badges.TOPIC_COMPLETED)
     xp = add_xp(db, req.student_id, 50, f"Completed topic")
+    db.commit()
     return {"message": "Topic completed!", "xp_earned": 50, "total_xp": xp}
 
 # ────────────────────────── Quiz Routes ──────────────────────────
 
-def _build_quiz_prompt(topic_title: str, path_context: str, count: int, easy: int, medium: int, hard: int) -> str:
-    return f"""Generate exactly {count} quiz questions about "{topic_title}" for an AI learning platform.
-{path_context}
-
-Distribution: {easy} easy (basic recall/definitions), {medium} medium (application/understanding), {hard} hard (analysis/synthesis/edge-cases).
-Include True/False questions (about 20% of total) and MCQ for the rest (4 distinct options each).
+def _quiz_payload(title: str, questions: list) -> dict:
+    """Sample a quiz from a freshly generated pool, sorted by difficulty."""
+    return {"questions": quizbank.sample_questions(questions), "topic": title, "pool_size": len(questions)}
 
-IMPORTANT: Make questions specific, interesting, and NOT generic. Reference real scenarios.
-
-Return ONLY a valid JSON array, zero markdown, zero explanation. Each element:
-{{"question":"engaging question text","type":"mcq","options":["A","B","C","D"],"correct":"exact text matching one option","explanation":"2-3 sentence explanation with context and why wrong options are wrong","difficulty":"easy"}}
-
-True/False example:
-{{"question":"True or False: ..?","type":"true_false","options":["True","False"],"correct":"True","explanation":"...","difficulty":"easy"}}"""
-
-
-@app.get("/api/quiz/generate/{topic_id}")
-def generate_quiz(topic_id: int, student_id: int = Query(...), db: Session = Depends(get_db)):
-    topic = db.query(Topic).filter(Topic.id == topic_id).first()
-    student = db.query(Student).filter(Student.id == student_id).first()
-    if not topic or not student:
-        raise HTTPException(status_code=404, detail="Topic or student not found")
-
-    # ── Check cache: if 40+ questions exist, sample 15 and return ──
-    cached = db.query(CachedQuizQuestion).filter(CachedQuizQuestion.topic_id == topic_id).all()
-    if len(cached) >= 40:
-        selected = random.sample(cached, min(15, len(cached)))
-        order = {"easy": 0, "medium": 1, "hard": 2}
-        selected.sort(key=lambda x: order.get(x.difficulty, 1))
-        return {
-            "questions": [{
-                "question": q.question, "type": q.q_type,
-                "options": json.loads(q.options), "correct": q.correct,
-                "explanation": q.explanation, "difficulty": q.difficulty,
-            } for q in selected],
-            "topic": topic.title,
-            "pool_size": len(cached),
-        }
-
-    path_context = {
-        "gaming": "Student is 13 and loves Minecraft, PUBG, FIFA, GTA, Roblox. Use specific game mechanics, characters, and scenarios throughout. Every question should relate to gaming.",
-        "business": "Student is 17 and interested in business. Use real Indian companies (Zomato, Flipkart, Paytm, CRED) and global examples (Amazon, Uber). Focus on practical business applications, no coding.",
-        "developer": "Student is 20 and studying CS. Use technical examples with algorithms, data structures, code concepts. Include nuanced technical distinctions.",
-        "ai_enthusiast": "Student is an adult AI enthusiast wanting deep understanding. Include historical context, ethical dimensions, comparisons between approaches, and future implications.",
-    }
-    ctx = path_context.get(student.path_id, "Make questions clear and educational with specific examples.")
-
-    all_new_questions = []
-
-    # ── Primary: Groq via stdlib urllib (no groq package needed) ──
-    if GROQ_AVAILABLE:
-        try:
-            batches = [
-                (25, 8, 11, 6),   # count, easy, medium, hard
-                (25, 5, 10, 10),
-            ]
-            for count, easy, medium, hard in batches:
-                prompt = _build_quiz_prompt(topic.title, ctx, count, easy, medium, hard)
-                text = groq_chat([{"role": "user", "content": prompt}], max_tokens=4500)
-                text = text.strip()
-                if "```" in text:
-                    parts = text.split("```")
-                    text = parts[1] if len(parts) > 1 else text
-                    if text.startswith("json"):
-                        text = text[4:]
-                    text = text.rsplit("```", 1)[0]
-                batch = json.loads(text.strip())
-                all_new_questions.extend(batch)
-        except Exception:
-            all_new_questions = []
-
-    # ── Fallback: Gemini (generate 20 questions) ──
-    if not all_new_questions and GEMINI_AVAILABLE:
-        try:
-            prompt = _build_quiz_prompt(topic.title, ctx, 20, 6, 8, 6)
-            response = gemini_model.generate_content(prompt)
-            text = response.text.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-            all_new_questions = json.loads(text)
-        except Exception:
-            pass
-
-    # ── Cache all generated questions ──
-    if all_new_questions:
-        for q in all_new_questions:
-            db.add(CachedQuizQuestion(
-                topic_id=topic_id,
-                question=q.get("question", ""),
-                q_type=q.get("type", "mcq"),
-                options=json.dumps(q.get("options", [])),
-                correct=q.get("correct", ""),
-                explanation=q.get("explanation", ""),
-                difficulty=q.get("difficulty", "medium"),
-            ))
-        db.commit()
-        # Return 15 sorted by difficulty
-        selected = random.sample(all_new_questions, min(15, len(all_new_questions)))
-        order = {"easy": 0, "medium": 1, "hard": 2}
-        selected.sort(key=lambda x: order.get(x.get("difficulty", "medium"), 1))
-        return {"questions": selected, "topic": topic.title, "pool_size": len(all_new_questions)}
-
-    # ── Static fallback ──
+def _fallback_quiz(title: str) -> dict:
     return {"questions": [
-        {"question": f"What is the main concept behind {topic.title}?", "type": "mcq",
+        {"question": f"What is the main concept behind {title}?", "type": "mcq",
          "options": ["Machine Learning", "Artificial Intelligence", "Data Processing", "Neural Networks"],
          "correct": "Artificial Intelligence", "difficulty": "easy",
-         "explanation": f"{topic.title} is fundamentally about AI — the science of making machines smart."},
-        {"question": f"True or False: {topic.title} is an important area in modern AI?", "type": "true_false",
+         "explanation": f"{title} is fundamentally about AI — the science of making machines smart."},
+        {"question": f"True or False: {title} is an important area in modern AI?", "type": "true_false",
          "options": ["True", "False"], "correct": "True", "difficulty": "easy",
-         "explanation": f"Absolutely! {topic.title} is a core pillar of modern AI development."},
-        {"question": f"Which best describes a key aspect of {topic.title}?", "type": "mcq",
+         "explanation": f"Absolutely! {title} is a core pillar of modern AI development."},
+        {"question": f"Which best describes a key aspect of {title}?", "type": "mcq",
          "options": ["Pattern Recognition", "Data Storage", "Web Design", "Hardware Manufacturing"],
          "correct": "Pattern Recognition", "difficulty": "medium",
          "explanation": "AI fundamentally works by recognizing patterns in data to make intelligent decisions."},
-        {"question": f"What makes {topic.title} powerful?", "type": "mcq",
+        {"question": f"What makes {title} powerful?", "type": "mcq",
          "options": ["It automates intelligent tasks", "It replaces all humans", "It only works offline", "It requires no data"],
          "correct": "It automates intelligent tasks", "difficulty": "medium",
          "explanation": "The core power of AI is automating tasks that normally require human intelligence."},
         {"question": "True or False: AI systems improve through learning from experience?", "type": "true_false",
          "options": ["True", "False"], "correct": "True", "difficulty": "easy",
          "explanation": "Yes! Machine learning — a branch of AI — specifically enables systems to improve from experience."},
-    ], "topic": topic.title}
+    ], "topic": title}
+
+async def _quiz_job(params: dict, progress) -> dict:
+    questions = await generation.quiz_pool(params["topic_id"], params["path_id"],
+                                           known=params.get("known", 0), progress=progress)
+    if questions:
+        return _quiz_payload(params["title"], questions)
+    return _fallback_quiz(params["title"])
+
+@app.get("/api/quiz/generate/{topic_id}")
+def generate_quiz(topic_id: int, student_id: int = Query(...), db: Session = Depends(get_db)):
+    topic = db.query(Topic).filter(Topic.id == topic_id).first()
+    student = db.query(Student).filter(Student.id == student_id).first()
+    if not topic or not student:
+        raise HTTPException(status_code=404, detail="Topic or student not found")
+
+    # ── Check cache: a full pool is sampled in memory, skipping what this student saw recently ──
+    pool_size = quizbank.pool_size(topic_id)
+    metrics.cache_lookup("quiz", pool_size >= quizbank.POOL_TARGET)
+    if pool_size >= quizbank.POOL_TARGET:
+        questions, pool_size = quizbank.draw(topic_id, student_id)
+        return {"questions": questions, "topic": topic.title, "pool_size": pool_size}
+
+    if not (GROQ_AVAILABLE or GEMINI_AVAILABLE):
+        return _fallback_quiz(topic.title)
+
+    # ── Cache miss: queue generation and let the client poll the job ──
+    job = jobs.enqueue(db, "quiz", singleflight.make_key("quiz", topic_id, student.path_id), {
+        "topic_id": topic_id, "path_id": student.path_id, "title": topic.title, "known": pool_size,
+    })
+    return JSONResponse(jobs.accepted(job), status_code=202)
+
+def _ndjson(data: dict) -> str:
+    return json.dumps(data) + "\n"
+
+async def _quiz_stream_lines(topic_id: int, path_id: str, title: str, known: int):
+    """Questions as generation parses them, then a `done` line; the rest of the pool keeps generating."""
+    queue = asyncio.Queue()
+    pool = asyncio.ensure_future(generation.quiz_pool(topic_id, path_id, known=known, on_question=queue.put_nowait))
+    pool.add_done_callback(lambda t: t.cancelled() or t.exception())
+    sent = 0
+    while sent < quizbank.QUIZ_LENGTH:
+        if queue.empty():
+            if pool.done():
+                break
+            getter = asyncio.ensure_future(queue.get())
+            await asyncio.wait({getter, pool}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                continue
+            question = getter.result()
+        else:
+            question = queue.get_nowait()
+        yield _ndjson({"type": "question", "question": question})
+        sent += 1
+    if not sent:
+        # Another request was already generating this pool; sample what it produced
+        questions = pool.result() if not pool.cancelled() and not pool.exception() else []
+        quiz = _quiz_payload(title, questions) if questions else _fallback_quiz(title)
+        for q in quiz["questions"]:
+            yield _ndjson({"type": "question", "question": q})
+        sent = len(quiz["questions"])
+    yield _ndjson({"type": "done", "topic": title, "count": sent})
+
+@app.get("/api/quiz/stream/{topic_id}")
+def stream_quiz(topic_id: int, student_id: int = Query(...), db: Session = Depends(get_db)):
+    """NDJSON variant of /api/quiz/generate: one {"type": "question"} line per question, then {"type": "done"}.
+
+    On a pool miss, questions are sent as soon as the LLM finishes writing
+    each one instead of after the whole pool is generated.
+    """
+    topic = db.query(Topic).filter(Topic.id == topic_id).first()
+    student = db.query(Student).filter(Student.id == student_id).first()
+    if not topic or not student:
+        raise HTTPException(status_code=404, detail="Topic or student not found")
+
+    pool_size = quizbank.pool_size(topic_id)
+    metrics.cache_lookup("quiz", pool_size >= quizbank.POOL_TARGET)
+    if pool_size >= quizbank.POOL_TARGET or not (GROQ_AVAILABLE or GEMINI_AVAILABLE):
+        if pool_size >= quizbank.POOL_TARGET:
+            questions, _ = quizbank.draw(topic_id, student_id)
+        else:
+            questions = _fallback_quiz(topic.title)["questions"]
+        lines = [_ndjson({"type": "question", "question": q}) for q in questions]
+        lines.append(_ndjson({"type": "done", "topic": topic.title, "count": len(questions)}))
+        return StreamingResponse(iter(lines), media_type="application/x-ndjson")
+
+    return StreamingResponse(_quiz_stream_lines(topic_id, student.path_id, topic.title, pool_size),
+                             media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/api/quiz/submit")
 def submit_quiz(req: QuizSubmit, db: Session = Depends(get_db)):
@@ -815,50 +640,37 @@ def submit_quiz(req: QuizSubmit, db: Session = Depends(get_db)):
     ))
 
     # Update topic progress
-    progress = db.query(TopicProgress).filter(
-        TopicProgress.student_id == req.student_id,
-        TopicProgress.topic_id == req.topic_id
-    ).first()
-    if not progress:
-        progress = TopicProgress(student_id=req.student_id, topic_id=req.topic_id,
-                                  quiz_score=score, quiz_attempts=1)
-        db.add(progress)
-    else:
-        if score > progress.quiz_score:
-            progress.quiz_score = score
-        progress.quiz_attempts += 1
-    db.commit()
+    progress, started = _topic_progress(db, req.student_id, req.topic_id)
+    if score > progress.quiz_score:
+        progress.quiz_score = score
+    progress.quiz_attempts += 1
+
+    student = db.get(Student, req.student_id)
+    if student:
+        if started:
+            badges.emit(db, student, badges.TOPIC_STARTED)
+        badges.emit(db, student, badges.QUIZ_SUBMITTED,
+                    score=score, attempts=progress.quiz_attempts)
 
     total_xp = add_xp(db, req.student_id, xp, f"Quiz: {correct}/{total} correct")
+    db.commit()
 
-    # Check comeback kid badge
-    if progress.quiz_attempts > 1 and score > 0:
-        student = db.query(Student).filter(Student.id == req.student_id).first()
-        if student:
-            badge = db.query(Badge).filter(Badge.name == "Comeback Kid").first()
-            if badge:
-                existing = db.query(StudentBadge).filter(
-                    StudentBadge.student_id == student.id,
-                    StudentBadge.badge_id == badge.id
-                ).first()
-                if not existing:
-                    db.add(StudentBadge(student_id=student.id, badge_id=badge.id))
-                    db.commit()
-
-    pool_size = db.query(CachedQuizQuestion).filter(CachedQuizQuestion.topic_id == req.topic_id).count()
+    pool_size = quizbank.pool_size(req.topic_id)
     return {"score": score, "correct": correct, "total": total,
             "xp_earned": xp, "total_xp": total_xp, "perfect": score == 100,
             "pool_size": pool_size if pool_size > 0 else None}
 
 @app.get("/api/quiz/history/{student_id}")
 def quiz_history(student_id: int, db: Session = Depends(get_db)):
-    results = db.query(QuizResult).filter(QuizResult.student_id == student_id).order_by(desc(QuizResult.taken_at)).limit(50).all()
+    # One JOINed projection instead of a Topic lookup per result
+    results = db.query(QuizResult, Topic.title).outerjoin(Topic, Topic.id == QuizResult.topic_id).filter(
+        QuizResult.student_id == student_id
+    ).order_by(desc(QuizResult.taken_at)).limit(50).all()
     out = []
-    for r in results:
-        topic = db.query(Topic).filter(Topic.id == r.topic_id).first()
+    for r, topic_title in results:
         out.append({
             "id": r.id, "topic_id": r.topic_id,
-            "topic_title": topic.title if topic else "Unknown",
+            "topic_title": topic_title or "Unknown",
             "score": r.score, "correct": r.correct_answers,
             "total": r.total_questions, "xp_earned": r.xp_earned,
             "taken_at": r.taken_at.isoformat() if r.taken_at else ""
@@ -867,71 +679,230 @@ def quiz_history(student_id: int, db: Session = Depends(get_db)):
 
 # ────────────────────────── AI Tutor Chat Routes ──────────────────────────
 
-@app.post("/api/chat")
-def chat_with_tutor(req: ChatRequest, db: Session = Depends(get_db)):
+TUTOR_OFFLINE_MSG = (
+    "Hey {name}! 🤖 The AI tutor isn't connected yet — "
+    "GROQ_API_KEY is missing from Railway environment variables. "
+    "Ask your uncle to add it in Railway → Variables!"
+)
+TUTOR_ERROR_MSG = "Taking a quick breather 😴 — try again in a moment! (Groq API hiccup)"
+
+def _tutor_prompt(student: Student, req: ChatRequest) -> str:
+    topic_context = f"\n\nCurrent topic context: {req.topic}" if req.topic else ""
+    return get_tutor_system_prompt(student) + topic_context
+
+def _tutor_messages(db: Session, student: Student, req: ChatRequest) -> tuple:
+    """Store the user's message and build the Groq prompt: summary + token-budgeted recent window.
+
+    Returns (messages, semantic cache key); the key covers the path, persona and topic.
+    """
+    ctx = chat_context.get(db, student.id)   # before the insert, so a fresh load doesn't include it twice
+    _store_chat(db, student.id, "user", req.message)
+    db.commit()
+    system_prompt = _tutor_prompt(student, req)
+    return ctx.messages(system_prompt), semantic_cache.persona(student.path_id, system_prompt)
+
+def _store_chat(db: Session, student_id: int, role: str, content: str):
+    msg = ChatMessage(student_id=student_id, role=role, content=content)
+    db.add(msg)
+    db.flush()
+    chat_context.record(student_id, msg.id, role, content)
+
+# The chat routes are async for the LLM call; their DB work runs through
+# asyncio.to_thread in these two helpers so it never holds the event loop
+
+def _begin_chat(db: Session, req: ChatRequest) -> tuple:
+    """Store the user's message. Returns (student id, name, prompt messages, semantic cache key)."""
     student = db.query(Student).filter(Student.id == req.student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
+    messages, cache_key = _tutor_messages(db, student, req)
+    return student.id, student.name, messages, cache_key
 
-    db.add(ChatMessage(student_id=student.id, role="user", content=req.message))
-    db.commit()
-
-    if not GROQ_AVAILABLE:
-        fallback_msg = (
-            f"Hey {student.name}! 🤖 The AI tutor isn't connected yet — "
-            "GROQ_API_KEY is missing from Railway environment variables. "
-            "Ask your uncle to add it in Railway → Variables!"
-        )
-        db.add(ChatMessage(student_id=student.id, role="assistant", content=fallback_msg))
+def _finish_chat(student_id: int, reply: str):
+    """Persist the assistant's reply and run badge checks."""
+    db = SessionLocal()
+    try:
+        _store_chat(db, student_id, "assistant", reply)
+        student = db.get(Student, student_id)
+        if student:
+            badges.emit(db, student, badges.CHAT_SENT)
         db.commit()
-        return {"response": fallback_msg}
+    finally:
+        db.close()
 
-    try:
-        system_prompt = get_tutor_system_prompt(student)
-        recent_messages = db.query(ChatMessage).filter(
-            ChatMessage.student_id == student.id
-        ).order_by(desc(ChatMessage.id)).limit(20).all()
-        recent_messages.reverse()
-
-        topic_context = f"\n\nCurrent topic context: {req.topic}" if req.topic else ""
-
-        # Build OpenAI-format messages for Groq
-        messages = [{"role": "system", "content": system_prompt + topic_context}]
-        for msg in recent_messages[:-1]:  # exclude the message we just added
-            messages.append({
-                "role": "user" if msg.role == "user" else "assistant",
-                "content": msg.content,
-            })
-        messages.append({"role": "user", "content": req.message})
+@app.post("/api/chat")
+async def chat_with_tutor(req: ChatRequest, db: Session = Depends(get_db)):
+    student_id, name, messages, cache_key = await asyncio.to_thread(_begin_chat, db, req)
+
+    cached = semantic_cache.lookup(cache_key, req.message)
+    if cached:
+        reply = cached
+    elif not GROQ_AVAILABLE:
+        reply = TUTOR_OFFLINE_MSG.format(name=name)
+    else:
+        try:
+            started = time.perf_counter()
+            reply = await llm.groq.complete(messages, max_tokens=1024, site="chat")
+            semantic_cache.store(cache_key, req.message, reply, llm_ms=(time.perf_counter() - started) * 1000)
+        except Exception:
+            reply = TUTOR_ERROR_MSG
+
+    await asyncio.to_thread(_finish_chat, student_id, reply)
+    return {"response": reply, "cached": True} if cached else {"response": reply}
+
+def _sse(data: dict, event: str = "message") -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _single_delta(text: str):
+    yield text
+
+@app.post("/api/chat/stream")
+async def chat_with_tutor_stream(req: ChatRequest, db: Session = Depends(get_db)):
+    """Server-Sent Events variant of /api/chat.
+
+    Emits `message` events carrying {"delta": text} as Groq produces tokens,
+    then a single `done` event with the full {"response": text}. If Groq
+    fails partway through, the stream ends with an `error` event instead
+    and the partial reply is discarded.
+    """
+    student_id, name, messages, cache_key = await asyncio.to_thread(_begin_chat, db, req)
+    cached = semantic_cache.lookup(cache_key, req.message)
+    from_llm = not cached and GROQ_AVAILABLE
+    if cached:
+        deltas = _single_delta(cached)
+    elif GROQ_AVAILABLE:
+        deltas = llm.groq.stream(messages, max_tokens=1024, site="chat")
+    else:
+        deltas = _single_delta(TUTOR_OFFLINE_MSG.format(name=name))
 
-        # Call Groq via stdlib urllib (no groq package required)
-        reply = groq_chat(messages, max_tokens=1024)
+    async def event_stream():
+        parts = []
+        truncated = False
+        started = time.perf_counter()
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield _sse({"delta": delta})
+            if from_llm:
+                semantic_cache.store(cache_key, req.message, "".join(parts),
+                                     llm_ms=(time.perf_counter() - started) * 1000)
+        except Exception:
+            if parts:
+                truncated = True   # the provider failed mid-reply: not saved or rewarded as an answer
+            else:
+                parts.append(TUTOR_ERROR_MSG)
+                yield _sse({"delta": TUTOR_ERROR_MSG})
+        finally:
+            # Runs on client disconnect too, so a partial reply is still saved
+            if not truncated:
+                await asyncio.to_thread(_finish_chat, student_id, "".join(parts))
+        if truncated:
+            yield _sse({"error": TUTOR_ERROR_MSG}, event="error")
+        else:
+            yield _sse({"response": "".join(parts)}, event="done")
 
-        db.add(ChatMessage(student_id=student.id, role="assistant", content=reply))
-        db.commit()
-        add_xp(db, student.id, 0, "")  # trigger badge checks
-        return {"response": reply}
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    except Exception as e:
-        error_msg = "Taking a quick breather 😴 — try again in a moment! (Groq API hiccup)"
-        db.add(ChatMessage(student_id=student.id, role="assistant", content=error_msg))
-        db.commit()
-        return {"response": error_msg}
+def _chat_row(m) -> dict:
+    return {"id": m.id, "role": m.role, "content": m.content,
+            "created_at": m.created_at.isoformat() if m.created_at else ""}
 
 @app.get("/api/chat/history/{student_id}")
-def get_chat_history(student_id: int, db: Session = Depends(get_db)):
-    messages = db.query(ChatMessage).filter(
-        ChatMessage.student_id == student_id
-    ).order_by(ChatMessage.id).limit(100).all()
-    return [{"role": m.role, "content": m.content,
-             "created_at": m.created_at.isoformat() if m.created_at else ""} for m in messages]
+def get_chat_history(student_id: int, response: Response,
+                     before: Optional[int] = Query(None, ge=1), after: Optional[int] = Query(None, ge=0),
+                     limit: int = Query(100, ge=1, le=500), db: Session = Depends(get_db)):
+    """A page of messages in chronological order, keyset-paginated on id.
+
+    No cursor: the latest `limit` messages. `before=<id>`: the page just
+    older than that message; `after=<id>`: the page just newer. The
+    X-Prev-Cursor / X-Next-Cursor headers hold the `before` / `after`
+    value for the neighbouring pages and are absent when there is none.
+    """
+    if before is not None and after is not None:
+        raise HTTPException(status_code=422, detail="Pass either before or after, not both")
+    q = db.query(ChatMessage).filter(ChatMessage.student_id == student_id)
+    # The side the cursor points away from is checked with EXISTS (no extra query without a cursor)
+    if after is not None:
+        rows = q.filter(ChatMessage.id > after).order_by(ChatMessage.id).limit(limit + 1).all()
+        rows, more_newer = rows[:limit], len(rows) > limit
+        more_older = bool(rows) and db.query(q.filter(ChatMessage.id < rows[0].id).exists()).scalar()
+    else:
+        page = q.filter(ChatMessage.id < before) if before is not None else q
+        rows = page.order_by(desc(ChatMessage.id)).limit(limit + 1).all()
+        rows, more_older = rows[:limit][::-1], len(rows) > limit
+        more_newer = bool(rows) and before is not None and \
+            db.query(q.filter(ChatMessage.id > rows[-1].id).exists()).scalar()
+    if rows and more_older:
+        response.headers["X-Prev-Cursor"] = str(rows[0].id)
+    if rows and more_newer:
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return [_chat_row(m) for m in rows]
+
+EXPORT_BATCH = 500
+
+def _chat_export_lines(student_id: int):
+    """NDJSON lines for every message, read in keyset batches on a session of its own."""
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            batch = db.query(ChatMessage).filter(
+                ChatMessage.student_id == student_id, ChatMessage.id > last_id
+            ).order_by(ChatMessage.id).limit(EXPORT_BATCH).all()
+            if not batch:
+                break
+            for m in batch:
+                yield json.dumps(_chat_row(m), ensure_ascii=False) + "\n"
+            last_id = batch[-1].id
+            # Drop the batch from the identity map and end the read transaction between batches
+            db.expunge_all()
+            db.rollback()
+    finally:
+        db.close()
+
+@app.get("/api/chat/export/{student_id}")
+def export_chat(student_id: int, db: Session = Depends(get_db)):
+    """The student's full transcript as NDJSON, one message per line, streamed in batches."""
+    if not db.get(Student, student_id):
+        raise HTTPException(status_code=404, detail="Student not found")
+    return StreamingResponse(_chat_export_lines(student_id), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": f'attachment; filename="chat-{student_id}.ndjson"'})
 
 # ────────────────────────── Flashcard Routes ──────────────────────────
 
 @app.get("/api/flashcards/decks/{path_id}")
-def get_flashcard_decks(path_id: str, db: Session = Depends(get_db)):
-    decks = db.query(FlashcardDeck).filter(FlashcardDeck.path_id == path_id).all()
-    return [{"id": d.id, "title": d.title, "description": d.description} for d in decks]
+def get_flashcard_decks(path_id: str, request: Request, db: Session = Depends(get_db)):
+    def build():
+        decks = db.query(FlashcardDeck).filter(FlashcardDeck.path_id == path_id).all()
+        return [{"id": d.id, "title": d.title, "description": d.description} for d in decks]
+    return cache.respond(request, f"decks:{path_id}", build)
+
+def _flashcard_payload(topic: str, raw_cards: list) -> dict:
+    cards = []
+    for c in raw_cards:
+        back_text = c.get("back", "")
+        if c.get("example"):
+            back_text += f"\n\n🎮 Example: {c['example']}"
+        if c.get("mnemonic"):
+            back_text += f"\n\n🧠 Remember: {c['mnemonic']}"
+        cards.append({"front": c.get("front", ""), "back": back_text})
+    return {"cards": cards, "topic": topic}
+
+def _fallback_flashcards(topic: str) -> dict:
+    return {"cards": [
+        {"front": f"What is {topic}?", "back": f"{topic} is a core concept in AI. It enables machines to perform tasks that normally require human-level intelligence. Understanding it unlocks the door to building smart applications.\n\n🎮 Example: Game NPCs use similar concepts to decide their behavior.\n\n🧠 Remember: Think of it as 'teaching machines to think'."},
+        {"front": f"Why does {topic} matter?", "back": "It's one of the foundational building blocks of modern AI systems. Without it, many AI-powered features we use daily wouldn't exist. Mastering this concept opens pathways to advanced AI topics.\n\n🎮 Example: Every game recommendation algorithm relies on concepts like this."},
+        {"front": "What is Machine Learning?", "back": "ML is a branch of AI where systems automatically learn patterns from data without being explicitly programmed. The more data it sees, the smarter it gets — like a student who improves through practice.\n\n🧠 Remember: ML = learning from examples, not from rules."},
+        {"front": "What is a Neural Network?", "back": "A neural network is a system of interconnected nodes inspired by the human brain. Data flows through layers of nodes, each applying transformations until an answer emerges. Deep learning uses many of these layers.\n\n🎮 Example: The AI that generates Minecraft terrain uses neural network concepts."},
+        {"front": "What is Reinforcement Learning?", "back": "RL is how AI learns through trial, error, and rewards. The agent takes actions, observes results, and adjusts its strategy to maximize rewards over time. It's how AI learned to beat humans at chess and Go.\n\n🎮 Example: Game AI that learns to beat players uses RL to improve each match."},
+    ], "topic": topic}
+
+async def _flashcard_job(params: dict, progress) -> dict:
+    cards = await generation.flashcard_deck(params["topic"], params["path_id"], known=params.get("known", 0))
+    if cards:
+        return _flashcard_payload(params["topic"], cards)
+    return _fallback_flashcards(params["topic"])
 
 @app.post("/api/flashcards/generate")
 def generate_flashcards(req: FlashcardGenRequest, db: Session = Depends(get_db)):
@@ -944,6 +915,7 @@ def generate_flashcards(req: FlashcardGenRequest, db: Session = Depends(get_db))
         CachedFlashcard.topic_name == req.topic,
         CachedFlashcard.path_id == student.path_id
     ).all()
+    metrics.cache_lookup("flashcards", len(cached) >= 20)
     if len(cached) >= 20:
         cards = []
         for c in cached:
@@ -955,98 +927,24 @@ def generate_flashcards(req: FlashcardGenRequest, db: Session = Depends(get_db))
             cards.append({"front": c.front, "back": back_text})
         return {"cards": cards, "topic": req.topic, "cached": True}
 
-    path_context = {
-        "gaming": "For a 13-year-old gamer. Every example must reference a real game (Minecraft, PUBG, FIFA, GTA, Roblox, Valorant, etc.). Use gamer language. Make it fun.",
-        "business": "For a 17-year-old business student. Use real companies (Zomato, Flipkart, Amazon, Uber, etc.). Focus on practical business value.",
-        "developer": "For a 20-year-old CS student. Be technical. Include algorithmic concepts, code patterns, and framework names.",
-        "ai_enthusiast": "For an adult AI enthusiast. Be comprehensive and accurate. Include nuance, history, and real-world implications.",
-    }
-    ctx = path_context.get(student.path_id, "Use clear explanations with concrete examples.")
-
-    new_cards = []
+    if not (GROQ_AVAILABLE or GEMINI_AVAILABLE):
+        return _fallback_flashcards(req.topic)
 
-    # ── Primary: Groq (25 flashcards) ──
-    if GROQ_AVAILABLE:
-        try:
-            prompt = f"""Generate exactly 25 comprehensive flashcards about "{req.topic}".
-{ctx}
-
-Each flashcard should be memorable and test real understanding — NOT just rote memorization.
-Cover the topic from multiple angles: definitions, mechanisms, applications, comparisons, edge cases, history.
-
-Return ONLY valid JSON array. Each object:
-{{"front":"concise question or term (max 15 words)","back":"rich explanation (3-4 sentences that really teach)","example":"specific real-world or gaming example (2 sentences)","mnemonic":"memory trick, acronym, or vivid analogy (1-2 sentences, can be empty string if not helpful)"}}"""
-            text = groq_chat([{"role": "user", "content": prompt}], max_tokens=5000)
-            if "```" in text:
-                parts = text.split("```")
-                text = parts[1] if len(parts) > 1 else text
-                if text.startswith("json"):
-                    text = text[4:]
-                text = text.rsplit("```", 1)[0]
-            new_cards = json.loads(text.strip())
-        except Exception:
-            new_cards = []
-
-    # ── Fallback: Gemini (15 flashcards) ──
-    if not new_cards and GEMINI_AVAILABLE:
-        try:
-            prompt = f"""Generate exactly 15 flashcards about "{req.topic}". {ctx}
-Return ONLY valid JSON array. Each object:
-{{"front":"concise question or term","back":"3-4 sentence explanation","example":"real-world example","mnemonic":"memory trick or empty string"}}"""
-            response = gemini_model.generate_content(prompt)
-            text = response.text.strip()
-            if text.startswith("```"):
-                text = text.split("\n", 1)[1].rsplit("```", 1)[0].strip()
-            new_cards = json.loads(text)
-        except Exception:
-            pass
-
-    # ── Cache and return ──
-    if new_cards:
-        for c in new_cards:
-            db.add(CachedFlashcard(
-                topic_name=req.topic,
-                path_id=student.path_id,
-                front=c.get("front", ""),
-                back=c.get("back", ""),
-                example=c.get("example", ""),
-                mnemonic=c.get("mnemonic", ""),
-            ))
-        db.commit()
-        cards = []
-        for c in new_cards:
-            back_text = c.get("back", "")
-            if c.get("example"):
-                back_text += f"\n\n🎮 Example: {c['example']}"
-            if c.get("mnemonic"):
-                back_text += f"\n\n🧠 Remember: {c['mnemonic']}"
-            cards.append({"front": c.get("front", ""), "back": back_text})
-        return {"cards": cards, "topic": req.topic}
-
-    # ── Static fallback ──
-    return {"cards": [
-        {"front": f"What is {req.topic}?", "back": f"{req.topic} is a core concept in AI. It enables machines to perform tasks that normally require human-level intelligence. Understanding it unlocks the door to building smart applications.\n\n🎮 Example: Game NPCs use similar concepts to decide their behavior.\n\n🧠 Remember: Think of it as 'teaching machines to think'."},
-        {"front": f"Why does {req.topic} matter?", "back": "It's one of the foundational building blocks of modern AI systems. Without it, many AI-powered features we use daily wouldn't exist. Mastering this concept opens pathways to advanced AI topics.\n\n🎮 Example: Every game recommendation algorithm relies on concepts like this."},
-        {"front": "What is Machine Learning?", "back": "ML is a branch of AI where systems automatically learn patterns from data without being explicitly programmed. The more data it sees, the smarter it gets — like a student who improves through practice.\n\n🧠 Remember: ML = learning from examples, not from rules."},
-        {"front": "What is a Neural Network?", "back": "A neural network is a system of interconnected nodes inspired by the human brain. Data flows through layers of nodes, each applying transformations until an answer emerges. Deep learning uses many of these layers.\n\n🎮 Example: The AI that generates Minecraft terrain uses neural network concepts."},
-        {"front": "What is Reinforcement Learning?", "back": "RL is how AI learns through trial, error, and rewards. The agent takes actions, observes results, and adjusts its strategy to maximize rewards over time. It's how AI learned to beat humans at chess and Go.\n\n🎮 Example: Game AI that learns to beat players uses RL to improve each match."},
-    ], "topic": req.topic}
+    # ── Cache miss: queue generation and let the client poll the job ──
+    job = jobs.enqueue(db, "flashcards", singleflight.make_key("flashcards", req.topic, student.path_id), {
+        "topic": req.topic, "path_id": student.path_id, "known": len(cached),
+    })
+    return JSONResponse(jobs.accepted(job), status_code=202)
 
 @app.post("/api/flashcards/progress")
 def update_flashcard_progress(req: FlashcardProgressRequest, db: Session = Depends(get_db)):
-    progress = db.query(FlashcardProgress).filter(
-        FlashcardProgress.student_id == req.student_id,
-        FlashcardProgress.deck_id == req.deck_id,
-        FlashcardProgress.card_index == req.card_index
-    ).first()
-    if not progress:
-        progress = FlashcardProgress(student_id=req.student_id, deck_id=req.deck_id,
-                                      card_index=req.card_index, known=req.known)
-        db.add(progress)
-    else:
-        progress.known = req.known
-        progress.reviewed_at = datetime.utcnow()
-    db.commit()
+    # One upsert, so a double-tapped card can't trip the unique constraint
+    now = datetime.utcnow()
+    db.execute(upsert(db, FlashcardProgress).values(
+        student_id=req.student_id, deck_id=req.deck_id, card_index=req.card_index, known=req.known, reviewed_at=now
+    ).on_conflict_do_update(
+        index_elements=[FlashcardProgress.student_id, FlashcardProgress.deck_id, FlashcardProgress.card_index],
+        set_={"known": req.known, "reviewed_at": now}))
 
     # Check if completed a deck
     deck_progress = db.query(FlashcardProgress).filter(
@@ -1055,18 +953,21 @@ def update_flashcard_progress(req: FlashcardProgressRequest, db: Session = Depen
     ).count()
     if deck_progress >= 10:
         add_xp(db, req.student_id, 30, "Flashcard session complete")
+    db.commit()
 
     return {"message": "Progress saved"}
 
 # ────────────────────────── Concepts Routes ──────────────────────────
 
 @app.get("/api/concepts/{path_id}")
-def get_concepts(path_id: str, db: Session = Depends(get_db)):
-    concepts = db.query(Concept).filter(Concept.path_id == path_id).all()
-    return [{"id": c.id, "title": c.title, "simple_explanation": c.simple_explanation,
-             "technical_explanation": c.technical_explanation,
-             "real_world_example": c.real_world_example, "fun_fact": c.fun_fact,
-             "difficulty": c.difficulty, "read_time": c.read_time} for c in concepts]
+def get_concepts(path_id: str, request: Request, db: Session = Depends(get_db)):
+    def build():
+        concepts = db.query(Concept).filter(Concept.path_id == path_id).all()
+        return [{"id": c.id, "title": c.title, "simple_explanation": c.simple_explanation,
+                 "technical_explanation": c.technical_explanation,
+                 "real_world_example": c.real_world_example, "fun_fact": c.fun_fact,
+                 "difficulty": c.difficulty, "read_time": c.read_time} for c in concepts]
+    return cache.respond(request, f"concepts:{path_id}", build)
 
 # ────────────────────────── Daily Challenge Routes ──────────────────────────
 
@@ -1103,7 +1004,12 @@ def get_today_challenge(student_id: int, db: Session = Depends(get_db)):
         challenge_type=challenge["type"], challenge_text=challenge["text"]
     )
     db.add(new_challenge)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request created today's challenge first — return that one
+        db.rollback()
+        return get_today_challenge(student_id, db)
 
     return {"id": new_challenge.id, "type": challenge["type"],
             "text": challenge["text"], "completed": False,
@@ -1115,50 +1021,80 @@ def submit_challenge(req: ChallengeSubmitRequest, db: Session = Depends(get_db))
     if not challenge:
         raise HTTPException(status_code=404, detail="Challenge not found")
 
+    first_completion = not challenge.completed
     challenge.completed = True
     challenge.response = req.response
     challenge.xp_earned = 100
-    db.commit()
+
+    student = db.get(Student, req.student_id)
+    if student and first_completion:
+        badges.emit(db, student, badges.CHALLENGE_COMPLETED)
 
     total_xp = add_xp(db, req.student_id, 100, "Daily challenge completed!")
+    db.commit()
 
     return {"message": "Challenge completed! 🎉", "xp_earned": 100, "total_xp": total_xp}
 
 # ────────────────────────── Leaderboard Routes ──────────────────────────
 
-@app.get("/api/leaderboard")
-def get_leaderboard(period: str = "all", db: Session = Depends(get_db)):
-    students = db.query(Student).filter(Student.role == "student").order_by(desc(Student.total_xp)).all()
-
-    messages = [
-        "👑 The AI King!", "🔥 Almost there, keep pushing!",
-        "💪 Time to grind!", "🚀 Last place today, Legend tomorrow!"
-    ]
+LEADERBOARD_MESSAGES = [
+    "👑 The AI King!", "🔥 Almost there, keep pushing!",
+    "💪 Time to grind!", "🚀 Last place today, Legend tomorrow!"
+]
+PERIOD_PATTERN = "^(" + "|".join(leaderboard.PERIODS) + ")$"
 
+def _leaderboard_rows(db: Session, ranked) -> list:
+    """[(rank, student_id, xp)] → response rows, loading the students in one query."""
+    ids = [sid for _, sid, _ in ranked]
+    students = {s.id: s for s in db.query(Student).filter(Student.id.in_(ids))} if ids else {}
     result = []
-    for i, s in enumerate(students):
+    for rank, sid, xp in ranked:
+        s = students.get(sid)
+        if not s:
+            continue
         result.append({
-            "rank": i + 1, "name": s.name, "avatar": s.avatar,
-            "total_xp": s.total_xp, "level": s.level,
+            "rank": rank, "student_id": s.id, "name": s.name, "avatar": s.avatar,
+            "xp": xp, "total_xp": s.total_xp, "level": s.level,
             "current_streak": s.current_streak, "path_id": s.path_id,
-            "message": messages[i] if i < len(messages) else "Keep going! 🌟"
+            "message": LEADERBOARD_MESSAGES[rank - 1] if rank <= len(LEADERBOARD_MESSAGES) else "Keep going! 🌟"
         })
     return result
 
+@app.get("/api/leaderboard")
+def get_leaderboard(period: str = Query("all", pattern=PERIOD_PATTERN),
+                    limit: int = Query(50, ge=1, le=1000), offset: int = Query(0, ge=0),
+                    db: Session = Depends(get_db)):
+    """Students ranked by XP earned in `period` (all time, or the last day/week/month)."""
+    top = leaderboard.top(period, limit, offset)
+    return _leaderboard_rows(db, [(offset + i + 1, sid, xp) for i, (sid, xp) in enumerate(top)])
+
+@app.get("/api/leaderboard/rank/{student_id}")
+def get_leaderboard_rank(student_id: int, period: str = Query("all", pattern=PERIOD_PATTERN),
+                         neighbours: int = Query(2, ge=0, le=50), db: Session = Depends(get_db)):
+    """A student's rank in `period` plus the students just above and below them."""
+    standing = leaderboard.standing(student_id, period, neighbours)
+    if not standing:
+        raise HTTPException(404, "Student not on the leaderboard")
+    rank, xp, around = standing
+    return {"student_id": student_id, "period": period, "rank": rank, "xp": xp,
+            "neighbours": _leaderboard_rows(db, around)}
+
 # ────────────────────────── Badge Routes ──────────────────────────
 
 @app.get("/api/badges")
-def get_all_badges(db: Session = Depends(get_db)):
-    badges = db.query(Badge).all()
-    return [{"id": b.id, "name": b.name, "description": b.description,
-             "icon": b.icon, "category": b.category} for b in badges]
+def get_all_badges(request: Request, db: Session = Depends(get_db)):
+    def build():
+        return [{"id": b.id, "name": b.name, "description": b.description,
+                 "icon": b.icon, "category": b.category} for b in db.query(Badge).all()]
+    return cache.respond(request, "badges", build)
 
 @app.get("/api/badges/{student_id}")
 def get_student_badges(student_id: int, db: Session = Depends(get_db)):
-    student_badges = db.query(StudentBadge).filter(StudentBadge.student_id == student_id).all()
+    student_badges = db.query(StudentBadge).options(joinedload(StudentBadge.badge)).filter(
+        StudentBadge.student_id == student_id).all()
     result = []
     for sb in student_badges:
-        badge = db.query(Badge).filter(Badge.id == sb.badge_id).first()
+        badge = sb.badge
         if badge:
             result.append({
                 "id": badge.id, "name": badge.name, "description": badge.description,
@@ -1175,94 +1111,145 @@ def get_xp_log(student_id: int, db: Session = Depends(get_db)):
     return [{"amount": l.amount, "reason": l.reason,
              "created_at": l.created_at.isoformat() if l.created_at else ""} for l in logs]
 
+ANALYTICS_DAYS = 90        # default chart window
+ANALYTICS_MAX_DAYS = 366
+
 @app.get("/api/analytics/{student_id}")
-def get_analytics(student_id: int, db: Session = Depends(get_db)):
+def get_analytics(student_id: int, start: Optional[date] = None, end: Optional[date] = None,
+                  db: Session = Depends(get_db)):
+    """Totals from the student's running counters; charts from daily rollups in [start, end] (UTC days)."""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=ANALYTICS_DAYS - 1)
+    if start > end or (end - start).days >= ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=422, detail=f"start..end must be an ordered range of at most {ANALYTICS_MAX_DAYS} days")
+
     student = db.query(Student).filter(Student.id == student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
 
-    topics_total = db.query(Topic).filter(Topic.path_id == student.path_id).count()
-    topics_completed = db.query(TopicProgress).filter(
-        TopicProgress.student_id == student_id, TopicProgress.completed == True
-    ).count()
-
-    quiz_results = db.query(QuizResult).filter(QuizResult.student_id == student_id).all()
-    avg_score = sum(r.score for r in quiz_results) / len(quiz_results) if quiz_results else 0
-    total_quizzes = len(quiz_results)
-    perfect_scores = sum(1 for r in quiz_results if r.score == 100)
-
+    stats, backfilled = badges.get_stats(db, student_id)
+    if backfilled:
+        db.commit()
     badges_earned = db.query(StudentBadge).filter(StudentBadge.student_id == student_id).count()
-    total_badges = db.query(Badge).count()
-
-    challenges_done = db.query(DailyChallenge).filter(
-        DailyChallenge.student_id == student_id, DailyChallenge.completed == True
-    ).count()
-
-    chat_count = db.query(ChatMessage).filter(
-        ChatMessage.student_id == student_id, ChatMessage.role == "user"
-    ).count()
-
-    # XP by day for chart
-    xp_logs = db.query(XPLog).filter(XPLog.student_id == student_id).all()
-    xp_by_day = {}
-    for log in xp_logs:
-        day = log.created_at.strftime("%Y-%m-%d") if log.created_at else "unknown"
-        xp_by_day[day] = xp_by_day.get(day, 0) + log.amount
-    xp_chart = [{"date": k, "xp": v} for k, v in sorted(xp_by_day.items())]
 
-    # Quiz scores over time
-    quiz_chart = [{"date": r.taken_at.strftime("%Y-%m-%d") if r.taken_at else "",
-                   "score": r.score} for r in quiz_results]
+    rollups = db.query(DailyRollup).filter(
+        DailyRollup.student_id == student_id,
+        DailyRollup.day >= start.isoformat(), DailyRollup.day <= end.isoformat()
+    ).order_by(DailyRollup.day).all()
+    xp_chart = [{"date": r.day, "xp": r.xp} for r in rollups if r.xp]
+    quiz_chart = [{"date": r.day, "score": round(r.quiz_score_total / r.quizzes, 1), "quizzes": r.quizzes}
+                  for r in rollups if r.quizzes]
 
     return {
         "total_xp": student.total_xp,
         "level": student.level,
         "current_streak": student.current_streak,
         "longest_streak": student.longest_streak,
-        "topics_completed": topics_completed,
-        "topics_total": topics_total,
-        "avg_quiz_score": round(avg_score, 1),
-        "total_quizzes": total_quizzes,
-        "perfect_scores": perfect_scores,
+        "topics_completed": stats.topics_completed,
+        "topics_total": badges.topics_in_path(db, student.path_id),
+        "avg_quiz_score": round(stats.quiz_score_total / stats.quizzes_taken, 1) if stats.quizzes_taken else 0,
+        "total_quizzes": stats.quizzes_taken,
+        "perfect_scores": stats.perfect_quizzes,
         "badges_earned": badges_earned,
-        "total_badges": total_badges,
-        "challenges_completed": challenges_done,
-        "tutor_questions": chat_count,
+        "total_badges": badges.total_badges(db),
+        "challenges_completed": stats.challenges_completed,
+        "tutor_questions": stats.chat_messages,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
         "xp_chart": xp_chart,
         "quiz_chart": quiz_chart,
     }
 
 # ────────────────────────── Admin Routes ──────────────────────────
 
+ADMIN_SORT_KEYS = ("id", "name", "total_xp", "current_streak", "topics_completed",
+                   "quizzes_taken", "badges_earned", "challenges_completed")
+
+def _count_by_student(db: Session, model, *filters):
+    return db.query(model.student_id.label("student_id"), func.count().label("n")).filter(
+        *filters).group_by(model.student_id).subquery()
+
 @app.get("/api/admin/overview")
-def admin_overview(db: Session = Depends(get_db)):
-    students = db.query(Student).filter(Student.role == "student").all()
-    overview = []
-    for s in students:
-        topics_completed = db.query(TopicProgress).filter(
-            TopicProgress.student_id == s.id, TopicProgress.completed == True
-        ).count()
-        topics_total = db.query(Topic).filter(Topic.path_id == s.path_id).count()
-        quizzes_taken = db.query(QuizResult).filter(QuizResult.student_id == s.id).count()
-        badges = db.query(StudentBadge).filter(StudentBadge.student_id == s.id).count()
-        challenges = db.query(DailyChallenge).filter(
-            DailyChallenge.student_id == s.id, DailyChallenge.completed == True
-        ).count()
+def admin_overview(response: Response, sort: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"),
+                   limit: Optional[int] = Query(None, ge=1, le=1000), offset: int = Query(0, ge=0),
+                   db: Session = Depends(get_db)):
+    """Per-student progress counts, aggregated per table in one grouped query each.
+
+    Optional `limit`/`offset` paging with `sort`/`order`; the unpaged total is in X-Total-Count.
+    """
+    if sort not in ADMIN_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(ADMIN_SORT_KEYS)}")
+
+    completed = _count_by_student(db, TopicProgress, TopicProgress.completed == True)
+    quizzes = _count_by_student(db, QuizResult)
+    earned = _count_by_student(db, StudentBadge)
+    challenges = _count_by_student(db, DailyChallenge, DailyChallenge.completed == True)
+    path_totals = db.query(Topic.path_id.label("path_id"), func.count().label("n")).group_by(
+        Topic.path_id).subquery()
+
+    columns = {
+        "topics_completed": func.coalesce(completed.c.n, 0),
+        "topics_total": func.coalesce(path_totals.c.n, 0),
+        "quizzes_taken": func.coalesce(quizzes.c.n, 0),
+        "badges_earned": func.coalesce(earned.c.n, 0),
+        "challenges_completed": func.coalesce(challenges.c.n, 0),
+    }
+    sort_col = columns[sort] if sort in columns else getattr(Student, sort)
+    q = db.query(Student, *(c.label(name) for name, c in columns.items())).filter(Student.role == "student") \
+        .outerjoin(completed, completed.c.student_id == Student.id) \
+        .outerjoin(quizzes, quizzes.c.student_id == Student.id) \
+        .outerjoin(earned, earned.c.student_id == Student.id) \
+        .outerjoin(challenges, challenges.c.student_id == Student.id) \
+        .outerjoin(path_totals, path_totals.c.path_id == Student.path_id) \
+        .order_by(desc(sort_col) if order == "desc" else sort_col, Student.id)
+
+    response.headers["X-Total-Count"] = str(db.query(Student).filter(Student.role == "student").count())
+    if limit is not None:
+        q = q.limit(limit)
+    if offset:
+        q = q.offset(offset)
 
+    overview = []
+    for row in q.all():
+        s = row.Student
         overview.append({
             "id": s.id, "name": s.name, "age": s.age, "path_id": s.path_id,
             "avatar": s.avatar, "total_xp": s.total_xp, "level": s.level,
             "current_streak": s.current_streak,
-            "topics_completed": topics_completed, "topics_total": topics_total,
-            "quizzes_taken": quizzes_taken, "badges_earned": badges,
-            "challenges_completed": challenges,
+            "topics_completed": row.topics_completed, "topics_total": row.topics_total,
+            "quizzes_taken": row.quizzes_taken, "badges_earned": row.badges_earned,
+            "challenges_completed": row.challenges_completed,
         })
     return overview
 
+# ────────────────────────── Job Routes ──────────────────────────
+
+jobs.register("topic", _topic_job)
+jobs.register("quiz", _quiz_job)
+jobs.register("flashcards", _flashcard_job)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Polled every second by waiting clients, so it stays off the sync thread pool
+    job = await db.get(GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.describe(job)
+
 @app.get("/api/health")
 def health_check():
     return {"status": "ok", "gemini": GEMINI_AVAILABLE}
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/chat/cache/stats")
+def tutor_cache_stats():
+    """Hit rate, lookup vs LLM latency and size of the tutor's semantic cache."""
+    return semantic_cache.snapshot()
+
 # ────────────────────────── Serve React Frontend ──────────────────────────
 
 STATIC_DIR = Path(__file__).parent / "static"
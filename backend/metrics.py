@@ -0,0 +1,257 @@
+"""
+metrics.py — In-process metrics, exposed in the Prometheus text format at /metrics.
+
+    http_request_duration_seconds   per method + route template (a streamed
+                                    response counts until its last byte)
+    http_requests_total             per method + route + status
+    db_request_statements           SQL statements issued per request, per route
+    db_request_seconds              time spent in SQL per request, per route
+    db_statement_duration_seconds   every statement, by operation (SELECT, ...)
+    llm_request_duration_seconds    per provider + call site (chat, quiz, ...)
+    llm_requests_total              per provider + site + outcome (ok / error)
+    llm_tokens_total                per provider + site + kind (prompt / completion)
+    cache_requests_total            per cache + result (hit / miss)
+    cache_hit_ratio                 per cache, computed when scraped
+
+SQL is timed through SQLAlchemy engine events, attributed to the request
+whose context issued it. Values are per process; with several workers,
+scrape each one (or sum them).
+"""
+import contextvars
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for labels, value in sorted(items):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, labels
+        self.buckets = tuple(buckets)
+        self.series = {}   # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self.lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, list(s)) for labels, s in self.series.items()]
+        for labels, s in sorted(items):
+            for bound, n in zip(self.buckets, s):
+                le = _labels(self.label_names, labels, f'le="{_number(bound)}"')
+                yield f"{self.name}_bucket{le} {n}"
+            inf = _labels(self.label_names, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{inf} {s[-1]}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(s[-2])}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {s[-1]}"
+
+
+class Gauge:
+    """Read from `collect()` — a callable returning {label tuple: value} — at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple, collect):
+        self.name, self.help, self.label_names, self.collect = name, help, labels, collect
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# ────────────────────────── HTTP ──────────────────────────
+
+http_duration = register(Histogram("http_request_duration_seconds", "Request latency until the last body byte.",
+                                   ("method", "route")))
+http_requests = register(Counter("http_requests_total", "Requests served.", ("method", "route", "status")))
+db_request_statements = register(Histogram("db_request_statements", "SQL statements issued per request.",
+                                           ("route",), COUNT_BUCKETS))
+db_request_seconds = register(Histogram("db_request_seconds", "Time spent in SQL per request.", ("route",)))
+
+# [statements, seconds] for the request being served; shared by reference with
+# the worker threads sync routes run on
+_request_sql = contextvars.ContextVar("request_sql", default=None)
+
+
+def _route(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request and the SQL it issues."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        sql = [0, 0.0]
+        token = _request_sql.set(sql)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_sql.reset(token)
+            route, method = _route(scope), scope["method"]
+            http_duration.observe(time.perf_counter() - started, method, route)
+            http_requests.inc(method, route, str(status))
+            db_request_statements.observe(sql[0], route)
+            db_request_seconds.observe(sql[1], route)
+
+
+# ────────────────────────── SQL ──────────────────────────
+
+db_statement_duration = register(Histogram("db_statement_duration_seconds", "SQL statement latency.",
+                                           ("operation",), SQL_BUCKETS))
+OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    db_statement_duration.observe(elapsed, word if word in OPERATIONS else "OTHER")
+    sql = _request_sql.get()
+    if sql is not None:
+        sql[0] += 1
+        sql[1] += elapsed
+
+
+@event.listens_for(Engine, "handle_error")
+def _execute_failed(context):
+    started = context.connection.info.get("metrics_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+# ────────────────────────── LLM ──────────────────────────
+
+llm_duration = register(Histogram("llm_request_duration_seconds", "LLM call latency, retries included.",
+                                  ("provider", "site"), LLM_BUCKETS))
+llm_requests = register(Counter("llm_requests_total", "LLM calls.", ("provider", "site", "outcome")))
+llm_tokens = register(Counter("llm_tokens_total", "Tokens reported by the provider.", ("provider", "site", "kind")))
+
+
+def llm_call(provider: str, site: str, seconds: float, ok: bool):
+    llm_duration.observe(seconds, provider, site)
+    llm_requests.inc(provider, site, "ok" if ok else "error")
+
+
+def llm_usage(provider: str, site: str, prompt_tokens: int, completion_tokens: int):
+    if prompt_tokens:
+        llm_tokens.inc(provider, site, "prompt", amount=prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc(provider, site, "completion", amount=completion_tokens)
+
+
+# ────────────────────────── Caches ──────────────────────────
+
+cache_requests = register(Counter("cache_requests_total", "Cache lookups.", ("cache", "result")))
+_ratio_sources = {}   # cache name -> callable returning (hits, misses)
+
+
+def cache_lookup(cache: str, hit: bool):
+    cache_requests.inc(cache, "hit" if hit else "miss")
+
+
+def track_cache(cache: str, counts):
+    """Report the hit ratio of a cache that keeps its own (hits, misses) counters."""
+    _ratio_sources[cache] = counts
+
+
+def _hit_ratios() -> dict:
+    totals = {}
+    with cache_requests.lock:
+        for (cache, result), n in cache_requests.values.items():
+            totals.setdefault(cache, [0, 0])[result == "miss"] += n
+    for cache, counts in _ratio_sources.items():
+        totals[cache] = list(counts())
+    return {(cache,): hits / (hits + misses) for cache, (hits, misses) in totals.items() if hits + misses}
+
+
+register(Gauge("cache_hit_ratio", "Hits / lookups since the process started.", ("cache",), _hit_ratios))
@@ -0,0 +1,58 @@
+"""
+migrate.py — Bring the database schema up to date with Alembic.
+
+Runs at app startup (unless MIGRATE_ON_STARTUP=0) and from the seed
+scripts; `python migrate.py` does the same from a release step.
+Databases created by the old Base.metadata.create_all have no
+alembic_version table, so they are stamped at the baseline revision
+before upgrading. Concurrent instances serialize on a lock (a Postgres
+advisory lock, or SQLite's write lock), so only one applies migrations.
+"""
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+
+# .env may set DATABASE_URL; load it before `database` reads it
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+from database import DATABASE_URL, engine, make_engine
+
+HERE = Path(__file__).resolve().parent
+BASELINE = "0001"
+PG_LOCK_KEY = 726_367_001  # arbitrary, just unique to this app
+
+
+def config() -> Config:
+    cfg = Config(str(HERE / "alembic.ini"))
+    cfg.set_main_option("script_location", str(HERE / "migrations"))
+    cfg.attributes["configure_logger"] = False
+    return cfg
+
+
+def upgrade(url: str = None, revision: str = "head"):
+    eng = engine if url is None or url == DATABASE_URL else make_engine(url)
+    cfg = config()
+    with eng.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PG_LOCK_KEY})
+        elif conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        cfg.attributes["connection"] = conn
+        tables = inspect(conn).get_table_names()
+        if "alembic_version" not in tables and "students" in tables:
+            command.stamp(cfg, BASELINE)
+        command.upgrade(cfg, revision)
+        conn.commit()
+    if eng is not engine:
+        eng.dispose()
+
+
+if __name__ == "__main__":
+    upgrade()
+    print("✅ Database schema is up to date")
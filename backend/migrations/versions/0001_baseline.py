@@ -0,0 +1,228 @@
+"""baseline — the schema as Base.metadata.create_all built it before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 00:20:19.581350
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('badges',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=False),
+    sa.Column('icon', sa.String(), nullable=True),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_badges_id'), 'badges', ['id'], unique=False)
+    op.create_table('cached_flashcards',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('topic_name', sa.String(), nullable=False),
+    sa.Column('path_id', sa.String(), nullable=False),
+    sa.Column('front', sa.Text(), nullable=False),
+    sa.Column('back', sa.Text(), nullable=False),
+    sa.Column('example', sa.Text(), nullable=True),
+    sa.Column('mnemonic', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cached_flashcards_id'), 'cached_flashcards', ['id'], unique=False)
+    op.create_table('concepts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path_id', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('simple_explanation', sa.Text(), nullable=True),
+    sa.Column('technical_explanation', sa.Text(), nullable=True),
+    sa.Column('real_world_example', sa.Text(), nullable=True),
+    sa.Column('fun_fact', sa.Text(), nullable=True),
+    sa.Column('difficulty', sa.String(), nullable=True),
+    sa.Column('read_time', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_concepts_id'), 'concepts', ['id'], unique=False)
+    op.create_table('flashcard_decks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path_id', sa.String(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_flashcard_decks_id'), 'flashcard_decks', ['id'], unique=False)
+    op.create_table('students',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('age', sa.Integer(), nullable=False),
+    sa.Column('pin', sa.String(), nullable=False),
+    sa.Column('role', sa.String(), nullable=True),
+    sa.Column('path_id', sa.String(), nullable=False),
+    sa.Column('avatar', sa.String(), nullable=True),
+    sa.Column('total_xp', sa.Integer(), nullable=True),
+    sa.Column('level', sa.String(), nullable=True),
+    sa.Column('current_streak', sa.Integer(), nullable=True),
+    sa.Column('longest_streak', sa.Integer(), nullable=True),
+    sa.Column('last_login_date', sa.String(), nullable=True),
+    sa.Column('streak_freezes', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_students_id'), 'students', ['id'], unique=False)
+    op.create_table('topics',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path_id', sa.String(), nullable=False),
+    sa.Column('order_num', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('difficulty', sa.String(), nullable=True),
+    sa.Column('read_time', sa.Integer(), nullable=True),
+    sa.Column('content_simple', sa.Text(), nullable=True),
+    sa.Column('content_normal', sa.Text(), nullable=True),
+    sa.Column('content_technical', sa.Text(), nullable=True),
+    sa.Column('fun_fact', sa.Text(), nullable=True),
+    sa.Column('real_world_example', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_topics_id'), 'topics', ['id'], unique=False)
+    op.create_table('cached_quiz_questions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('topic_id', sa.Integer(), nullable=True),
+    sa.Column('question', sa.Text(), nullable=False),
+    sa.Column('q_type', sa.String(), nullable=True),
+    sa.Column('options', sa.Text(), nullable=True),
+    sa.Column('correct', sa.Text(), nullable=False),
+    sa.Column('explanation', sa.Text(), nullable=True),
+    sa.Column('difficulty', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cached_quiz_questions_id'), 'cached_quiz_questions', ['id'], unique=False)
+    op.create_table('chat_messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.Column('role', sa.String(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_chat_messages_id'), 'chat_messages', ['id'], unique=False)
+    op.create_table('daily_challenges',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.Column('challenge_date', sa.String(), nullable=False),
+    sa.Column('challenge_type', sa.String(), nullable=False),
+    sa.Column('challenge_text', sa.Text(), nullable=False),
+    sa.Column('completed', sa.Boolean(), nullable=True),
+    sa.Column('response', sa.Text(), nullable=True),
+    sa.Column('xp_earned', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_daily_challenges_id'), 'daily_challenges', ['id'], unique=False)
+    op.create_table('flashcard_progress',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.Column('deck_id', sa.Integer(), nullable=True),
+    sa.Column('card_index', sa.Integer(), nullable=False),
+    sa.Column('known', sa.Boolean(), nullable=True),
+    sa.Column('reviewed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['deck_id'], ['flashcard_decks.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_flashcard_progress_id'), 'flashcard_progress', ['id'], unique=False)
+    op.create_table('quiz_results',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.Column('topic_id', sa.Integer(), nullable=True),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('total_questions', sa.Integer(), nullable=False),
+    sa.Column('correct_answers', sa.Integer(), nullable=False),
+    sa.Column('xp_earned', sa.Integer(), nullable=True),
+    sa.Column('taken_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_quiz_results_id'), 'quiz_results', ['id'], unique=False)
+    op.create_table('student_badges',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.Column('badge_id', sa.Integer(), nullable=True),
+    sa.Column('earned_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['badge_id'], ['badges.id'], ),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_student_badges_id'), 'student_badges', ['id'], unique=False)
+    op.create_table('topic_progress',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.Column('topic_id', sa.Integer(), nullable=True),
+    sa.Column('completed', sa.Boolean(), nullable=True),
+    sa.Column('quiz_score', sa.Float(), nullable=True),
+    sa.Column('quiz_attempts', sa.Integer(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.ForeignKeyConstraint(['topic_id'], ['topics.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_topic_progress_id'), 'topic_progress', ['id'], unique=False)
+    op.create_table('xp_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=True),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('reason', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_xp_log_id'), 'xp_log', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_xp_log_id'), table_name='xp_log')
+    op.drop_table('xp_log')
+    op.drop_index(op.f('ix_topic_progress_id'), table_name='topic_progress')
+    op.drop_table('topic_progress')
+    op.drop_index(op.f('ix_student_badges_id'), table_name='student_badges')
+    op.drop_table('student_badges')
+    op.drop_index(op.f('ix_quiz_results_id'), table_name='quiz_results')
+    op.drop_table('quiz_results')
+    op.drop_index(op.f('ix_flashcard_progress_id'), table_name='flashcard_progress')
+    op.drop_table('flashcard_progress')
+    op.drop_index(op.f('ix_daily_challenges_id'), table_name='daily_challenges')
+    op.drop_table('daily_challenges')
+    op.drop_index(op.f('ix_chat_messages_id'), table_name='chat_messages')
+    op.drop_table('chat_messages')
+    op.drop_index(op.f('ix_cached_quiz_questions_id'), table_name='cached_quiz_questions')
+    op.drop_table('cached_quiz_questions')
+    op.drop_index(op.f('ix_topics_id'), table_name='topics')
+    op.drop_table('topics')
+    op.drop_index(op.f('ix_students_id'), table_name='students')
+    op.drop_table('students')
+    op.drop_index(op.f('ix_flashcard_decks_id'), table_name='flashcard_decks')
+    op.drop_table('flashcard_decks')
+    op.drop_index(op.f('ix_concepts_id'), table_name='concepts')
+    op.drop_table('concepts')
+    op.drop_index(op.f('ix_cached_flashcards_id'), table_name='cached_flashcards')
+    op.drop_table('cached_flashcards')
+    op.drop_index(op.f('ix_badges_id'), table_name='badges')
+    op.drop_table('badges')
@@ -0,0 +1,84 @@
+"""badge counters, generation leases and the job queue
+
+Databases that predate migrations may already have these tables from
+Base.metadata.create_all, so each one is only created when missing.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:20:32.911513
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _missing(table: str) -> bool:
+    if context.is_offline_mode():  # --sql: no live DB to inspect, emit everything
+        return True
+    return not sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _missing('generation_jobs'):
+        _create_generation_jobs()
+    if _missing('generation_leases'):
+        op.create_table('generation_leases',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('owner', sa.String(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+        )
+    if _missing('student_stats'):
+        op.create_table('student_stats',
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('perfect_quizzes', sa.Integer(), nullable=True),
+        sa.Column('topics_started', sa.Integer(), nullable=True),
+        sa.Column('topics_completed', sa.Integer(), nullable=True),
+        sa.Column('chat_messages', sa.Integer(), nullable=True),
+        sa.Column('challenges_completed', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+        sa.PrimaryKeyConstraint('student_id')
+        )
+
+
+def _create_generation_jobs():
+    op.create_table('generation_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('key', sa.String(), nullable=False),
+    sa.Column('params', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('progress', sa.Float(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('owner', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_generation_jobs_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_generation_jobs_key'), ['key'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('student_stats')
+    op.drop_table('generation_leases')
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_generation_jobs_key'))
+        batch_op.drop_index(batch_op.f('ix_generation_jobs_id'))
+
+    op.drop_table('generation_jobs')
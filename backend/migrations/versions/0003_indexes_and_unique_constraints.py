@@ -0,0 +1,157 @@
+"""indexes on per-student foreign keys and hot filters, plus unique constraints
+
+Rows that would violate the new unique constraints are collapsed first,
+keeping one row per key and folding the others' progress into it.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:22:47.277977
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _dedupe(name: str, cols: list, merge=None):
+    """Keep one row per `cols` key. `merge(rows)` returns (kept_row, updated values); default keeps the oldest."""
+    if context.is_offline_mode():
+        return
+    conn = op.get_bind()
+    t = sa.Table(name, sa.MetaData(), autoload_with=conn)
+    keys = [t.c[c] for c in cols]
+    groups = conn.execute(sa.select(*keys).group_by(*keys).having(sa.func.count() > 1)).all()
+    for key in groups:
+        if any(v is None for v in key):  # NULLs never collide under a unique constraint
+            continue
+        rows = conn.execute(sa.select(t).where(*(k == v for k, v in zip(keys, key))).order_by(t.c.id)).mappings().all()
+        keep, values = merge(rows) if merge else (rows[0], {})
+        if values:
+            conn.execute(t.update().where(t.c.id == keep["id"]).values(**values))
+        conn.execute(t.delete().where(t.c.id.in_([r["id"] for r in rows if r["id"] != keep["id"]])))
+
+
+def _merge_topic_progress(rows):
+    completed_at = [r["completed_at"] for r in rows if r["completed_at"]]
+    return rows[0], {
+        "completed": any(r["completed"] for r in rows),
+        "quiz_score": max(r["quiz_score"] or 0 for r in rows),
+        "quiz_attempts": sum(r["quiz_attempts"] or 0 for r in rows),
+        "completed_at": min(completed_at) if completed_at else None,
+    }
+
+
+def _merge_daily_challenges(rows):
+    done = [r for r in rows if r["completed"]]
+    return (done or rows)[0], {}
+
+
+def _merge_flashcard_progress(rows):
+    return rows[-1], {}  # latest review wins
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _dedupe('topic_progress', ['student_id', 'topic_id'], _merge_topic_progress)
+    _dedupe('daily_challenges', ['student_id', 'challenge_date'], _merge_daily_challenges)
+    _dedupe('flashcard_progress', ['student_id', 'deck_id', 'card_index'], _merge_flashcard_progress)
+    _dedupe('student_badges', ['student_id', 'badge_id'])
+
+    with op.batch_alter_table('cached_flashcards', schema=None) as batch_op:
+        batch_op.create_index('ix_cached_flashcards_path_id_topic_name', ['path_id', 'topic_name'], unique=False)
+
+    with op.batch_alter_table('cached_quiz_questions', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_cached_quiz_questions_topic_id'), ['topic_id'], unique=False)
+
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_messages_student_id_id', ['student_id', 'id'], unique=False)
+
+    with op.batch_alter_table('concepts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_concepts_path_id'), ['path_id'], unique=False)
+
+    with op.batch_alter_table('daily_challenges', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_daily_challenges_student_date', ['student_id', 'challenge_date'])
+
+    with op.batch_alter_table('flashcard_decks', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_flashcard_decks_path_id'), ['path_id'], unique=False)
+
+    with op.batch_alter_table('flashcard_progress', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_flashcard_progress_student_deck_card', ['student_id', 'deck_id', 'card_index'])
+
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_generation_jobs_status_id', ['status', 'id'], unique=False)
+
+    with op.batch_alter_table('quiz_results', schema=None) as batch_op:
+        batch_op.create_index('ix_quiz_results_student_id_taken_at', ['student_id', 'taken_at'], unique=False)
+
+    with op.batch_alter_table('student_badges', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_student_badges_student_badge', ['student_id', 'badge_id'])
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.create_index('ix_students_role_total_xp', ['role', 'total_xp'], unique=False)
+
+    with op.batch_alter_table('topic_progress', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_topic_progress_student_topic', ['student_id', 'topic_id'])
+
+    with op.batch_alter_table('topics', schema=None) as batch_op:
+        batch_op.create_index('ix_topics_path_id_order_num', ['path_id', 'order_num'], unique=False)
+
+    with op.batch_alter_table('xp_log', schema=None) as batch_op:
+        batch_op.create_index('ix_xp_log_created_at', ['created_at'], unique=False)
+        batch_op.create_index('ix_xp_log_student_id_created_at', ['student_id', 'created_at'], unique=False)
+
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('xp_log', schema=None) as batch_op:
+        batch_op.drop_index('ix_xp_log_student_id_created_at')
+        batch_op.drop_index('ix_xp_log_created_at')
+
+    with op.batch_alter_table('topics', schema=None) as batch_op:
+        batch_op.drop_index('ix_topics_path_id_order_num')
+
+    with op.batch_alter_table('topic_progress', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_topic_progress_student_topic', type_='unique')
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_index('ix_students_role_total_xp')
+
+    with op.batch_alter_table('student_badges', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_student_badges_student_badge', type_='unique')
+
+    with op.batch_alter_table('quiz_results', schema=None) as batch_op:
+        batch_op.drop_index('ix_quiz_results_student_id_taken_at')
+
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_generation_jobs_status_id')
+
+    with op.batch_alter_table('flashcard_progress', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_flashcard_progress_student_deck_card', type_='unique')
+
+    with op.batch_alter_table('flashcard_decks', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_flashcard_decks_path_id'))
+
+    with op.batch_alter_table('daily_challenges', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_daily_challenges_student_date', type_='unique')
+
+    with op.batch_alter_table('concepts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_concepts_path_id'))
+
+    with op.batch_alter_table('chat_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_messages_student_id_id')
+
+    with op.batch_alter_table('cached_quiz_questions', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_cached_quiz_questions_topic_id'))
+
+    with op.batch_alter_table('cached_flashcards', schema=None) as batch_op:
+        batch_op.drop_index('ix_cached_flashcards_path_id_topic_name')
+
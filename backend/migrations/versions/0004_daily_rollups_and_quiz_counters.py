@@ -0,0 +1,97 @@
+"""daily rollups and quiz counters
+
+Existing history is folded into daily_rollups and the new student_stats
+columns so analytics read the same numbers as before the upgrade.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:28:48.048963
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_rollups',
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.String(), nullable=False),
+    sa.Column('xp', sa.Integer(), nullable=False),
+    sa.Column('quizzes', sa.Integer(), nullable=False),
+    sa.Column('quiz_score_total', sa.Float(), nullable=False),
+    sa.Column('chats', sa.Integer(), nullable=False),
+    sa.Column('challenges', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ),
+    sa.PrimaryKeyConstraint('student_id', 'day')
+    )
+    with op.batch_alter_table('student_stats', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('quizzes_taken', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('quiz_score_total', sa.Float(), nullable=True))
+    _backfill()
+
+
+def _day(col):
+    return sa.func.date(col)  # 'YYYY-MM-DD' on SQLite, a date on Postgres
+
+
+def _backfill():
+    if context.is_offline_mode():
+        return
+    conn = op.get_bind()
+    meta = sa.MetaData()
+    xp_log, quiz_results, chat_messages, daily_challenges, student_stats, daily_rollups = (
+        sa.Table(name, meta, autoload_with=conn) for name in (
+            'xp_log', 'quiz_results', 'chat_messages', 'daily_challenges', 'student_stats', 'daily_rollups'))
+
+    rollups = {}
+
+    def fold(stmt, *fields):
+        for sid, day, *values in conn.execute(stmt):
+            if sid is None or day is None:
+                continue
+            row = rollups.setdefault((sid, str(day)), dict.fromkeys(
+                ('xp', 'quizzes', 'quiz_score_total', 'chats', 'challenges'), 0))
+            for field, value in zip(fields, values):
+                row[field] += value or 0
+
+    day = _day(xp_log.c.created_at)
+    fold(sa.select(xp_log.c.student_id, day, sa.func.sum(xp_log.c.amount))
+         .group_by(xp_log.c.student_id, day), 'xp')
+    day = _day(quiz_results.c.taken_at)
+    fold(sa.select(quiz_results.c.student_id, day, sa.func.count(), sa.func.sum(quiz_results.c.score))
+         .group_by(quiz_results.c.student_id, day), 'quizzes', 'quiz_score_total')
+    day = _day(chat_messages.c.created_at)
+    fold(sa.select(chat_messages.c.student_id, day, sa.func.count())
+         .where(chat_messages.c.role == 'user').group_by(chat_messages.c.student_id, day), 'chats')
+    fold(sa.select(daily_challenges.c.student_id, daily_challenges.c.challenge_date, sa.func.count())
+         .where(daily_challenges.c.completed == sa.true())
+         .group_by(daily_challenges.c.student_id, daily_challenges.c.challenge_date), 'challenges')
+    if rollups:
+        conn.execute(daily_rollups.insert(), [
+            {'student_id': sid, 'day': day, **values} for (sid, day), values in rollups.items()])
+
+    per_student = quiz_results.c.student_id == student_stats.c.student_id
+    conn.execute(student_stats.update().values(
+        quizzes_taken=sa.select(sa.func.count()).where(per_student).scalar_subquery(),
+        quiz_score_total=sa.select(sa.func.coalesce(sa.func.sum(quiz_results.c.score), 0))
+        .where(per_student).scalar_subquery(),
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('student_stats', schema=None) as batch_op:
+        batch_op.drop_column('quiz_score_total')
+        batch_op.drop_column('quizzes_taken')
+
+    op.drop_table('daily_rollups')
@@ -0,0 +1,68 @@
+"""float quiz score totals
+
+QuizResult.score is a float, so the running sums are too. Databases that
+ran 0004 before it declared them Float have Integer columns (Postgres
+rounded every added score), so the totals are widened and recomputed
+from quiz_results.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 01:02:11.402318
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('daily_rollups', schema=None) as batch_op:
+        batch_op.alter_column('quiz_score_total', existing_type=sa.Integer(), type_=sa.Float(),
+                              existing_nullable=False)
+    with op.batch_alter_table('student_stats', schema=None) as batch_op:
+        batch_op.alter_column('quiz_score_total', existing_type=sa.Integer(), type_=sa.Float(),
+                              existing_nullable=True)
+    _recompute()
+
+
+def _recompute():
+    if context.is_offline_mode():
+        return
+    conn = op.get_bind()
+    meta = sa.MetaData()
+    quiz_results, student_stats, daily_rollups = (
+        sa.Table(name, meta, autoload_with=conn) for name in ('quiz_results', 'student_stats', 'daily_rollups'))
+
+    per_student = quiz_results.c.student_id == student_stats.c.student_id
+    conn.execute(student_stats.update().values(
+        quiz_score_total=sa.select(sa.func.coalesce(sa.func.sum(quiz_results.c.score), 0))
+        .where(per_student).scalar_subquery()))
+
+    day = sa.func.date(quiz_results.c.taken_at)
+    totals = conn.execute(sa.select(quiz_results.c.student_id, day, sa.func.sum(quiz_results.c.score))
+                          .group_by(quiz_results.c.student_id, day)).all()
+    for sid, d, total in totals:
+        if sid is None or d is None:
+            continue
+        conn.execute(daily_rollups.update()
+                     .where(daily_rollups.c.student_id == sid, daily_rollups.c.day == str(d))
+                     .values(quiz_score_total=total or 0))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('student_stats', schema=None) as batch_op:
+        batch_op.alter_column('quiz_score_total', existing_type=sa.Float(), type_=sa.Integer(),
+                              existing_nullable=True)
+    with op.batch_alter_table('daily_rollups', schema=None) as batch_op:
+        batch_op.alter_column('quiz_score_total', existing_type=sa.Float(), type_=sa.Integer(),
+                              existing_nullable=False)
@@ -0,0 +1,54 @@
+"""unique active job key
+
+At most one queued/running generation job per key, so jobs.enqueue can
+insert with ON CONFLICT instead of check-then-insert. Extra active jobs
+left by earlier races are marked failed first.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 03:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVE = ('queued', 'running')
+
+
+def _retire_duplicates():
+    if context.is_offline_mode():
+        return
+    conn = op.get_bind()
+    jobs = sa.Table('generation_jobs', sa.MetaData(), autoload_with=conn)
+    active = jobs.c.status.in_(ACTIVE)
+    keys = conn.execute(sa.select(jobs.c.key).where(active).group_by(jobs.c.key)
+                        .having(sa.func.count() > 1)).scalars().all()
+    for key in keys:
+        ids = conn.execute(sa.select(jobs.c.id).where(jobs.c.key == key, active)
+                           .order_by(jobs.c.id)).scalars().all()
+        conn.execute(jobs.update().where(jobs.c.id.in_(ids[1:]))
+                     .values(status='failed', error=f'duplicate of job {ids[0]}'))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _retire_duplicates()
+    where = sa.column('status').in_(ACTIVE)
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.create_index('uq_generation_jobs_active_key', ['key'], unique=True,
+                              sqlite_where=where, postgresql_where=where)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('generation_jobs', schema=None) as batch_op:
+        batch_op.drop_index('uq_generation_jobs_active_key')
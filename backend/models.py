@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -21,6 +21,10 @@ class Student(Base):
     streak_freezes = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_students_role_total_xp", "role", "total_xp"),  # leaderboard
+    )
+
     progress = relationship("TopicProgress", back_populates="student")
     quiz_results = relationship("QuizResult", back_populates="student")
     badges = relationship("StudentBadge", back_populates="student")
@@ -45,6 +49,10 @@ class Topic(Base):
     fun_fact = Column(Text, default="")
     real_world_example = Column(Text, default="")
 
+    __table_args__ = (
+        Index("ix_topics_path_id_order_num", "path_id", "order_num"),
+    )
+
 
 class TopicProgress(Base):
     __tablename__ = "topic_progress"
@@ -56,6 +64,10 @@ class TopicProgress(Base):
     quiz_attempts = Column(Integer, default=0)
     completed_at = Column(DateTime, nullable=True)
 
+    __table_args__ = (
+        UniqueConstraint("student_id", "topic_id", name="uq_topic_progress_student_topic"),
+    )
+
     student = relationship("Student", back_populates="progress")
     topic = relationship("Topic")
 
@@ -71,6 +83,10 @@ class QuizResult(Base):
     xp_earned = Column(Integer, default=0)
     taken_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_quiz_results_student_id_taken_at", "student_id", "taken_at"),
+    )
+
     student = relationship("Student", back_populates="quiz_results")
     topic = relationship("Topic")
 
@@ -91,10 +107,48 @@ class StudentBadge(Base):
     badge_id = Column(Integer, ForeignKey("badges.id"))
     earned_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        UniqueConstraint("student_id", "badge_id", name="uq_student_badges_student_badge"),
+    )
+
     student = relationship("Student", back_populates="badges")
     badge = relationship("Badge")
 
 
+class StudentStats(Base):
+    """Running per-student counters maintained by the badge engine."""
+    __tablename__ = "student_stats"
+    student_id = Column(Integer, ForeignKey("students.id"), primary_key=True)
+    perfect_quizzes = Column(Integer, default=0)
+    topics_started = Column(Integer, default=0)
+    topics_completed = Column(Integer, default=0)
+    chat_messages = Column(Integer, default=0)  # user messages only
+    challenges_completed = Column(Integer, default=0)
+    quizzes_taken = Column(Integer, default=0)
+    quiz_score_total = Column(Float, default=0)  # sum of scores, for the average
+
+
+class DailyRollup(Base):
+    """Per-student activity for one UTC day, bumped by the badge engine as events happen."""
+    __tablename__ = "daily_rollups"
+    student_id = Column(Integer, ForeignKey("students.id"), primary_key=True)
+    day = Column(String, primary_key=True)  # YYYY-MM-DD
+    xp = Column(Integer, default=0, nullable=False)
+    quizzes = Column(Integer, default=0, nullable=False)
+    quiz_score_total = Column(Float, default=0, nullable=False)
+    chats = Column(Integer, default=0, nullable=False)
+    challenges = Column(Integer, default=0, nullable=False)
+
+
+class ChatSummary(Base):
+    """Rolling summary of a student's tutor chat, up to and including `last_message_id`."""
+    __tablename__ = "chat_summaries"
+    student_id = Column(Integer, ForeignKey("students.id"), primary_key=True)
+    summary = Column(Text, default="", nullable=False)
+    last_message_id = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
     id = Column(Integer, primary_key=True, index=True)
@@ -103,6 +157,10 @@ class ChatMessage(Base):
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_chat_messages_student_id_id", "student_id", "id"),
+    )
+
     student = relationship("Student", back_populates="chat_messages")
 
 
@@ -117,13 +175,17 @@ class DailyChallenge(Base):
     response = Column(Text, default="")
     xp_earned = Column(Integer, default=0)
 
+    __table_args__ = (
+        UniqueConstraint("student_id", "challenge_date", name="uq_daily_challenges_student_date"),
+    )
+
     student = relationship("Student", back_populates="daily_challenges")
 
 
 class FlashcardDeck(Base):
     __tablename__ = "flashcard_decks"
     id = Column(Integer, primary_key=True, index=True)
-    path_id = Column(String, nullable=False)
+    path_id = Column(String, nullable=False, index=True)
     title = Column(String, nullable=False)
     description = Column(String, default="")
 
@@ -137,6 +199,10 @@ class FlashcardProgress(Base):
     known = Column(Boolean, default=False)
     reviewed_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        UniqueConstraint("student_id", "deck_id", "card_index", name="uq_flashcard_progress_student_deck_card"),
+    )
+
     student = relationship("Student", back_populates="flashcard_progress")
     deck = relationship("FlashcardDeck")
 
@@ -149,13 +215,18 @@ class XPLog(Base):
     reason = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_xp_log_student_id_created_at", "student_id", "created_at"),
+        Index("ix_xp_log_created_at", "created_at"),  # leaderboard periods
+    )
+
     student = relationship("Student", back_populates="xp_log")
 
 
 class Concept(Base):
     __tablename__ = "concepts"
     id = Column(Integer, primary_key=True, index=True)
-    path_id = Column(String, nullable=False)
+    path_id = Column(String, nullable=False, index=True)
     title = Column(String, nullable=False)
     simple_explanation = Column(Text, default="")
     technical_explanation = Column(Text, default="")
@@ -168,7 +239,7 @@ class Concept(Base):
 class CachedQuizQuestion(Base):
     __tablename__ = "cached_quiz_questions"
     id = Column(Integer, primary_key=True, index=True)
-    topic_id = Column(Integer, ForeignKey("topics.id"))
+    topic_id = Column(Integer, ForeignKey("topics.id"), index=True)
     question = Column(Text, nullable=False)
     q_type = Column(String, default="mcq")  # mcq or true_false
     options = Column(Text, default="[]")    # JSON array of option strings
@@ -188,3 +259,49 @@ class CachedFlashcard(Base):
     example = Column(Text, default="")
     mnemonic = Column(Text, default="")
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_cached_flashcards_path_id_topic_name", "path_id", "topic_name"),
+    )
+
+
+class GenerationLease(Base):
+    """Cross-worker lock so only one process generates a given cache entry at a time."""
+    __tablename__ = "generation_leases"
+    key = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class GenerationJob(Base):
+    """Queued AI generation work, drained by the worker pool in jobs.py."""
+    __tablename__ = "generation_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # topic, quiz, flashcards
+    key = Column(String, nullable=False, index=True)  # single-flight key, dedupes active jobs
+    params = Column(Text, default="{}")  # JSON
+    status = Column(String, default="queued")  # queued, running, done, failed
+    progress = Column(Float, default=0)
+    result = Column(Text, default="")  # JSON, set when done
+    error = Column(Text, default="")
+    attempts = Column(Integer, default=0)
+    owner = Column(String, default="")
+    created_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_generation_jobs_status_id", "status", "id"),  # worker claim scan
+        # One active job per key; jobs.enqueue inserts against it with ON CONFLICT
+        Index("uq_generation_jobs_active_key", "key", unique=True,
+              sqlite_where=status.in_(("queued", "running")),
+              postgresql_where=status.in_(("queued", "running"))),
+    )
+
+
+class SeedState(Base):
+    """Fingerprint of the seed data last applied by seed_data.py."""
+    __tablename__ = "seed_state"
+    name = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,172 @@
+"""
+profiling.py — On-demand sampling profiler for single requests.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` (or
+`?profile=<PROFILE_TOKEN>`), or at random with probability
+PROFILE_SAMPLE_RATE for continuous low-rate profiling. While it runs, a
+background thread snapshots the Python stacks every PROFILE_INTERVAL_MS
+and keeps those belonging to the request: on the event-loop thread, stacks
+running through this request's middleware frame; on threadpool threads,
+stacks inside the route's endpoint (so concurrent calls to the same sync
+route share samples).
+
+Each profile is written to PROFILE_DIR as collapsed stacks
+(`frame;frame;frame count`), ready for flamegraph.pl or speedscope; the
+newest PROFILE_MAX_FILES are kept. Explicitly requested profiles also get
+an `X-Profile` response header with the sample count, file name and the
+hottest functions. Sampling stops when the response starts, so the time
+spent streaming a body isn't included.
+"""
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import parse_qs
+
+TOKEN = os.getenv("PROFILE_TOKEN", "")          # empty: explicit profiling disabled
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+MAX_CONCURRENT = 4         # profiles running at once; more requests just aren't profiled
+MAX_DEPTH = 128
+TOP_FUNCTIONS = 3
+
+_running = 0
+_lock = threading.Lock()
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """Collects collapsed stacks for one request until `stop()`."""
+
+    def __init__(self, scope: dict, marker, loop_thread: int):
+        super().__init__(daemon=True, name="profiler")
+        self.scope, self.marker, self.loop_thread = scope, marker, loop_thread
+        self.stacks = Counter()
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(INTERVAL):
+            self.sample()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def sample(self):
+        endpoint = getattr(self.scope.get("route"), "endpoint", None)
+        endpoint_code = getattr(endpoint, "__code__", None)
+        me = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            stack, ours = [], False
+            while frame is not None and len(stack) < MAX_DEPTH:
+                if thread_id == self.loop_thread:
+                    ours = ours or frame is self.marker
+                else:
+                    ours = ours or frame.f_code is endpoint_code
+                stack.append(frame)
+                frame = frame.f_back
+            if ours:
+                self.stacks[";".join(_label(f) for f in reversed(stack))] += 1
+
+    def hottest(self, k: int = TOP_FUNCTIONS) -> list:
+        """[(function, share of samples)] by self time (the innermost frame)."""
+        leaves = Counter()
+        for stack, n in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += n
+        total = sum(leaves.values()) or 1
+        return [(name, n / total) for name, n in leaves.most_common(k)]
+
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+
+
+def write(sampler: Sampler, scope: dict) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    route = getattr(scope.get("route"), "path", None) or scope.get("path", "")
+    path = PROFILE_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(route)}-{random.randrange(16 ** 6):06x}.collapsed"
+    path.write_text("".join(f"{stack} {n}\n" for stack, n in sampler.stacks.most_common()))
+    old = sorted(PROFILE_DIR.glob("*.collapsed"), key=lambda p: p.stat().st_mtime)
+    for stale in old[:-MAX_FILES] if MAX_FILES else []:
+        stale.unlink(missing_ok=True)
+    return path
+
+
+def summary(sampler: Sampler, path: Path) -> str:
+    top = ", ".join(f"{name} {share:.0%}" for name, share in sampler.hottest())
+    text = (f"{sum(sampler.stacks.values())} samples in {sampler.elapsed * 1000:.0f} ms "
+            f"@ {INTERVAL * 1000:g} ms; file={path.name}; top: {top or 'none'}")
+    return text.encode("ascii", "replace").decode()
+
+
+def _requested(scope: dict) -> bool:
+    if not TOKEN:
+        return False
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile" and value.decode("latin-1") == TOKEN:
+            return True
+    return TOKEN in parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile", ())
+
+
+class ProfilingMiddleware:
+    """ASGI middleware running selected requests under the sampler."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _running
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        requested = _requested(scope)
+        if not requested and not (SAMPLE_RATE and random.random() < SAMPLE_RATE):
+            return await self.app(scope, receive, send)
+        with _lock:
+            full = _running >= MAX_CONCURRENT
+            if not full:
+                _running += 1
+        if full:
+            # Never await while holding _lock: the next sampled request would block the loop on it
+            return await self.app(scope, receive, send)
+
+        sampler = Sampler(scope, sys._getframe(), threading.get_ident())
+        finished = False
+
+        def finish():
+            nonlocal finished
+            if finished:
+                return None
+            finished = True
+            sampler.stop()
+            return write(sampler, scope)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                path = finish()
+                if requested and path is not None:
+                    message = dict(message, headers=list(message.get("headers", [])) +
+                                   [(b"x-profile", summary(sampler, path).encode())])
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+            with _lock:
+                _running -= 1
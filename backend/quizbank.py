@@ -0,0 +1,167 @@
+"""
+quizbank.py — Draw quizzes from the cached question pools.
+
+Each topic's pool is loaded once into memory with options already parsed
+and questions grouped by difficulty. A quiz is a difficulty-stratified
+sample: every level gets a share proportional to its size in the pool.
+Questions a student was served recently for the same topic are skipped
+while enough fresh ones remain.
+
+Pools are held in an LRU of QUIZ_POOL_CACHE_TOPICS topics and reloaded
+after QUIZ_POOL_TTL_SECONDS, or as soon as generation in this process
+appends to them. Pools below POOL_TARGET are never cached, since they are
+about to grow; `pool_size` counts those in SQL rather than loading them.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from sqlalchemy import func
+
+from database import SessionLocal
+from models import CachedQuizQuestion
+
+POOL_TARGET = 40      # questions a topic needs before it is served from the pool
+QUIZ_LENGTH = 15
+DIFFICULTIES = ("easy", "medium", "hard")
+
+CACHE_TOPICS = int(os.getenv("QUIZ_POOL_CACHE_TOPICS", "128"))
+TTL_SECONDS = float(os.getenv("QUIZ_POOL_TTL_SECONDS", "600"))
+RECENT_PER_STUDENT = int(os.getenv("QUIZ_RECENT_QUESTIONS", "30"))  # per student and topic
+RECENT_MAX_KEYS = 10000
+
+_pools = OrderedDict()     # topic_id -> (expires, Pool)
+_recent = OrderedDict()    # (student_id, topic_id) -> deque of question ids
+_lock = threading.Lock()
+hits = misses = 0          # pool lookups served from memory / loaded from the database
+
+
+class Pool:
+    """A topic's questions as response-ready dicts, by difficulty."""
+
+    def __init__(self, rows):
+        self.by_difficulty = {d: [] for d in DIFFICULTIES}
+        for row in rows:
+            question = {
+                "question": row.question, "type": row.q_type, "options": json.loads(row.options or "[]"),
+                "correct": row.correct, "explanation": row.explanation, "difficulty": row.difficulty,
+            }
+            self.by_difficulty.setdefault(_level(row.difficulty), []).append((row.id, question))
+        self.size = sum(len(qs) for qs in self.by_difficulty.values())
+
+
+def _level(difficulty: str) -> str:
+    return difficulty if difficulty in DIFFICULTIES else "medium"
+
+
+def _load(topic_id: int) -> Pool:
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            CachedQuizQuestion.id, CachedQuizQuestion.question, CachedQuizQuestion.q_type,
+            CachedQuizQuestion.options, CachedQuizQuestion.correct, CachedQuizQuestion.explanation,
+            CachedQuizQuestion.difficulty,
+        ).filter(CachedQuizQuestion.topic_id == topic_id).all()
+    finally:
+        db.close()
+    return Pool(rows)
+
+
+def pool(topic_id: int) -> Pool:
+    global hits, misses
+    with _lock:
+        cached = _pools.get(topic_id)
+        if cached and cached[0] > time.monotonic():
+            _pools.move_to_end(topic_id)
+            hits += 1
+            return cached[1]
+        misses += 1
+    loaded = _load(topic_id)
+    if loaded.size >= POOL_TARGET:
+        with _lock:
+            _pools[topic_id] = (time.monotonic() + TTL_SECONDS, loaded)
+            _pools.move_to_end(topic_id)
+            while len(_pools) > CACHE_TOPICS:
+                _pools.popitem(last=False)
+    return loaded
+
+
+def pool_size(topic_id: int) -> int:
+    """Questions in the topic's pool: from memory when cached, else a COUNT (no rows loaded)."""
+    with _lock:
+        cached = _pools.get(topic_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1].size
+    db = SessionLocal()
+    try:
+        return db.query(func.count(CachedQuizQuestion.id)).filter(CachedQuizQuestion.topic_id == topic_id).scalar()
+    finally:
+        db.close()
+
+
+def invalidate(topic_id: int):
+    with _lock:
+        _pools.pop(topic_id, None)
+
+
+# ────────────────────────── Sampling ──────────────────────────
+
+def _quotas(sizes: dict, k: int) -> dict:
+    """Split `k` across strata in proportion to their sizes (largest remainder), capped by size."""
+    total = sum(sizes.values())
+    if total <= k:
+        return dict(sizes)
+    exact = {d: k * n / total for d, n in sizes.items()}
+    quotas = {d: int(x) for d, x in exact.items()}
+    for d in sorted(exact, key=lambda d: exact[d] - quotas[d], reverse=True)[:k - sum(quotas.values())]:
+        quotas[d] += 1
+    return quotas
+
+
+def stratified(by_difficulty: dict, k: int, avoid=frozenset()) -> list:
+    """Sample `k` items from {difficulty: [(id, question)]}, proportionally per difficulty.
+
+    Ids in `avoid` are only used once a stratum runs out of others. Returns
+    [(id, question)] ordered easy → hard.
+    """
+    quotas = _quotas({d: len(items) for d, items in by_difficulty.items()}, k)
+    picked = []
+    for d, items in by_difficulty.items():
+        fresh = [item for item in items if item[0] not in avoid]
+        stale = [item for item in items if item[0] in avoid]
+        want = quotas.get(d, 0)
+        chosen = random.sample(fresh, min(want, len(fresh)))
+        if len(chosen) < want:
+            chosen += random.sample(stale, want - len(chosen))
+        picked.extend(chosen)
+    order = {d: i for i, d in enumerate(DIFFICULTIES)}
+    picked.sort(key=lambda item: order.get(_level(item[1].get("difficulty")), 1))
+    return picked
+
+
+def sample_questions(questions: list, k: int = QUIZ_LENGTH) -> list:
+    """Stratified sample of plain question dicts (e.g. a pool that was just generated)."""
+    by_difficulty = {}
+    for i, q in enumerate(questions):
+        by_difficulty.setdefault(_level(q.get("difficulty", "medium")), []).append((i, q))
+    return [q for _, q in stratified(by_difficulty, k)]
+
+
+def draw(topic_id: int, student_id: int = None, k: int = QUIZ_LENGTH):
+    """A quiz for `student_id` from the topic's pool. Returns (questions, pool size)."""
+    p = pool(topic_id)
+    key = (student_id, topic_id)
+    with _lock:
+        seen = frozenset(_recent.get(key, ()))
+    picked = stratified(p.by_difficulty, k, avoid=seen)
+    if student_id is not None:
+        with _lock:
+            recent = _recent.setdefault(key, deque(maxlen=RECENT_PER_STUDENT))
+            recent.extend(qid for qid, _ in picked)
+            _recent.move_to_end(key)
+            while len(_recent) > RECENT_MAX_KEYS:
+                _recent.popitem(last=False)
+    return [q for _, q in picked], p.size
@@ -1,222 +1,237 @@
 """
 seed_content.py — Pre-generates rich content for all topics at deploy time.
 Runs as part of Railway build: pip install ... && python seed_data.py && python seed_content.py
-"""
-import os, json, time, sys
 
-# ── DB setup ──
-from database import SessionLocal, engine, Base
+Every topic in every path gets three items: a lesson (all three levels), a
+quiz pool and a flashcard deck. Items run concurrently through the same
+generation code the API uses, with LLM requests paced by a token bucket.
+Finished items are written to a checkpoint file, so a crashed build picks
+up where it stopped.
+
+    python seed_content.py                                # every path
+    python seed_content.py --paths gaming developer --concurrency 8 --rpm 120
+    python seed_content.py --stub --stub-latency 0.2      # offline benchmark on a scratch DB
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import generation
+import llm
+import migrate
+import quizbank
+from database import SessionLocal, DATABASE_URL, make_engine
 from models import *
 
-Base.metadata.create_all(bind=engine)
-db = SessionLocal()
+KINDS = ("lesson", "quiz", "flashcards")
+QUIZ_TARGET = quizbank.POOL_TARGET   # same thresholds the API treats as a cache hit
+FLASHCARD_TARGET = 20
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY", "").strip()
 
-if not GROQ_API_KEY:
-    print("⚠️  No GROQ_API_KEY — skipping content generation")
-    db.close()
-    sys.exit(0)
+def parse_args():
+    p = argparse.ArgumentParser(description="Pre-generate lessons, quizzes and flashcards.")
+    p.add_argument("--paths", nargs="*", help="path_ids to process (default: every path in Topic)")
+    p.add_argument("--concurrency", type=int, default=int(os.getenv("SEED_CONCURRENCY", "6")),
+                   help="items generated at once")
+    p.add_argument("--rpm", type=float, default=float(os.getenv("SEED_RPM", "30")),
+                   help="LLM requests per minute (token bucket)")
+    p.add_argument("--burst", type=int, default=None, help="token bucket size (default rpm/6)")
+    p.add_argument("--checkpoint", default=os.getenv("SEED_CHECKPOINT", ".seed_checkpoint.json"))
+    p.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    p.add_argument("--stub", action="store_true",
+                   help="use the offline stub LLM against a scratch copy of the database")
+    p.add_argument("--stub-latency", type=float, default=0.5, help="seconds per stub LLM call")
+    return p.parse_args()
 
-try:
-    from groq import Groq
-    client = Groq(api_key=GROQ_API_KEY)
-    print("✅ Groq SDK ready")
-except Exception as e:
-    print(f"❌ Could not load Groq SDK: {e}")
-    db.close()
-    sys.exit(0)
 
+# ────────────────────────── Checkpoint ──────────────────────────
 
-def groq_call(prompt: str, max_tokens: int = 4000) -> str | None:
-    try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=0.7,
-        )
-        return resp.choices[0].message.content
-    except Exception as e:
-        print(f"    ⚠️  Groq error: {e}")
-        return None
-
-
-def parse_json(text: str):
-    if not text:
-        return None
-    try:
-        t = text.strip()
-        if "```" in t:
-            parts = t.split("```")
-            t = parts[1] if len(parts) > 1 else t
-            if t.startswith("json"):
-                t = t[4:]
-            t = t.rsplit("```", 1)[0]
-        return json.loads(t.strip())
-    except Exception:
-        return None
-
-
-# ══════════════════════════════════════════════════════
-#  GAMING TOPICS — full lesson + quiz + flashcards
-# ══════════════════════════════════════════════════════
-
-GAMING_CONTEXT = """Student: 13-year-old who LOVES gaming (Minecraft, PUBG, FIFA, GTA, Roblox, Valorant, Free Fire).
-Style: Energetic, fun, specific. Use real game names, mechanics, and characters in every explanation.
-Never generic. Every sentence should make a gamer say 'Oh that's like in [game]!'"""
-
-
-def generate_topic_content(topic_title: str) -> dict | None:
-    prompt = f"""{GAMING_CONTEXT}
-
-Write comprehensive lesson content about "{topic_title}".
-
-Return ONLY valid JSON with exactly these keys:
-{{
-  "simple": "8-10 paragraphs. Use ## section headers:\\n## Let's Break It Down Simply\\n## The Gaming Connection\\n## Real Games You Already Know\\n## How It Works (No Jargon)\\n## Why This Is Epic\\n## Quick Recap\\n(Last section: bullet points using - prefix)",
-  "normal": "11-13 paragraphs. Use ## section headers:\\n## Introduction\\n## What Is It Really?\\n## How It Works In Games\\n## Real Games Using This RIGHT NOW\\n## The Secret Sauce (Core Mechanism)\\n## Why This Is Changing Gaming Forever\\n## Try This Challenge\\n(Be SPECIFIC: name actual games, mechanics, characters)",
-  "technical": "13-15 paragraphs. Use ## section headers:\\n## Technical Foundation\\n## Core Algorithms\\n## Data Structures & Complexity\\n## Real Game Engine Implementation\\n## Performance Considerations\\n## State of the Art\\n## Research Frontiers & Open Problems",
-  "fun_fact": "One mind-blowing fact about this topic in gaming context (2 sentences).",
-  "real_world": "A specific detailed real game example — name the game, describe exactly how it uses this concept (3-4 sentences)."
-}}"""
-    text = groq_call(prompt, max_tokens=5000)
-    return parse_json(text)
-
-
-def generate_quiz_questions(topic_title: str) -> list | None:
-    prompt = f"""{GAMING_CONTEXT}
-
-Generate exactly 50 quiz questions about "{topic_title}".
-
-Distribution: 15 easy, 20 medium, 15 hard.
-Format: 40 MCQ (4 options each) + 10 True/False.
-
-Rules:
-- Every question must reference a specific game or gaming scenario
-- MCQ options must all be plausible (no obvious wrong answers)
-- Explanations must be 2-3 sentences with gaming context
-- Hard questions must test analysis, not just recall
-
-Return ONLY a valid JSON array. Each object:
-{{"question":"engaging game-themed question text","type":"mcq","options":["Option A","Option B","Option C","Option D"],"correct":"exact text of correct option","explanation":"2-3 sentence explanation with gaming example","difficulty":"easy"}}
-
-For true_false questions:
-{{"question":"True or False: statement","type":"true_false","options":["True","False"],"correct":"True","explanation":"explanation","difficulty":"easy"}}"""
-    text = groq_call(prompt, max_tokens=8000)
-    result = parse_json(text)
-    return result if isinstance(result, list) else None
-
-
-def generate_flashcards(topic_title: str) -> list | None:
-    prompt = f"""{GAMING_CONTEXT}
-
-Generate exactly 25 comprehensive flashcards about "{topic_title}".
-
-Each card must:
-- Test real understanding, not just memorization
-- Include a specific gaming example from a named game
-- Have a memorable mnemonic or analogy where helpful
-- Cover diverse aspects: definitions, mechanisms, applications, comparisons, history
-
-Return ONLY a valid JSON array. Each object:
-{{"front":"concise question or term (max 15 words)","back":"rich explanation (3-4 sentences that truly teach the concept)","example":"specific example from Minecraft/PUBG/FIFA/GTA/Roblox naming exact mechanics (2 sentences)","mnemonic":"memory trick, acronym, or vivid analogy (1-2 sentences, or empty string)"}}"""
-    text = groq_call(prompt, max_tokens=5000)
-    result = parse_json(text)
-    return result if isinstance(result, list) else None
-
-
-# ── Process all gaming topics ──
-topics = db.query(Topic).filter(Topic.path_id == "gaming").order_by(Topic.order_num).all()
-print(f"\n🎮 Processing {len(topics)} gaming topics...\n")
-
-for idx, topic in enumerate(topics, 1):
-    print(f"[{idx}/{len(topics)}] {topic.title}")
-
-    # 1. Lesson content
-    if not topic.content_normal:
-        print("    → Generating lesson content...")
-        data = generate_topic_content(topic.title)
-        if data:
-            topic.content_simple   = data.get("simple", "")
-            topic.content_normal   = data.get("normal", "")
-            topic.content_technical = data.get("technical", "")
-            if not topic.fun_fact:
-                topic.fun_fact = data.get("fun_fact", "")
-            if not topic.real_world_example:
-                topic.real_world_example = data.get("real_world", "")
-            db.commit()
-            print(f"    ✓ Content: {len(topic.content_normal)} chars")
-        else:
-            print("    ✗ Content generation failed")
-        time.sleep(1.5)
-    else:
-        print(f"    → Content exists ({len(topic.content_normal)} chars)")
-
-    # 2. Quiz questions
-    existing_q = db.query(CachedQuizQuestion).filter(CachedQuizQuestion.topic_id == topic.id).count()
-    if existing_q < 40:
-        print("    → Generating 50 quiz questions...")
-        questions = generate_quiz_questions(topic.title)
-        if questions:
-            for q in questions[:50]:
-                db.add(CachedQuizQuestion(
-                    topic_id=topic.id,
-                    question=q.get("question", ""),
-                    q_type=q.get("type", "mcq"),
-                    options=json.dumps(q.get("options", [])),
-                    correct=q.get("correct", ""),
-                    explanation=q.get("explanation", ""),
-                    difficulty=q.get("difficulty", "medium"),
-                ))
-            db.commit()
-            print(f"    ✓ Quiz: {min(len(questions), 50)} questions")
-        else:
-            print("    ✗ Quiz generation failed")
-        time.sleep(1.5)
-    else:
-        print(f"    → Quiz exists ({existing_q} questions)")
-
-    # 3. Flashcards
-    existing_fc = db.query(CachedFlashcard).filter(
-        CachedFlashcard.topic_name == topic.title,
-        CachedFlashcard.path_id == "gaming"
-    ).count()
-    if existing_fc < 20:
-        print("    → Generating 25 flashcards...")
-        cards = generate_flashcards(topic.title)
-        if cards:
-            for c in cards[:25]:
-                db.add(CachedFlashcard(
-                    topic_name=topic.title,
-                    path_id="gaming",
-                    front=c.get("front", ""),
-                    back=c.get("back", ""),
-                    example=c.get("example", ""),
-                    mnemonic=c.get("mnemonic", ""),
-                ))
-            db.commit()
-            print(f"    ✓ Flashcards: {min(len(cards), 25)} cards")
-        else:
-            print("    ✗ Flashcard generation failed")
-        time.sleep(1.5)
-    else:
-        print(f"    → Flashcards exist ({existing_fc} cards)")
+class Checkpoint:
+    """Set of finished item keys, rewritten atomically after every item."""
 
-    print()
+    def __init__(self, path: str, fresh: bool = False):
+        self.path = path
+        self.done = set()
+        if not fresh and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.done = set(json.load(f).get("done", []))
+            except (OSError, ValueError):
+                print(f"⚠️  Unreadable checkpoint {path} — starting over")
 
-db.close()
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
 
-# ── Summary ──
-db2 = SessionLocal()
-total_content  = db2.query(Topic).filter(Topic.path_id == "gaming", Topic.content_normal != "").count()
-total_quiz     = db2.query(CachedQuizQuestion).join(Topic, CachedQuizQuestion.topic_id == Topic.id).filter(Topic.path_id == "gaming").count()
-total_cards    = db2.query(CachedFlashcard).filter(CachedFlashcard.path_id == "gaming").count()
-db2.close()
+    def mark(self, key: str):
+        self.done.add(key)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"done": sorted(self.done), "updated": time.time()}, f)
+        os.replace(tmp, self.path)
 
-print("=" * 50)
-print(f"✅ DONE!")
-print(f"   Topics with content : {total_content}/{len(topics)}")
-print(f"   Total quiz questions: {total_quiz}")
-print(f"   Total flashcards    : {total_cards}")
-print("=" * 50)
+
+# ────────────────────────── Items ──────────────────────────
+
+def item_key(kind: str, topic: Topic) -> str:
+    return f"{kind}:{topic.path_id}:{topic.id}"
+
+
+def cached_count(kind: str, topic: Topic) -> int:
+    """How much of an item is already in the database (lesson: 1 if all levels exist)."""
+    db = SessionLocal()
+    try:
+        if kind == "lesson":
+            t = db.get(Topic, topic.id)
+            return int(bool(t.content_simple and t.content_normal and t.content_technical))
+        if kind == "quiz":
+            return db.query(CachedQuizQuestion).filter(CachedQuizQuestion.topic_id == topic.id).count()
+        return db.query(CachedFlashcard).filter(
+            CachedFlashcard.topic_name == topic.title, CachedFlashcard.path_id == topic.path_id
+        ).count()
+    finally:
+        db.close()
+
+
+def satisfied(kind: str, count: int) -> bool:
+    return count >= {"lesson": 1, "quiz": QUIZ_TARGET, "flashcards": FLASHCARD_TARGET}[kind]
+
+
+async def generate(kind: str, topic: Topic, known: int) -> int:
+    """Run one item through the shared generation code. Returns a row count for the log line (0 on failure)."""
+    if kind == "lesson":
+        return int(await generation.topic_content(topic.id, topic.path_id, wait_all=True))
+    if kind == "quiz":
+        return len(await generation.quiz_pool(topic.id, topic.path_id, known=known))
+    return len(await generation.flashcard_deck(topic.title, topic.path_id, known=known))
+
+
+class Stats:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.latencies = {kind: [] for kind in KINDS}
+        self.ok = self.failed = self.skipped = 0
+
+    def report(self, total: int, provider: llm.Provider):
+        elapsed = time.monotonic() - self.started
+        generated = self.ok + self.failed
+        print("=" * 50)
+        print(f"✅ DONE in {elapsed:.1f}s")
+        print(f"   Items               : {total} ({self.ok} generated, {self.failed} failed, {self.skipped} skipped)")
+        print(f"   Throughput          : {generated / elapsed:.2f} items/s, {provider.calls / elapsed * 60:.1f} LLM calls/min")
+        print(f"   LLM calls           : {provider.calls}")
+        for kind, lat in self.latencies.items():
+            if lat:
+                p95 = sorted(lat)[max(0, int(len(lat) * 0.95) - 1)]
+                print(f"   {kind:<20}: n={len(lat)} p50={statistics.median(lat):.2f}s p95={p95:.2f}s")
+        print("=" * 50)
+
+
+async def process(kind: str, topic: Topic, checkpoint: Checkpoint, stats: Stats, sem: asyncio.Semaphore, label: str):
+    key = item_key(kind, topic)
+    known = cached_count(kind, topic)
+    if satisfied(kind, known):
+        stats.skipped += 1
+        checkpoint.mark(key)
+        return
+    async with sem:
+        t0 = time.monotonic()
+        try:
+            produced = await generate(kind, topic, known)
+        except Exception as e:
+            produced = 0
+            print(f"    ⚠️  {label} {kind}: {e!r}")
+        elapsed = time.monotonic() - t0
+    if produced:
+        stats.ok += 1
+        stats.latencies[kind].append(elapsed)
+        checkpoint.mark(key)
+        print(f"    ✓ {label} {kind} ({produced}) in {elapsed:.1f}s")
+    else:
+        stats.failed += 1
+        print(f"    ✗ {label} {kind} failed")
+
+
+# ────────────────────────── Main ──────────────────────────
+
+def use_scratch_db(latency: float) -> str:
+    """Point SessionLocal at a throwaway SQLite DB so stub output never reaches the real one."""
+    scratch = tempfile.mkdtemp(prefix="seed-stub-")
+    dst = os.path.join(scratch, "ai_learning.db")
+    src = DATABASE_URL.replace("sqlite:///", "", 1) if DATABASE_URL.startswith("sqlite:///") else None
+    if src and os.path.exists(src):
+        # Backup API rather than a file copy so pages still in the WAL come along
+        with sqlite3.connect(src) as live, sqlite3.connect(dst) as copy:
+            live.backup(copy)
+    migrate.upgrade(f"sqlite:///{dst}")   # the live DB is left as it is, even if it's behind
+    scratch_engine = make_engine(f"sqlite:///{dst}")
+    if not src:
+        # Non-SQLite source: only the topic catalog is needed to drive the pipeline
+        with SessionLocal() as live, SessionLocal(bind=scratch_engine) as copy:
+            for t in live.query(Topic).all():
+                copy.merge(t)
+            copy.commit()
+    SessionLocal.configure(bind=scratch_engine)
+    print(f"🧪 Stub LLM ({latency}s/call) on scratch DB {dst}")
+    return scratch
+
+
+async def run(args) -> int:
+    scratch = None
+    checkpoint_path = args.checkpoint
+    if args.stub:
+        scratch = use_scratch_db(args.stub_latency)
+        checkpoint_path = os.path.join(scratch, "checkpoint.json")
+        llm.groq = llm.StubProvider(latency=args.stub_latency)
+    provider = llm.groq if llm.groq.available else llm.gemini
+    if not provider.available:
+        print("⚠️  No GROQ_API_KEY or GEMINI_API_KEY — skipping content generation")
+        return 0
+    provider.limiter = llm.RateLimiter(args.rpm, args.burst)
+
+    db = SessionLocal()
+    try:
+        q = db.query(Topic)
+        if args.paths:
+            q = q.filter(Topic.path_id.in_(args.paths))
+        topics = q.order_by(Topic.path_id, Topic.order_num).all()
+        db.expunge_all()
+    finally:
+        db.close()
+
+    checkpoint = Checkpoint(checkpoint_path, fresh=args.fresh)
+    stats = Stats()
+    sem = asyncio.Semaphore(args.concurrency)
+    items = [(kind, t) for t in topics for kind in KINDS]
+    pending = [(kind, t) for kind, t in items if item_key(kind, t) not in checkpoint]
+    stats.skipped = len(items) - len(pending)
+    paths = sorted({t.path_id for t in topics})
+    print(f"\n📚 {len(topics)} topics across {len(paths)} paths ({', '.join(paths)})")
+    print(f"   {len(pending)} of {len(items)} items to go — concurrency {args.concurrency}, {args.rpm:g} req/min\n")
+
+    await asyncio.gather(*(
+        process(kind, t, checkpoint, stats, sem, f"[{t.path_id} #{t.order_num}] {t.title[:40]}")
+        for kind, t in pending
+    ))
+    stats.report(len(items), provider)
+    await llm.aclose()
+    if scratch:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.stub:
+        migrate.upgrade()
+    sys.exit(asyncio.run(run(args)))
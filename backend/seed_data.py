@@ -1,28 +1,52 @@
-from database import SessionLocal, engine, Base
-from models import *
+"""
+seed_data.py — Bring the catalog (students, topics, badges, concepts, decks) in line with this file.
+
+Runs before every app start, so it never deletes anything: rows are
+matched on their natural keys, missing ones are bulk-inserted and changed
+ones bulk-updated. Student XP, progress and generated content (lesson
+bodies, quiz pools, flashcards) survive a restart; a topic whose title
+changes has its generated lesson and quiz pool reset. A fingerprint of the
+seed data is kept in `seed_state`, so an unchanged seed is a single read.
+
+    python seed_data.py           # sync if the seed changed
+    python seed_data.py --force   # re-check every row anyway
+"""
+import hashlib
+import json
+import sys
 from datetime import datetime
 
+from sqlalchemy import delete, insert, select, update
 
-def seed():
-    Base.metadata.create_all(bind=engine)
-    db = SessionLocal()
+from database import SessionLocal
+from models import *
+import cache
+import migrate
+
+SEED_NAME = "catalog"
 
-    # Clear existing data
-    for table in reversed(Base.metadata.sorted_tables):
-        db.execute(table.delete())
-    db.commit()
+# Natural key and the columns seeding leaves alone on existing rows
+STUDENT_KEY, STUDENT_KEEP = ("name",), ("total_xp", "level")
+TOPIC_KEY = ("path_id", "order_num")
+BADGE_KEY = ("name",)
+CONCEPT_KEY = ("path_id", "title")
+DECK_KEY = ("path_id", "title")
+GENERATED_TOPIC_FIELDS = ("content_simple", "content_normal", "content_technical", "fun_fact", "real_world_example")
 
+
+def catalog() -> dict:
+    """Seed rows per model, as column dicts."""
     # ── Students ──
     students = [
-        Student(name="Aalam", age=13, pin="1313", role="student", path_id="gaming", avatar="🎮", total_xp=0, level="Explorer"),
-        Student(name="Adham", age=17, pin="1717", role="student", path_id="business", avatar="💼", total_xp=0, level="Explorer"),
-        Student(name="Irfan", age=17, pin="1717", role="student", path_id="business", avatar="📊", total_xp=0, level="Explorer"),
-        Student(name="Adnan", age=20, pin="2020", role="student", path_id="developer", avatar="💻", total_xp=0, level="Explorer"),
-        Student(name="Family & Friends", age=0, pin="1111", role="student", path_id="ai_enthusiast", avatar="🤖", total_xp=0, level="Explorer"),
-        Student(name="Uncle", age=0, pin="0000", role="admin", path_id="admin", avatar="👨‍💼", total_xp=0, level="Legend"),
+        dict(name="Aalam", age=13, pin="1313", role="student", path_id="gaming", avatar="🎮", total_xp=0, level="Explorer"),
+        dict(name="Adham", age=17, pin="1717", role="student", path_id="business", avatar="💼", total_xp=0, level="Explorer"),
+        dict(name="Irfan", age=17, pin="1717", role="student", path_id="business", avatar="📊", total_xp=0, level="Explorer"),
+        dict(name="Adnan", age=20, pin="2020", role="student", path_id="developer", avatar="💻", total_xp=0, level="Explorer"),
+        dict(name="Family & Friends", age=0, pin="1111", role="student", path_id="ai_enthusiast", avatar="🤖", total_xp=0, level="Explorer"),
+        dict(name="Uncle", age=0, pin="0000", role="admin", path_id="admin", avatar="👨‍💼", total_xp=0, level="Legend"),
     ]
-    db.add_all(students)
-    db.commit()
+
+    topics = []
 
     # ── Gaming Topics (Aalam) ──
     gaming_topics = [
@@ -49,7 +73,7 @@ def seed():
     ]
 
     for i, (title, desc, diff, rt) in enumerate(gaming_topics):
-        db.add(Topic(path_id="gaming", order_num=i+1, title=title, description=desc, difficulty=diff, read_time=rt))
+        topics.append(dict(path_id="gaming", order_num=i+1, title=title, description=desc, difficulty=diff, read_time=rt))
 
     # ── Business Topics (Adham & Irfan) ──
     business_topics = [
@@ -76,7 +100,7 @@ def seed():
     ]
 
     for i, (title, desc, diff, rt) in enumerate(business_topics):
-        db.add(Topic(path_id="business", order_num=i+1, title=title, description=desc, difficulty=diff, read_time=rt))
+        topics.append(dict(path_id="business", order_num=i+1, title=title, description=desc, difficulty=diff, read_time=rt))
 
     # ── Developer Topics (Adnan) ──
     developer_topics = [
@@ -103,7 +127,7 @@ def seed():
     ]
 
     for i, (title, desc, diff, rt) in enumerate(developer_topics):
-        db.add(Topic(path_id="developer", order_num=i+1, title=title, description=desc, difficulty=diff, read_time=rt))
+        topics.append(dict(path_id="developer", order_num=i+1, title=title, description=desc, difficulty=diff, read_time=rt))
 
     # ── AI Enthusiast Topics (Arshad) ──
     ai_enthusiast_topics = [
@@ -130,9 +154,7 @@ def seed():
     ]
 
     for i, (title, desc, diff, rt) in enumerate(ai_enthusiast_topics):
-        db.add(Topic(path_id="ai_enthusiast", order_num=i+1, title=title, description=desc, difficulty=diff, read_time=rt))
-
-    db.commit()
+        topics.append(dict(path_id="ai_enthusiast", order_num=i+1, title=title, description=desc, difficulty=diff, read_time=rt))
 
     # ── Badges (25 total) ──
     badges_data = [
@@ -164,10 +186,9 @@ def seed():
         ("AI Pioneer", "Arshad's special AI Enthusiast badge", "🤖", "path_specific"),
     ]
 
-    for name, desc, icon, cat in badges_data:
-        db.add(Badge(name=name, description=desc, icon=icon, category=cat))
+    badges = [dict(name=name, description=desc, icon=icon, category=cat) for name, desc, icon, cat in badges_data]
 
-    db.commit()
+    concepts = []
 
     # ── Concepts (20 per path = 60 total) ──
     gaming_concepts = [
@@ -194,7 +215,7 @@ def seed():
     ]
 
     for title, simple, tech, real, fun, diff, rt in gaming_concepts:
-        db.add(Concept(path_id="gaming", title=title, simple_explanation=simple, technical_explanation=tech, real_world_example=real, fun_fact=fun, difficulty=diff, read_time=rt))
+        concepts.append(dict(path_id="gaming", title=title, simple_explanation=simple, technical_explanation=tech, real_world_example=real, fun_fact=fun, difficulty=diff, read_time=rt))
 
     business_concepts = [
         ("Artificial Intelligence", "Computer systems that can do tasks that normally need human intelligence.", "AI encompasses machine learning, deep learning, NLP, computer vision, and expert systems that process data to make decisions.", "Zomato uses AI to predict delivery times and optimize restaurant recommendations.", "AI contributes over $15 trillion to the global economy!", "beginner", 3),
@@ -220,7 +241,7 @@ def seed():
     ]
 
     for title, simple, tech, real, fun, diff, rt in business_concepts:
-        db.add(Concept(path_id="business", title=title, simple_explanation=simple, technical_explanation=tech, real_world_example=real, fun_fact=fun, difficulty=diff, read_time=rt))
+        concepts.append(dict(path_id="business", title=title, simple_explanation=simple, technical_explanation=tech, real_world_example=real, fun_fact=fun, difficulty=diff, read_time=rt))
 
     developer_concepts = [
         ("Supervised Learning", "ML where you train the model with labeled examples — input paired with correct output.", "Minimizes loss function over labeled dataset using gradient descent. Includes classification and regression.", "Gmail's spam filter is supervised learning — trained on millions of labeled spam/not-spam emails.", "ImageNet, a supervised learning benchmark, has 14 million labeled images!", "beginner", 4),
@@ -246,7 +267,7 @@ def seed():
     ]
 
     for title, simple, tech, real, fun, diff, rt in developer_concepts:
-        db.add(Concept(path_id="developer", title=title, simple_explanation=simple, technical_explanation=tech, real_world_example=real, fun_fact=fun, difficulty=diff, read_time=rt))
+        concepts.append(dict(path_id="developer", title=title, simple_explanation=simple, technical_explanation=tech, real_world_example=real, fun_fact=fun, difficulty=diff, read_time=rt))
 
     ai_enthusiast_concepts = [
         ("Artificial Intelligence", "Computer systems designed to perform tasks that normally require human intelligence.", "Encompasses ML, deep learning, NLP, computer vision, robotics, and expert systems that process data to make decisions, recognize patterns, and generate outputs.", "Google Search uses AI to understand what you mean, not just what you type — searching 'best place for pizza near me tonight' returns relevant local results.", "AI is expected to contribute $15.7 trillion to the global economy by 2030!", "beginner", 3),
@@ -272,35 +293,101 @@ def seed():
     ]
 
     for title, simple, tech, real, fun, diff, rt in ai_enthusiast_concepts:
-        db.add(Concept(path_id="ai_enthusiast", title=title, simple_explanation=simple, technical_explanation=tech, real_world_example=real, fun_fact=fun, difficulty=diff, read_time=rt))
-
-    db.commit()
+        concepts.append(dict(path_id="ai_enthusiast", title=title, simple_explanation=simple, technical_explanation=tech, real_world_example=real, fun_fact=fun, difficulty=diff, read_time=rt))
 
     # ── Flashcard Decks ──
     decks = [
-        FlashcardDeck(path_id="gaming", title="Game AI Basics", description="Core concepts of AI in gaming"),
-        FlashcardDeck(path_id="gaming", title="AI Algorithms in Games", description="Pathfinding, behavior trees, and more"),
-        FlashcardDeck(path_id="gaming", title="Famous AI in Games", description="Legendary AI moments in gaming history"),
-        FlashcardDeck(path_id="business", title="AI Business Tools", description="Essential AI tools for business"),
-        FlashcardDeck(path_id="business", title="AI Industry Terms", description="Key AI vocabulary for business"),
-        FlashcardDeck(path_id="business", title="AI Business Cases", description="Real companies using AI successfully"),
-        FlashcardDeck(path_id="developer", title="ML Algorithms", description="Core machine learning algorithms"),
-        FlashcardDeck(path_id="developer", title="AI Frameworks", description="Popular AI development frameworks"),
-        FlashcardDeck(path_id="developer", title="LLM Concepts", description="Large Language Model fundamentals"),
-        FlashcardDeck(path_id="ai_enthusiast", title="AI Fundamentals", description="Core AI concepts every enthusiast must know"),
-        FlashcardDeck(path_id="ai_enthusiast", title="AI Tools & Apps", description="The best AI tools and how to use them"),
-        FlashcardDeck(path_id="ai_enthusiast", title="AI Ethics & Future", description="Safety, ethics, and where AI is headed"),
+        dict(path_id="gaming", title="Game AI Basics", description="Core concepts of AI in gaming"),
+        dict(path_id="gaming", title="AI Algorithms in Games", description="Pathfinding, behavior trees, and more"),
+        dict(path_id="gaming", title="Famous AI in Games", description="Legendary AI moments in gaming history"),
+        dict(path_id="business", title="AI Business Tools", description="Essential AI tools for business"),
+        dict(path_id="business", title="AI Industry Terms", description="Key AI vocabulary for business"),
+        dict(path_id="business", title="AI Business Cases", description="Real companies using AI successfully"),
+        dict(path_id="developer", title="ML Algorithms", description="Core machine learning algorithms"),
+        dict(path_id="developer", title="AI Frameworks", description="Popular AI development frameworks"),
+        dict(path_id="developer", title="LLM Concepts", description="Large Language Model fundamentals"),
+        dict(path_id="ai_enthusiast", title="AI Fundamentals", description="Core AI concepts every enthusiast must know"),
+        dict(path_id="ai_enthusiast", title="AI Tools & Apps", description="The best AI tools and how to use them"),
+        dict(path_id="ai_enthusiast", title="AI Ethics & Future", description="Safety, ethics, and where AI is headed"),
     ]
-    db.add_all(decks)
-    db.commit()
 
-    print("Database seeded successfully!")
-    print(f"  Students: {db.query(Student).count()}")
-    print(f"  Topics: {db.query(Topic).count()}")
-    print(f"  Badges: {db.query(Badge).count()}")
-    print(f"  Concepts: {db.query(Concept).count()}")
-    print(f"  Flashcard Decks: {db.query(FlashcardDeck).count()}")
+    return {Student: students, Topic: topics, Badge: badges, Concept: concepts, FlashcardDeck: decks}
+
+
+def fingerprint(data: dict) -> str:
+    return hashlib.sha256(json.dumps({m.__tablename__: rows for m, rows in data.items()},
+                                     sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def sync(db, model, key: tuple, rows: list, keep: tuple = ()) -> tuple:
+    """Insert rows whose natural key is missing and update rows that differ.
+
+    Columns in `keep` are only written on insert. Rows in the table but not
+    in `rows` are left alone. Returns (inserted, [(id, old row, new row)]).
+    """
+    columns = sorted({c for row in rows for c in row} | set(key))
+    current = {}
+    for row in db.execute(select(model.id, *[getattr(model, c) for c in columns])).mappings():
+        current.setdefault(tuple(row[k] for k in key), row)
+
+    inserts, updates, changed = [], [], []
+    for row in rows:
+        old = current.get(tuple(row[k] for k in key))
+        if old is None:
+            inserts.append(row)
+            continue
+        values = {c: v for c, v in row.items() if c not in keep and c not in key}
+        if any(old[c] != v for c, v in values.items()):
+            updates.append({"id": old["id"], **values})
+            changed.append((old["id"], old, row))
+    if inserts:
+        db.execute(insert(model), inserts)
+    if updates:
+        db.execute(update(model), updates)   # bulk UPDATE by primary key
+    return len(inserts), changed
+
+
+def reset_generated(db, topic_ids: list):
+    """Drop generated lessons and quiz pools of topics that now mean something else."""
+    db.execute(update(Topic).where(Topic.id.in_(topic_ids)).values(dict.fromkeys(GENERATED_TOPIC_FIELDS, "")))
+    db.execute(delete(CachedQuizQuestion).where(CachedQuizQuestion.topic_id.in_(topic_ids)))
+
+
+def seed(force: bool = False):
+    migrate.upgrade()
+    data = catalog()
+    digest = fingerprint(data)
+    db = SessionLocal()
+    try:
+        state = db.get(SeedState, SEED_NAME)
+        if state and state.fingerprint == digest and not force:
+            print("✅ Seed data unchanged — nothing to do")
+            return
+
+        keys = {Student: (STUDENT_KEY, STUDENT_KEEP), Topic: (TOPIC_KEY, ()), Badge: (BADGE_KEY, ()),
+                Concept: (CONCEPT_KEY, ()), FlashcardDeck: (DECK_KEY, ())}
+        touched = False
+        for model, rows in data.items():
+            key, keep = keys[model]
+            inserted, changed = sync(db, model, key, rows, keep)
+            if model is Topic:
+                renamed = [tid for tid, old, new in changed if old["title"] != new["title"]]
+                if renamed:
+                    reset_generated(db, renamed)
+            touched = touched or bool(inserted or changed)
+            print(f"  {model.__tablename__}: {inserted} inserted, {len(changed)} updated")
+
+        if state is None:
+            db.add(SeedState(name=SEED_NAME, fingerprint=digest, applied_at=datetime.utcnow()))
+        else:
+            state.fingerprint, state.applied_at = digest, datetime.utcnow()
+        db.commit()
+        if touched:
+            cache.invalidate()  # catalog responses cached by this process are stale now
+        print("✅ Database seeded")
+    finally:
+        db.close()
 
 
 if __name__ == "__main__":
-    seed()
+    seed(force="--force" in sys.argv[1:])
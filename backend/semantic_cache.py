@@ -0,0 +1,222 @@
+"""
+semantic_cache.py — Answer repeat tutor questions without calling the LLM.
+
+Questions are turned into sparse vectors with the hashing trick (word
+unigrams and bigrams after normalisation, stop words dropped, sublinear
+TF, L2-normalised), so it needs no model and works offline. Each tutor
+persona (path + system prompt, so names in the prompt never leak between
+students) has its own index of past question → answer pairs with an
+inverted index from feature to entries; a lookup only scores entries that
+share a feature with the question.
+
+A question is answered from the cache when its cosine similarity to a
+stored one reaches SEMANTIC_CACHE_THRESHOLD and it reads as a standalone
+question rather than a follow-up. Each index keeps at most
+SEMANTIC_CACHE_MAX_ENTRIES, evicting the least recently used, and entries
+expire after SEMANTIC_CACHE_TTL_SECONDS.
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.88"))
+MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "500"))   # per index
+TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+ENABLED = os.getenv("SEMANTIC_CACHE", "1") == "1"
+
+DIM = 1 << 18
+MIN_TERMS = 2          # fewer content words than this is too vague to match
+MAX_QUESTION_CHARS = 300
+
+STOP_WORDS = frozenset("""
+a an the is are was were be been am do does did can could would should will shall may might must
+i me my you your we our he she they them their of to in on at for with by from about as into
+what whats how why when where which who whom please tell explain describe give show help hey hi hello
+yo ok okay so just really actually like thanks thank also and or but if then than there here
+""".split())
+# A question leaning on earlier turns ("why does it do that?") can't be answered out of context
+FOLLOW_UP_WORDS = frozenset("it its this that these those they them he she his her more again above previous earlier else".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _terms(text: str) -> list:
+    words = []
+    for w in _WORD.findall(text.lower()):
+        if w in STOP_WORDS or (len(w) == 1 and not w.isdigit()):
+            continue   # single letters are mostly contraction tails ("what's" → what, s)
+        if len(w) > 4 and w.endswith("s") and not w.endswith("ss"):
+            w = w[:-1]   # crude plural folding: networks → network
+        words.append(w)
+    return words
+
+
+def is_standalone(question: str) -> bool:
+    """A self-contained question the cache may answer (not a follow-up, not too long or too vague)."""
+    if len(question) > MAX_QUESTION_CHARS:
+        return False
+    if FOLLOW_UP_WORDS.intersection(_WORD.findall(question.lower())):
+        return False
+    return len(_terms(question)) >= MIN_TERMS
+
+
+def _feature(term: str) -> tuple:
+    h = int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+    return h % DIM, 1.0 if (h >> 63) & 1 else -1.0
+
+
+def vectorize(text: str) -> dict:
+    """Sparse L2-normalised hashed vector {feature: weight} of unigrams and bigrams."""
+    words = _terms(text)
+    counts = {}
+    for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        counts[term] = counts.get(term, 0) + 1
+    vec = {}
+    for term, n in counts.items():
+        idx, sign = _feature(term)
+        vec[idx] = vec.get(idx, 0.0) + sign * (1.0 + math.log(n))
+    norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+    return {idx: w / norm for idx, w in vec.items() if w}
+
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(idx, 0.0) for idx, w in a.items())
+
+
+class Entry:
+    __slots__ = ("vector", "question", "answer", "created", "hits")
+
+    def __init__(self, vector: dict, question: str, answer: str):
+        self.vector, self.question, self.answer = vector, question, answer
+        self.created = time.monotonic()
+        self.hits = 0
+
+
+class Index:
+    """Entries for one persona: LRU order plus an inverted index feature → entry ids."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()    # id -> Entry, least recently used first
+        self.postings = {}              # feature -> set of ids
+        self.next_id = 0
+
+    def _remove(self, eid: int):
+        entry = self.entries.pop(eid)
+        for idx in entry.vector:
+            ids = self.postings.get(idx)
+            if ids is not None:
+                ids.discard(eid)
+                if not ids:
+                    del self.postings[idx]
+
+    def add(self, vector: dict, question: str, answer: str) -> int:
+        eid, self.next_id = self.next_id, self.next_id + 1
+        self.entries[eid] = Entry(vector, question, answer)
+        for idx in vector:
+            self.postings.setdefault(idx, set()).add(eid)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+        return eid
+
+    def best(self, vector: dict):
+        """(similarity, id) of the closest live entry, or (0, None)."""
+        now = time.monotonic()
+        candidates = set()
+        for idx in vector:
+            candidates |= self.postings.get(idx, set())
+        best = (0.0, None)
+        for eid in candidates:
+            entry = self.entries[eid]
+            if now - entry.created > TTL_SECONDS:
+                self._remove(eid)
+                continue
+            score = cosine(vector, entry.vector)
+            if score > best[0]:
+                best = (score, eid)
+        return best
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 3) if ordered else 0.0
+
+
+class Stats:
+    def __init__(self):
+        self.lookups = self.hits = self.stores = self.skipped = 0
+        self.latencies_ms = deque(maxlen=1000)   # recent lookup latencies
+        self.llm_ms = deque(maxlen=1000)         # recent LLM answer latencies, for comparison
+
+    def snapshot(self, indexes: dict) -> dict:
+        lat, llm_lat = sorted(self.latencies_ms), sorted(self.llm_ms)
+        return {
+            "enabled": ENABLED, "threshold": THRESHOLD,
+            "lookups": self.lookups, "hits": self.hits, "misses": self.lookups - self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+            "not_standalone": self.skipped, "stores": self.stores,
+            "lookup_ms_p50": _percentile(lat, 0.5), "lookup_ms_p95": _percentile(lat, 0.95),
+            "llm_ms_p50": _percentile(llm_lat, 0.5), "llm_ms_p95": _percentile(llm_lat, 0.95),
+            "indexes": len(indexes), "entries": sum(len(i.entries) for i in indexes.values()),
+        }
+
+
+_indexes = {}
+_lock = threading.Lock()
+stats = Stats()
+
+
+def persona(path_id: str, system_prompt: str) -> str:
+    """Index key: the path plus a digest of the exact prompt the answers were written under."""
+    return f"{path_id}:{hashlib.sha1(system_prompt.encode()).hexdigest()[:12]}"
+
+
+def lookup(key: str, question: str):
+    """A cached answer for `question` under `key`, or None."""
+    if not ENABLED:
+        return None
+    if not is_standalone(question):
+        stats.skipped += 1
+        return None
+    t0 = time.perf_counter()
+    vector = vectorize(question)
+    with _lock:
+        stats.lookups += 1
+        index = _indexes.get(key)
+        answer = None
+        if index is not None:
+            score, eid = index.best(vector)
+            if eid is not None and score >= THRESHOLD:
+                entry = index.entries[eid]
+                entry.hits += 1
+                index.entries.move_to_end(eid)
+                stats.hits += 1
+                answer = entry.answer
+        stats.latencies_ms.append((time.perf_counter() - t0) * 1000)
+    return answer
+
+
+def store(key: str, question: str, answer: str, llm_ms: float = None):
+    """Remember an LLM answer to a standalone question (`llm_ms`: how long the LLM took)."""
+    if llm_ms is not None:
+        stats.llm_ms.append(llm_ms)
+    if not ENABLED or not answer or not is_standalone(question):
+        return
+    vector = vectorize(question)
+    with _lock:
+        index = _indexes.setdefault(key, Index())
+        score, eid = index.best(vector)
+        if eid is not None and score >= THRESHOLD:
+            return   # an equivalent question is already cached
+        index.add(vector, question, answer)
+        stats.stores += 1
+
+
+def snapshot() -> dict:
+    with _lock:
+        return stats.snapshot(_indexes)
@@ -0,0 +1,102 @@
+"""
+singleflight.py — Collapse concurrent cache misses onto one generation.
+
+The first caller for a key starts the generation; anyone else asking for
+the same key while it runs awaits that same task instead of calling the
+LLM again. Across uvicorn workers the leader also holds a row in
+`generation_leases`, and a worker that finds the lease taken polls the
+cache until the holder finishes (or its lease expires).
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import GenerationLease
+
+LEASE_SECONDS = int(os.getenv("GENERATION_LEASE_SECONDS", "180"))
+POLL_INTERVAL = 1.0
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_inflight = {}
+
+
+def make_key(kind: str, subject, path_id: str = "") -> str:
+    return f"{kind}:{path_id}:{subject}"
+
+
+async def do(key: str, generate, recheck):
+    """Return generate()'s result, running it at most once per key at a time.
+
+    `generate` is an async callable that fills the cache and returns the
+    result. `recheck` is a sync callable returning the cached result, or
+    None if it is not there yet; it runs in a worker thread, while another
+    worker holds the lease. The generation runs as its own task, so a
+    caller that disconnects does not cancel it for everyone else.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_lead(key, generate, recheck))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _done(key, t))
+    return await asyncio.shield(task)
+
+
+def _done(key: str, task: asyncio.Task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    if not task.cancelled():
+        task.exception()  # mark retrieved; callers already saw it
+
+
+async def _lead(key: str, generate, recheck):
+    # Lease and cache queries run in a thread so the event loop isn't held by the DB
+    while not await asyncio.to_thread(_acquire, key):
+        await asyncio.sleep(POLL_INTERVAL)
+        cached = await asyncio.to_thread(recheck)
+        if cached is not None:
+            return cached
+    try:
+        # Another worker may have filled the cache between our miss and the lease
+        cached = await asyncio.to_thread(recheck)
+        if cached is not None:
+            return cached
+        return await generate()
+    finally:
+        await asyncio.to_thread(_release, key)
+
+
+def _acquire(key: str) -> bool:
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=LEASE_SECONDS)
+    db = SessionLocal()
+    try:
+        db.add(GenerationLease(key=key, owner=WORKER_ID, expires_at=expires))
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()
+        # Take over a lease whose holder died without releasing it
+        taken = db.query(GenerationLease).filter(
+            GenerationLease.key == key, GenerationLease.expires_at < now
+        ).update({"owner": WORKER_ID, "expires_at": expires}, synchronize_session=False)
+        db.commit()
+        return taken == 1
+    finally:
+        db.close()
+
+
+def _release(key: str):
+    db = SessionLocal()
+    try:
+        db.query(GenerationLease).filter(
+            GenerationLease.key == key, GenerationLease.owner == WORKER_ID
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
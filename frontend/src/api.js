@@ -15,22 +15,84 @@ async function request(url, options = {}) {
     const err = await res.json().catch(() => ({ detail: 'Request failed' }));
     throw new Error(err.detail || 'Request failed');
   }
+  // 202 = content is being generated in the background; poll the job until it finishes
+  if (res.status === 202) {
+    const { job_id } = await res.json();
+    return pollJob(job_id);
+  }
   return res.json();
 }
 
+const JOB_POLL_MS = 1000;
+const JOB_TIMEOUT_MS = 5 * 60 * 1000; // covers retries and provider rate limiting
+
+async function pollJob(jobId) {
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+    const job = await request(`/jobs/${jobId}`);
+    if (job.status === 'done') return job.result;
+    if (job.status === 'failed') throw new Error(job.error || 'Generation failed');
+  }
+  throw new Error('Generation is taking too long — please try again later');
+}
+
+// POST that reads a Server-Sent Events body, calling onDelta for each chunk.
+// Resolves with the payload of the final `done` event; rejects on an `error` event.
+async function streamRequest(url, body, onDelta) {
+  const res = await fetch(`${BASE}${url}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body,
+  });
+  if (!res.ok || !res.body) {
+    const err = await res.json().catch(() => ({ detail: 'Request failed' }));
+    throw new Error(err.detail || 'Request failed');
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === 'error') throw new Error(payload.error || 'Stream failed');
+      if (event === 'done') result = payload;
+      else if (payload.delta) onDelta(payload.delta);
+    }
+  }
+  if (!result) throw new Error('Stream ended early');
+  return result;
+}
+
 const api = {
   login: (name, pin) => request('/login', { method: 'POST', body: JSON.stringify({ name, pin }) }),
   getStudent: (id) => request(`/students/${id}`),
   getAllStudents: () => request('/students'),
   getTopics: (pathId) => request(`/topics/${pathId}`),
-  getTopic: (id) => request(`/topic/${id}`),
+  getTopic: (id, level) => request(`/topic/${id}${level ? `?level=${level}` : ''}`),
   getProgress: (studentId) => request(`/progress/${studentId}`),
   completeTopic: (studentId, topicId) => request('/topics/complete', { method: 'POST', body: JSON.stringify({ student_id: studentId, topic_id: topicId }) }),
   generateQuiz: (topicId, studentId) => request(`/quiz/generate/${topicId}?student_id=${studentId}`),
   submitQuiz: (data) => request('/quiz/submit', { method: 'POST', body: JSON.stringify(data) }),
   quizHistory: (studentId) => request(`/quiz/history/${studentId}`),
   chat: (studentId, message, topic) => request('/chat', { method: 'POST', body: JSON.stringify({ student_id: studentId, message, topic }) }),
-  chatHistory: (studentId) => request(`/chat/history/${studentId}`),
+  chatStream: (studentId, message, topic, onDelta) => streamRequest('/chat/stream', JSON.stringify({ student_id: studentId, message, topic }), onDelta),
+  chatHistory: (studentId, before) => request(`/chat/history/${studentId}${before ? `?before=${before}` : ''}`),
   getFlashcardDecks: (pathId) => request(`/flashcards/decks/${pathId}`),
   generateFlashcards: (studentId, topic) => request('/flashcards/generate', { method: 'POST', body: JSON.stringify({ student_id: studentId, topic }) }),
   getConcepts: (pathId) => request(`/concepts/${pathId}`),
@@ -40,7 +102,7 @@ const api = {
   getAllBadges: () => request('/badges'),
   getStudentBadges: (studentId) => request(`/badges/${studentId}`),
   getXPLog: (studentId) => request(`/xp/log/${studentId}`),
-  getAnalytics: (studentId) => request(`/analytics/${studentId}`),
+  getAnalytics: (studentId, start, end) => request(`/analytics/${studentId}?${new URLSearchParams({ ...(start && { start }), ...(end && { end }) })}`),
   adminOverview: () => request('/admin/overview'),
   health: () => request('/health'),
 };
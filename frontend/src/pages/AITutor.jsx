@@ -37,11 +37,32 @@ export default function AITutor() {
     setMessages(prev => [...prev, { role: 'user', content: userMsg }]);
     setLoading(true);
 
+    let started = false;
+    const appendDelta = (delta) => {
+      if (!started) {
+        started = true;
+        setLoading(false);
+        setMessages(prev => [...prev, { role: 'assistant', content: delta }]);
+        return;
+      }
+      setMessages(prev => {
+        const last = prev[prev.length - 1];
+        return [...prev.slice(0, -1), { ...last, content: last.content + delta }];
+      });
+    };
+
     try {
-      const res = await api.chat(user.id, userMsg);
-      setMessages(prev => [...prev, { role: 'assistant', content: res.response }]);
+      await api.chatStream(user.id, userMsg, undefined, appendDelta);
     } catch (e) {
-      setMessages(prev => [...prev, { role: 'assistant', content: 'Taking a quick breather 😴 — back in a moment! Try again in a few seconds.' }]);
+      if (!started) {
+        setMessages(prev => [...prev, { role: 'assistant', content: 'Taking a quick breather 😴 — back in a moment! Try again in a few seconds.' }]);
+      } else {
+        // The reply was cut off partway; say so under what did arrive
+        setMessages(prev => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, content: `${last.content}\n\n${e.message}` }];
+        });
+      }
     }
     setLoading(false);
   };
@@ -4,6 +4,7 @@ import api from '../api';
 
 const rankIcons = ['🥇', '🥈', '🥉', '4️⃣'];
 const pathIcons = { gaming: '🎮', business: '💼', developer: '💻' };
+const periods = { all: '🌟 All Time', monthly: '🗓️ 30 Days', weekly: '📅 7 Days', daily: '⚡ 24 Hours' };
 
 export default function Leaderboard() {
   const { user } = useAuth();
@@ -22,12 +23,12 @@ export default function Leaderboard() {
 
       {/* Tabs */}
       <div className="flex gap-2 mb-6">
-        {['all', 'weekly'].map(t => (
+        {Object.keys(periods).map(t => (
           <button key={t} onClick={() => setTab(t)}
             className={`px-4 py-2 rounded-lg text-sm font-medium transition-all ${
               tab === t ? `bg-gradient-to-r ${theme.gradient} text-white` : 'bg-gray-800 text-gray-400'
             }`}>
-            {t === 'all' ? '🌟 All Time' : '📅 This Week'}
+            {periods[t]}
           </button>
         ))}
       </div>
@@ -60,7 +61,7 @@ export default function Leaderboard() {
               <p className="text-xs text-gray-400">{player.level} · 🔥 {player.current_streak} day streak</p>
             </div>
             <div className="text-right">
-              <p className={`font-bold text-lg ${theme.accent}`}>{player.total_xp}</p>
+              <p className={`font-bold text-lg ${theme.accent}`}>{player.xp ?? player.total_xp}</p>
               <p className="text-xs text-gray-400">XP</p>
             </div>
           </div>
@@ -91,7 +92,7 @@ function PodiumCard({ player, rank, theme, user, isFirst }) {
       <span className={`font-bold text-sm ${player.name === user?.name ? theme.accent : 'text-white'}`}>
         {player.name}
       </span>
-      <span className="text-xs text-gray-400">{player.total_xp} XP</span>
+      <span className="text-xs text-gray-400">{player.xp ?? player.total_xp} XP</span>
       <div className={`mt-2 flex items-center justify-center rounded-t-lg ${
         rank === 1 ? 'bg-amber-500/30 w-20 h-24' :
         rank === 2 ? 'bg-gray-500/30 w-16 h-16' :
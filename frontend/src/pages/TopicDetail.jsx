@@ -14,12 +14,20 @@ export default function TopicDetail() {
   const [contentLevel, setContentLevel] = useState('normal');
 
   useEffect(() => {
-    api.getTopic(parseInt(topicId)).then(data => {
+    api.getTopic(parseInt(topicId), 'normal').then(data => {
       setTopic(data);
       setLoading(false);
     }).catch(() => setLoading(false));
   }, [topicId]);
 
+  // Other lesson levels are fetched the first time they're picked
+  useEffect(() => {
+    if (!topic || topic[`content_${contentLevel}`] !== undefined) return;
+    api.getTopic(parseInt(topicId), contentLevel)
+      .then(data => setTopic(t => ({ ...t, ...data })))
+      .catch(() => {});
+  }, [topic, topicId, contentLevel]);
+
   const handleComplete = async () => {
     setCompleting(true);
     try {